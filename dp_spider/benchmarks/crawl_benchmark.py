@@ -0,0 +1,115 @@
+"""
+端到端爬取吞吐：启动 mock_server 模拟 webapi，让爬虫经由 HTTP 代理访问它，输出墙钟时间、记录/秒、响应/秒与字节/秒。
+
+所有输出（批次文件、检查点、死信、指标、日志）写到 --work-dir 下，不触碰 data/；
+物种 ID 为构造的 --species 个；默认关闭页大小学习（它在运行中调整 pagecount，请求随之变化），
+同样的参数下服务器返回的数据与注入的故障完全相同，不同改动之间可以直接对比。
+
+用法（在项目根目录）：
+    python benchmarks/crawl_benchmark.py species_distribution --species 2000
+    python benchmarks/crawl_benchmark.py species_all --species 500 \\
+        --server-args "--latency 0.05 --latency-per-row 0.0001 --capacity 64 --error-rate 0.01" \\
+        -s CONCURRENT_REQUESTS=200
+"""
+import argparse
+import json
+import os
+import shlex
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.request import urlopen
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def write_species_ids(directory, count):
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, 'species_ids_1.jsonl'), 'w', encoding='utf-8') as f:
+        for i in range(count):
+            f.write(json.dumps(f'00000000-0000-4000-8000-{i:012d}') + '\n')
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'模拟服务器未在 {timeout} 秒内启动')
+
+
+def crawl_command(spider, work_dir, settings_args):
+    """爬虫命令行：所有状态文件都改到 work_dir 下"""
+    settings = {
+        'SPECIES_ID_DIR': os.path.join(work_dir, 'species_id'),
+        'BATCH_OUTPUT_ROOT': work_dir,
+        'CHECKPOINT_DIR': os.path.join(work_dir, 'checkpoints'),
+        'DEAD_LETTER_DIR': os.path.join(work_dir, 'dead_letters'),
+        'METRICS_DIR': os.path.join(work_dir, 'metrics'),
+        'METRICS_FORMAT': 'json',
+        'ICODE_INDEX_PATH': os.path.join(work_dir, 'icode_index.sqlite3'),
+        'PAGE_SIZE_STATE_PATH': os.path.join(work_dir, 'page_sizes.json'),
+        'PAGE_SIZE_ENABLED': 'False',
+        'HTTPCACHE_ENABLED': 'False',
+        'LOG_FILE': os.path.join(work_dir, 'crawl.log'),
+    }
+    command = [sys.executable, '-m', 'scrapy', 'crawl', spider]
+    for name, value in settings.items():
+        command += ['-s', f'{name}={value}']
+    for value in settings_args:
+        command += ['-s', value]
+    return command
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('spider', help='爬虫名称')
+    parser.add_argument('--species', type=int, default=1000, help='物种 ID 数')
+    parser.add_argument('--port', type=int, default=8765, help='模拟服务器端口')
+    parser.add_argument('--server-args', default='', help='传给 mock_server 的参数')
+    parser.add_argument('-s', dest='settings_args', action='append', default=[], metavar='NAME=VALUE',
+                        help='覆盖爬虫配置')
+    parser.add_argument('--work-dir', help='输出目录（默认临时目录，结束后删除）')
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='dp_spider_bench_')
+    write_species_ids(os.path.join(work_dir, 'species_id'), args.species)
+    server_command = [sys.executable, '-m', 'dp_spider.mock_server', '--port', str(args.port),
+                      '--report-interval', '0', *shlex.split(args.server_args)]
+    server = subprocess.Popen(server_command, cwd=PROJECT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(args.port)
+        env = dict(os.environ, http_proxy=f'http://127.0.0.1:{args.port}')
+        start = time.perf_counter()
+        code = subprocess.call(crawl_command(args.spider, work_dir, args.settings_args), cwd=PROJECT_DIR, env=env)
+        elapsed = time.perf_counter() - start
+        with urlopen(f'http://127.0.0.1:{args.port}/__stats') as response:
+            server_stats = json.load(response)
+    finally:
+        server.terminate()
+        server.wait()
+
+    with open(os.path.join(work_dir, 'metrics', f'{args.spider}.json'), encoding='utf-8') as f:
+        metrics = json.load(f)
+    faults = {name.split('/', 1)[1]: count for name, count in server_stats.items() if name.startswith('faults/')}
+    print(f'爬虫: {args.spider}（退出码 {code}），物种 {args.species} 个，服务器参数: {args.server_args or "无"}')
+    print(f'墙钟时间 {elapsed:.1f}s，记录 {metrics["items"]}，响应 {metrics["responses"]}，'
+          f'{metrics["bytes"] / 1024 / 1024:.1f} MB')
+    print(f'记录/秒 {metrics["items"] / elapsed:.0f}，响应/秒 {metrics["responses"] / elapsed:.1f}，'
+          f'MB/秒 {metrics["bytes"] / 1024 / 1024 / elapsed:.2f}')
+    print(f'服务器在途峰值 {server_stats["max_inflight"]}，注入故障 {faults or "无"}')
+    if args.work_dir is None:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    else:
+        print(f'输出与日志: {work_dir}')
+    sys.exit(code)
+
+
+if __name__ == '__main__':
+    main()
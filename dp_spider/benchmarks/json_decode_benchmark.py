@@ -0,0 +1,138 @@
+"""
+接口响应的 JSON 解码路径对比：
+    text:  原有写法 json.loads(response.text)，先把整个响应体解码成 str 再解析
+    bytes: json.loads(response.body)，标准库直接解析字节串
+    orjson: orjson.loads(response.body)（安装了 orjson 时），即 jsonio.response_json 的快速路径
+
+样本优先取 HTTP 缓存（.scrapy/httpcache/<爬虫名>.sqlite3）中录制的真实页面，按接口分组；
+没有缓存时按各接口的结构构造 5000 行一页的列表页面。输出每页耗时与吞吐量。
+
+用法（在项目根目录）：
+    python benchmarks/json_decode_benchmark.py [--cache-dir .scrapy/httpcache] [--pages 20] [--repeat 5]
+"""
+import argparse
+import glob
+import json
+import os
+import sqlite3
+import sys
+import time
+import zlib
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dp_spider.items import (  # noqa: E402
+    CankaoItem,
+    PestchinaScraperItem,
+    PestRelationInfoItem,
+    SpeciesDistributionItem,
+    SpeciesHostItem,
+)
+from dp_spider.jsonio import BACKENDS  # noqa: E402
+
+# 没有录制页面时构造的样本：接口名称 -> 行字段
+SYNTHETIC_ENDPOINTS = {
+    'SpeciesDistribution/list/concat': list(SpeciesDistributionItem.fields),
+    'SpeciesCode/list': list(PestchinaScraperItem.fields),
+    'SpeciesHost/list/concat': list(SpeciesHostItem.fields),
+    'PestRelationInfo/list': list(PestRelationInfoItem.fields),
+}
+
+
+def endpoint_of_url(url):
+    """与 extensions.endpoint_of 一致的接口名称（缓存中只有 URL，没有请求方法，按路径段数判断）"""
+    path = urlparse(url).path
+    if '/webapi/nb/' not in path:
+        return path
+    segments = path.split('/webapi/nb/', 1)[1].strip('/').split('/')
+    if len(segments) >= 3 and segments[-2] in ('detail', 'ParentList', 'files'):
+        segments = segments[:-1]
+    return '/'.join(segments)
+
+
+def load_recorded(cache_dir, pages):
+    """从 HTTP 缓存读取录制的响应体，每个接口最多 pages 页"""
+    samples = {}
+    for path in sorted(glob.glob(os.path.join(cache_dir, '*.sqlite3'))):
+        connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+        try:
+            rows = connection.execute('SELECT url, body FROM response WHERE status = 200').fetchall()
+        finally:
+            connection.close()
+        for url, body in rows:
+            bodies = samples.setdefault(endpoint_of_url(url), [])
+            if len(bodies) < pages:
+                bodies.append(zlib.decompress(body))
+    return samples
+
+
+def make_page(fields, rows, page):
+    """构造与列表接口结构一致的一页响应体（content + paging）"""
+    cankao = {name: f'{name}-值' for name in CankaoItem.fields}
+    content = []
+    for i in range(rows):
+        row = {name: f'{name}-{page}-{i}' for name in fields}
+        row['rowid'] = page * rows + i
+        if 'cankao' in row:
+            row['cankao'] = dict(cankao, Icode=str(10000000 + i))
+        content.append(row)
+    paging = {'pagenum': page, 'pagecount': rows, 'totalpage': 0, 'totalcount': 0}
+    return json.dumps({'content': content, 'paging': paging}, ensure_ascii=False).encode('utf-8')
+
+
+def make_synthetic(pages, rows):
+    return {
+        endpoint: [make_page(fields, rows, page) for page in range(1, pages + 1)]
+        for endpoint, fields in SYNTHETIC_ENDPOINTS.items()
+    }
+
+
+def decoders():
+    """解码方式名称 -> 函数（输入为响应体字节串）"""
+    result = {'text': lambda body: json.loads(body.decode('utf-8'))}
+    result['bytes'] = BACKENDS['json']
+    if 'orjson' in BACKENDS:
+        result['orjson'] = BACKENDS['orjson']
+    return result
+
+
+def measure(decode, bodies, repeat):
+    """返回每页耗时（毫秒），取多次运行的最小值"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for body in bodies:
+            decode(body)
+        best = min(best, time.perf_counter() - start)
+    return best / len(bodies) * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cache-dir', default=os.path.join('.scrapy', 'httpcache'), help='HTTP 缓存目录')
+    parser.add_argument('--pages', type=int, default=20, help='每个接口的样本页数')
+    parser.add_argument('--rows', type=int, default=5000, help='构造样本时每页的行数')
+    parser.add_argument('--repeat', type=int, default=5, help='计时重复次数')
+    args = parser.parse_args()
+
+    samples = load_recorded(args.cache_dir, args.pages)
+    if samples:
+        print(f'样本: {args.cache_dir} 中录制的页面')
+    else:
+        samples = make_synthetic(args.pages, args.rows)
+        print(f'样本: 未找到 HTTP 缓存，构造每页 {args.rows} 行的列表页面')
+
+    methods = decoders()
+    header = ''.join(f'{name + " ms/页":>14}' for name in methods)
+    print(f'{"接口":<36}{"页数":>6}{"KB/页":>10}{header}{"MB/s":>10}')
+    for endpoint, bodies in sorted(samples.items()):
+        size = sum(len(body) for body in bodies) / len(bodies)
+        timings = {name: measure(decode, bodies, args.repeat) for name, decode in methods.items()}
+        fastest = min(timings.values())
+        cells = ''.join(f'{timings[name]:>14.2f}' for name in methods)
+        print(f'{endpoint:<36}{len(bodies):>6}{size / 1024:>10.1f}{cells}{size / 1e3 / fastest:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
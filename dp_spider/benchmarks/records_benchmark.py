@@ -0,0 +1,114 @@
+"""
+解析 -> 管道路径的 Item 表示对比：
+    item:   逐字段 item[...] = data.get(...) 填充 scrapy.Item，管道中 ItemAdapter.asdict() 后编码
+    record: Record.from_api() 批量填充 __slots__ 记录，管道中 to_dict() 后编码
+
+以 PestRelationInfo（16 个字段 + 24 个字段的嵌套 cankao）为样本，输出每条记录的 CPU 时间、
+常驻内存（模拟管道缓冲中同时存活的记录）与序列化单条记录时的临时内存峰值。
+
+用法（在项目根目录）：
+    python benchmarks/records_benchmark.py [--items 20000] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from itemadapter import ItemAdapter  # noqa: E402
+
+from dp_spider.items import CankaoItem, PestRelationInfoItem  # noqa: E402
+from dp_spider.records import PestRelationInfoRecord, to_dict  # noqa: E402
+from dp_spider.storage import encode_record  # noqa: E402
+
+
+def make_payload(count):
+    """构造与 PestRelationInfo/list 接口结构一致的样本数据"""
+    cankao = {name: f'{name}-值' for name in CankaoItem.fields}
+    payload = []
+    for i in range(count):
+        row = {name: f'{name}-{i}' for name in PestRelationInfoItem.fields if name != 'cankao'}
+        row['rowid'] = i
+        row['cankao'] = dict(cankao, Icode=str(10000000 + i))
+        payload.append(row)
+    return payload
+
+
+def fill_item(item_data):
+    """原有写法：逐字段赋值"""
+    item = PestRelationInfoItem()
+    for name in PestRelationInfoItem.fields:
+        if name != 'cankao':
+            item[name] = item_data.get(name)
+    cankao_data = item_data.get('cankao', {})
+    cankao_item = CankaoItem()
+    for name in CankaoItem.fields:
+        cankao_item[name] = cankao_data.get(name)
+    item['cankao'] = cankao_item
+    return item
+
+
+def fill_record(item_data):
+    return PestRelationInfoRecord.from_api(item_data)
+
+
+def serialize_item(item):
+    return encode_record(ItemAdapter(item).asdict())
+
+
+def serialize_record(item):
+    return encode_record(to_dict(item))
+
+
+def measure_time(fill, serialize, payload, repeat):
+    """返回 (每条填充耗时, 每条序列化耗时)，单位微秒，取多次运行的最小值"""
+    best_fill = best_serialize = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        items = [fill(row) for row in payload]
+        middle = time.perf_counter()
+        for item in items:
+            serialize(item)
+        end = time.perf_counter()
+        best_fill = min(best_fill, middle - start)
+        best_serialize = min(best_serialize, end - middle)
+    return best_fill / len(payload) * 1e6, best_serialize / len(payload) * 1e6
+
+
+def measure_memory(fill, serialize, payload):
+    """返回 (每条存活记录占用字节数, 序列化单条记录时的临时内存峰值字节数)"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    items = [fill(row) for row in payload]
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    for item in items:
+        serialize(item)
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    return retained / len(payload), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=20000, help='样本记录数')
+    parser.add_argument('--repeat', type=int, default=5, help='计时重复次数')
+    args = parser.parse_args()
+
+    payload = make_payload(args.items)
+    print(f'样本: {args.items} 条 PestRelationInfo（含嵌套 cankao）')
+    print(f'{"方式":<8}{"填充 us/条":>12}{"序列化 us/条":>14}{"常驻 B/条":>12}{"序列化峰值 B":>16}')
+    for name, fill, serialize in (
+            ('item', fill_item, serialize_item),
+            ('record', fill_record, serialize_record),
+    ):
+        fill_us, serialize_us = measure_time(fill, serialize, payload, args.repeat)
+        retained, peak = measure_memory(fill, serialize, payload)
+        print(f'{name:<8}{fill_us:>12.2f}{serialize_us:>14.2f}{retained:>12.0f}{peak:>16.0f}')
+
+
+if __name__ == '__main__':
+    main()
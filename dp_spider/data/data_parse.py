@@ -16,9 +16,9 @@ def process_pest_files():
     current_chunk = []
     file_counter = 1
 
-    # 获取并排序输入文件 (自然排序处理 pests_batch_1 ~ pests_batch_20)
+    # 获取并排序输入文件 (自然排序处理 pests_batch_1 ~ pests_batch_20，支持 .json 与 .jsonl)
     input_files = sorted(
-        INPUT_DIR.glob("pests_batch_*.json"),
+        [*INPUT_DIR.glob("pests_batch_*.json"), *INPUT_DIR.glob("pests_batch_*.jsonl")],
         key=lambda x: int(x.stem.split("_")[-1])
     )
 
@@ -28,7 +28,10 @@ def process_pest_files():
 
         try:
             with open(input_file, "r", encoding="utf-8") as f:
-                data = json.load(f)
+                if input_file.suffix == ".jsonl":
+                    data = [json.loads(line) for line in f if line.strip()]
+                else:
+                    data = json.load(f)
 
                 # 验证数据结构
                 if not isinstance(data, list):
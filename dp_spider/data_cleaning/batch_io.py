@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+
+# 爬虫管道输出的批次文件后缀：.jsonl 为默认的 JSON Lines 格式，.json 为旧的 JSON 数组格式
+BATCH_SUFFIXES = ('.json', '.jsonl')
+
+
+def resolve_batch_path(path):
+    """
+    定位批次文件：给定路径不存在时，尝试另一种后缀（.json <-> .jsonl）。
+
+    参数:
+        path (str): 批次文件路径
+    返回:
+        str: 实际存在的文件路径（都不存在时原样返回）
+    """
+    if os.path.exists(path):
+        return path
+    stem, suffix = os.path.splitext(path)
+    for other in BATCH_SUFFIXES:
+        if other != suffix and os.path.exists(stem + other):
+            return stem + other
+    return path
+
+
+def load_batch(path):
+    """
+    读取批次文件中的全部记录，同时支持 JSON Lines 与 JSON 数组格式。
+
+    参数:
+        path (str): 批次文件路径
+    返回:
+        list: 记录列表
+    """
+    path = resolve_batch_path(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith('.jsonl'):
+            return [json.loads(line) for line in f if line.strip()]
+        return json.load(f)
@@ -1,9 +1,10 @@
-import json
 import csv
 import os
 from uuid import UUID
 from datetime import datetime
 
+from batch_io import load_batch
+
 # 定义输入和输出路径
 INPUT_DIR = 'data/cm_diffuse_medium_list'
 OUTPUT_DIR = 'cleaned_data/cm_diffuse_medium'
@@ -38,8 +39,7 @@ def parse_datetime(date_str):
 def clean_data():
     """清洗cm_diffuse_medium数据并写入CSV文件"""
     # 读取JSON文件
-    with open(JSON_FILE, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    data = load_batch(JSON_FILE)
 
     # 定义CSV字段名，与数据库表一致
     fieldnames = [
@@ -1,7 +1,8 @@
-import json
 import csv
 import os
 
+from batch_io import load_batch
+
 # 定义输入和输出目录
 # 输入目录：原始 JSON 文件所在路径
 input_dir = 'data/file_metadata_list'
@@ -32,8 +33,7 @@ db_fields = ['id', 'icode', 'name', 'url']
 
 # 读取 JSON 数据
 # 使用 utf-8 编码以支持中文字符
-with open(json_path, 'r', encoding='utf-8') as f:
-    data = json.load(f)
+data = load_batch(json_path)
 
 # 初始化自增 id，从 1 开始
 current_id = 1
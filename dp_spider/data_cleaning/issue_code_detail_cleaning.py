@@ -1,9 +1,10 @@
-import json
 import csv
 import os
 import uuid
 from datetime import datetime
 
+from batch_io import load_batch
+
 # 定义输入和输出路径
 INPUT_DIR = 'data/issue_code_detail_list'
 OUTPUT_DIR = 'cleaned_data/issue_code_detail'
@@ -31,8 +32,7 @@ def parse_datetime(date_str):
 def clean_data():
     """清洗issue_code_detail数据并写入CSV文件"""
     # 读取JSON文件
-    with open(JSON_FILE, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    data = load_batch(JSON_FILE)
 
     # 定义CSV字段名，与数据库表species_reference_info一致
     fieldnames = [
@@ -3,6 +3,8 @@ import json
 import os
 import pandas as pd
 
+from batch_io import BATCH_SUFFIXES, load_batch
+
 # === 全局配置 ===
 # 输入目录：存放原始 JSON 文件的路径
 INPUT_DIR = 'data/species_host_list'
@@ -87,14 +89,13 @@ def clean_species_host_data():
     """
     # 遍历输入目录下的所有 JSON 文件
     for filename in os.listdir(INPUT_DIR):
-        if filename.startswith('species_host_batch_') and filename.endswith('.json'):
+        if filename.startswith('species_host_batch_') and filename.endswith(BATCH_SUFFIXES):
             filepath = os.path.join(INPUT_DIR, filename)
             print(f"正在处理文件: {filename}")
 
             # 读取 JSON 文件并处理异常
             try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
+                data = load_batch(filepath)
             except json.JSONDecodeError as e:
                 print(f"错误: JSON 解析失败 {filename}: {e}")
                 continue
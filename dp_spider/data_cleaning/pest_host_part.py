@@ -1,8 +1,9 @@
-import json
 import csv
 import os
 from uuid import UUID
 
+from batch_io import load_batch
+
 # Define input and output directories
 INPUT_DIR = 'data/pest_host_part_list'
 OUTPUT_DIR = 'cleaned_data/pest_host_part'
@@ -24,8 +25,7 @@ def validate_uuid(uuid_str):
 def clean_data():
     """Main function to clean pest_host_part data and write to CSV files."""
     # Read JSON file
-    with open(JSON_FILE, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    data = load_batch(JSON_FILE)
 
     # Lists to store cleaned data for each table
     species_host_part_rows = []
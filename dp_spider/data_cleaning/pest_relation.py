@@ -1,9 +1,10 @@
 # -*- coding: utf-8 -*-
-import json
 import os
 import pandas as pd
 from datetime import datetime
 
+from batch_io import load_batch
+
 # === 全局配置 ===
 # 输入目录：存放原始 JSON 文件
 INPUT_DIR = 'data/pest_relation'
@@ -130,8 +131,7 @@ def clean_pest_relation_data():
 
     # 读取 JSON 文件
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = load_batch(filepath)
     except Exception as e:
         print(f"错误: 无法读取文件 {filename}: {e}")
         return
@@ -1,9 +1,10 @@
 # -*- coding: utf-8 -*-
-import json
 import os
 import pandas as pd
 from datetime import datetime
 
+from batch_io import BATCH_SUFFIXES, load_batch
+
 # === 全局配置 ===
 # 输入目录：存放原始 JSON 文件
 INPUT_DIR = 'data/species_basicinfo'
@@ -128,14 +129,13 @@ def clean_species_basic_info_data():
     """
     # 遍历输入目录下的所有 JSON 文件
     for filename in os.listdir(INPUT_DIR):
-        if filename.startswith('species_basicinfo_batch_') and filename.endswith('.json'):
+        if filename.startswith('species_basicinfo_batch_') and filename.endswith(BATCH_SUFFIXES):
             filepath = os.path.join(INPUT_DIR, filename)
             print(f"正在处理文件: {filename}")
 
             # 读取 JSON 文件
             try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
+                data = load_batch(filepath)
             except Exception as e:
                 print(f"错误: 无法读取文件 {filename}: {e}")
                 continue
@@ -1,9 +1,10 @@
 # -*- coding: utf-8 -*-
-import json
 import os
 import pandas as pd
 from datetime import datetime
 
+from batch_io import BATCH_SUFFIXES, load_batch
+
 # === 全局配置 ===
 # 定义输入和输出目录
 INPUT_DIR = 'data/meta_info_list'  # 输入目录，存放 meta_batch_*.json 文件
@@ -107,14 +108,13 @@ def clean_meta_data():
 
     # 遍历输入目录下的所有 JSON 文件
     for filename in os.listdir(INPUT_DIR):
-        if filename.startswith('meta_batch_') and filename.endswith('.json'):
+        if filename.startswith('meta_batch_') and filename.endswith(BATCH_SUFFIXES):
             filepath = os.path.join(INPUT_DIR, filename)
             print(f"正在处理文件: {filename}")
 
             # 读取 JSON 文件
             try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
+                data = load_batch(filepath)
             except Exception as e:
                 print(f"错误: 无法读取文件 {filename}: {e}")
                 continue
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# 默认的检查点目录（相对于项目根目录）
+DEFAULT_CHECKPOINT_DIR = os.path.join('data', 'checkpoints')
+
+
+def source_digest(paths):
+    """物种 ID 文件的摘要（文件名、大小、修改时间）；ID 文件变化后序号不再对应，检查点随之作废"""
+    digest = hashlib.sha1()
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f'{os.path.basename(path)}:{stat.st_size}:{int(stat.st_mtime)};'.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _write_atomic(path, data):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class CompletionBitmap:
+    """按物种全局序号记录完成状态的位图，10 万个物种约 12KB"""
+
+    def __init__(self, data=b''):
+        self.bits = bytearray(data)
+
+    def __contains__(self, position):
+        index = position >> 3
+        return index < len(self.bits) and bool(self.bits[index] & (1 << (position & 7)))
+
+    def add(self, position):
+        index = position >> 3
+        if index >= len(self.bits):
+            self.bits.extend(bytes(index + 1 - len(self.bits)))
+        self.bits[index] |= 1 << (position & 7)
+
+    def __len__(self):
+        return sum(bin(byte).count('1') for byte in self.bits)
+
+    def to_bytes(self):
+        return bytes(self.bits)
+
+
+class CrawlCheckpoint:
+    """
+    爬取检查点：每个接口（爬虫）一个位图文件 <目录>/<爬虫名>.bitmap，按 SpeciesIdSource 给出的全局序号
+    标记已完成的物种，旁边的 <爬虫名>.json 记录 ID 文件摘要。
+    重启时 SpeciesIdSource 按序号查位图跳过已完成的物种，开销与已爬取的数量无关，
+    不必像 JOBDIR 那样序列化全部待处理请求。
+
+    物种"完成"指它的所有分页请求都已解析、产出的记录都已经过管道（由 CheckpointMiddleware 判定）；
+    位图写盘前先让管道提交已缓冲的数据（见 CheckpointMiddleware.flush），保证位图不会领先于数据。
+    """
+
+    def __init__(self, directory, name):
+        self.directory = directory
+        self.name = name
+        self.bitmap = CompletionBitmap()
+        self.digest = None
+        self.positions = {}  # 进行中的物种 ID -> 全局序号
+        self.pending = {}  # 进行中的物种 ID -> 未完成的请求数 + 未处理完的记录数
+        self.failed = set()  # 有响应解析失败的进行中物种，计数归零时不算完成
+        self.dirty = False
+
+    @property
+    def bitmap_path(self):
+        return os.path.join(self.directory, f'{self.name}.bitmap')
+
+    @property
+    def meta_path(self):
+        return os.path.join(self.directory, f'{self.name}.json')
+
+    def bind(self, digest):
+        """绑定物种 ID 来源并加载位图；ID 文件与上次不同时丢弃旧位图"""
+        if self.digest == digest:
+            return
+        self.digest = digest
+        self.bitmap = CompletionBitmap()
+        if not os.path.exists(self.meta_path) or not os.path.exists(self.bitmap_path):
+            return
+        with open(self.meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('source') != digest:
+            logger.warning(f'{self.name} 的物种 ID 文件已变化，忽略旧检查点')
+            return
+        with open(self.bitmap_path, 'rb') as f:
+            self.bitmap = CompletionBitmap(f.read())
+        logger.info(f'{self.name} 从检查点恢复：已完成 {len(self.bitmap)} 个物种')
+
+    def __contains__(self, position):
+        return position in self.bitmap
+
+    def track(self, key, position):
+        """登记即将发起请求的物种"""
+        self.positions[key] = position
+
+    def is_tracked(self, key):
+        return key in self.positions
+
+    def start(self, key):
+        """登记一个起始请求；不在位图中的 key（如 icode）同样计数，完成时只通知管道（见 CheckpointMiddleware）"""
+        if key is not None:
+            self.pending[key] = self.pending.get(key, 0) + 1
+
+    def add_pending(self, key, count=1):
+        if key in self.pending:
+            self.pending[key] += count
+
+    def fail(self, key):
+        """key 有响应解析失败，计数归零时不标记完成，重启后重新爬取"""
+        if key in self.pending:
+            self.failed.add(key)
+
+    def done_pending(self, key, count=1):
+        """结束 count 个计数；返回该 key 是否因此完成（解析失败过的 key 计数归零时直接丢弃）"""
+        if key not in self.pending:
+            return False
+        self.pending[key] -= count
+        if self.pending[key] > 0:
+            return False
+        del self.pending[key]
+        if key in self.failed:
+            self.failed.discard(key)
+            self.positions.pop(key, None)
+            return False
+        return True
+
+    def complete(self, key):
+        """在位图中标记已完成的 key（不在位图中的 key，如 icode，忽略）"""
+        if key in self.positions:
+            self.bitmap.add(self.positions.pop(key))
+            self.dirty = True
+
+    def discard(self, key):
+        """放弃记录已完成的 key：没有管道保存它的数据时不写入位图"""
+        self.positions.pop(key, None)
+
+    def snapshot(self):
+        """当前位图的快照，在管道提交之后写盘"""
+        self.dirty = False
+        return self.bitmap.to_bytes()
+
+    def write(self, snapshot):
+        os.makedirs(self.directory, exist_ok=True)
+        _write_atomic(self.bitmap_path, snapshot)
+        _write_atomic(self.meta_path, json.dumps({'source': self.digest}).encode('utf-8'))
@@ -0,0 +1,162 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(values, q):
+    """已排序列表的 q 分位数（最近秩法）"""
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, int(round(q * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+class EndpointWindow:
+    """
+    单个接口的并发上限与当前观测窗口：窗口内的下载延迟、各类失败次数（timeout / connection / 5xx / empty），
+    以及窗口内是否出现过请求在下载槽中排队（并发上限成为瓶颈）。
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.slow_start = True  # 第一次降低之前按倍数增长
+        self.baseline = None  # 无拥塞时的 p50 延迟
+        self.decreased_at = float('-inf')
+        self.reset()
+
+    def reset(self):
+        self.latencies = []
+        self.failures = {}
+        self.total = 0
+        self.saturated = False
+
+    def failure_count(self):
+        return sum(self.failures.values())
+
+
+class ConcurrencyController:
+    """
+    按接口的 AIMD 并发控制：每个决策周期根据窗口内的失败率、p50 / p90 延迟调整该接口的在途请求上限。
+
+        - 失败率超过 error_rate：上限乘以 backoff（乘性减）
+        - p50 延迟超过无拥塞基线的 latency_factor 倍（服务器已开始排队）：p90 同时超过 target_latency 时乘性减，
+          否则保持不变；接口本身就慢而没有排队时降低并发无济于事，不因延迟降低
+        - 请求在下载槽中排队（上限是瓶颈）且延迟正常：上限加 step（加性增）；
+          第一次降低之前按倍数增长（慢启动），尽快找到服务器的承受能力
+
+    降低后，降低之前发出的请求的结果不再计入窗口：超时要等 DOWNLOAD_TIMEOUT 才会出现，
+    否则同一批拥塞会被连续惩罚多次，并发一路降到最低（服务器开始超时后吞吐崩溃的主要原因）。
+    """
+
+    def __init__(self, start=16, minimum=1, maximum=200, step=4, backoff=0.5, error_rate=0.02,
+                 target_latency=7.5, latency_factor=2.0, min_samples=20):
+        self.start = start
+        self.minimum = minimum
+        self.maximum = maximum
+        self.step = step
+        self.backoff = backoff
+        self.error_rate = error_rate
+        self.target_latency = target_latency
+        self.latency_factor = latency_factor
+        self.min_samples = min_samples
+        self.endpoints = {}  # 接口名称 -> EndpointWindow
+
+    @classmethod
+    def from_settings(cls, settings):
+        maximum = settings.getint('ADAPTIVE_CONCURRENCY_MAX') or settings.getint('CONCURRENT_REQUESTS_PER_DOMAIN', 8)
+        target = (settings.getfloat('ADAPTIVE_CONCURRENCY_TARGET_LATENCY')
+                  or settings.getfloat('DOWNLOAD_TIMEOUT', 180) / 4)
+        minimum = max(1, settings.getint('ADAPTIVE_CONCURRENCY_MIN', 1))
+        return cls(
+            start=min(max(settings.getint('ADAPTIVE_CONCURRENCY_START', 16), minimum), maximum),
+            minimum=minimum,
+            maximum=maximum,
+            step=settings.getint('ADAPTIVE_CONCURRENCY_STEP', 4),
+            backoff=settings.getfloat('ADAPTIVE_CONCURRENCY_BACKOFF', 0.5),
+            error_rate=settings.getfloat('ADAPTIVE_CONCURRENCY_ERROR_RATE', 0.02),
+            target_latency=target,
+            latency_factor=settings.getfloat('ADAPTIVE_CONCURRENCY_LATENCY_FACTOR', 2.0),
+            min_samples=settings.getint('ADAPTIVE_CONCURRENCY_MIN_SAMPLES', 20),
+        )
+
+    def window(self, endpoint):
+        window = self.endpoints.get(endpoint)
+        if window is None:
+            window = self.endpoints[endpoint] = EndpointWindow(self.start)
+        return window
+
+    def limit(self, endpoint):
+        return self.window(endpoint).limit
+
+    def observe(self, endpoint, sent_at, latency=None, failure=None, saturated=False):
+        """
+        记录一个请求的结果。
+
+        参数:
+            sent_at: 请求发出的时间（time.monotonic()），早于上次降低的结果不计入
+            latency: 下载延迟（秒），失败时为 None
+            failure: 失败类型，成功时为 None
+            saturated: 结果返回时该接口的下载槽中是否有排队的请求
+        """
+        window = self.window(endpoint)
+        if sent_at < window.decreased_at:
+            return
+        window.total += 1
+        if failure is not None:
+            window.failures[failure] = window.failures.get(failure, 0) + 1
+        elif latency is not None:
+            window.latencies.append(latency)
+        if saturated:
+            window.saturated = True
+
+    def adjust(self, now):
+        """
+        对每个接口做一次决策并开始新的窗口。
+
+        返回:
+            list: (接口名称, 原上限, 新上限, 原因)，只包含上限有变化的接口
+        """
+        decisions = []
+        for endpoint, window in self.endpoints.items():
+            failures = window.failure_count()
+            if window.total < self.min_samples and failures < 3:
+                continue  # 样本不足，窗口继续累积
+            old = window.limit
+            new, reason = self._decide(window, failures, now)
+            window.reset()
+            if new != old:
+                window.limit = new
+                decisions.append((endpoint, old, new, reason))
+        return decisions
+
+    def _decide(self, window, failures, now):
+        window.latencies.sort()
+        p50 = percentile(window.latencies, 0.5)
+        p90 = percentile(window.latencies, 0.9)
+        error_rate = failures / window.total
+        if error_rate > self.error_rate:
+            detail = '，'.join(f'{kind} {count}' for kind, count in sorted(window.failures.items()))
+            return self._decrease(window, now), f'失败率 {error_rate:.1%}（{detail}）'
+        if p50 is None:
+            return window.limit, ''
+        window.baseline = p50 if window.baseline is None else min(p50, window.baseline * 1.05)
+        congested = p50 > window.baseline * self.latency_factor
+        if congested and p90 > self.target_latency:
+            return self._decrease(window, now), (
+                f'p90 延迟 {p90:.2f}s 超过 {self.target_latency:.2f}s，p50 {p50:.2f}s 是基线的 {p50 / window.baseline:.1f} 倍'
+            )
+        if congested:
+            window.slow_start = False
+            return window.limit, ''
+        if not window.saturated or window.limit >= self.maximum:
+            return window.limit, ''
+        if window.slow_start:
+            new = min(self.maximum, window.limit * 2)
+        else:
+            new = min(self.maximum, window.limit + self.step)
+        return new, f'p50 {p50:.2f}s / p90 {p90:.2f}s，请求在排队'
+
+    def _decrease(self, window, now):
+        window.slow_start = False
+        window.decreased_at = now
+        return max(self.minimum, int(window.limit * self.backoff))
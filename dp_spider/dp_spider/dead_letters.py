@@ -0,0 +1,135 @@
+import json
+import logging
+import os
+import time
+
+from scrapy.utils.request import request_from_dict
+
+from .extensions import endpoint_of
+from .frontier import TRANSIENT_META_KEYS
+
+logger = logging.getLogger(__name__)
+
+# 默认的死信目录（相对于项目根目录）
+DEFAULT_DEAD_LETTER_DIR = os.path.join('data', 'dead_letters')
+
+# 爬虫回调上报解析失败时在请求 meta 中设置的标记，CheckpointMiddleware 据此不把该物种标记为完成
+PARSE_FAILED_META = 'parse_failed'
+
+# 写入死信时去掉的 meta：下载器与重试中间件每次重新设置
+DROPPED_META_KEYS = TRANSIENT_META_KEYS + (
+    'download_timeout', 'retry_times', 'adaptive_sent', 'replay_attempts', PARSE_FAILED_META,
+)
+
+
+def dead_letter_path(directory, spider_name):
+    return os.path.join(directory, f'{spider_name}.jsonl')
+
+
+def request_to_record(request, spider):
+    """把请求转成可写入 JSON 的字典（请求体与请求头按 latin-1 解码，可无损还原）"""
+    data = request.to_dict(spider=spider)
+    # to_dict() 返回的 meta 就是请求本身的 meta，复制后再去掉，不影响仍在处理的请求
+    data['meta'] = {key: value for key, value in data['meta'].items() if key not in DROPPED_META_KEYS}
+    data['body'] = data['body'].decode('latin-1')
+    data['headers'] = {
+        name.decode('latin-1'): [value.decode('latin-1') for value in values]
+        for name, values in data['headers'].items()
+    }
+    return data
+
+
+def request_from_record(data, spider):
+    data = dict(data)
+    data['body'] = data['body'].encode('latin-1')
+    data['headers'] = {name: [value.encode('latin-1') for value in values] for name, values in data['headers'].items()}
+    return request_from_dict(data, spider=spider)
+
+
+class DeadLetterWriter:
+    """
+    死信文件：每个最终失败的请求追加一行紧凑 JSON，包含接口名称、错误类型、错误信息与可还原的请求
+    （URL、表单、请求头、回调名与 species_id / icode / pagenum 等 meta）。
+    每行单独写入并刷新，进程中途退出也只会损坏最后一行（读取时跳过）。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self.file = None
+
+    def write(self, request, spider, error, detail=''):
+        if self.file is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self.file = open(self.path, 'a', encoding='utf-8')
+        entry = {
+            'time': round(time.time(), 3),
+            'endpoint': endpoint_of(request),
+            'error': error,
+            'detail': str(detail)[:500],
+            'request': request_to_record(request, spider),
+        }
+        self.file.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':'), default=str) + '\n')
+        self.file.flush()
+        self.count += 1
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def read_dead_letters(path):
+    """逐条读取死信，跳过损坏的行"""
+    if not os.path.exists(path):
+        return
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning(f'跳过损坏的死信: {line[:100]!r}')
+
+
+def merge_dead_letters(source_dir, dest_dir):
+    """
+    把 source_dir 中各爬虫的死信文件追加到 dest_dir 中的同名文件并删除原文件（多进程启动器合并工作进程输出时使用）。
+
+    返回:
+        int: 合并的死信条数
+    """
+    if not os.path.isdir(source_dir):
+        return 0
+    merged = 0
+    for filename in sorted(os.listdir(source_dir)):
+        if not filename.endswith('.jsonl'):
+            continue
+        path = os.path.join(source_dir, filename)
+        with open(path, 'rb') as f:
+            data = f.read()
+        # 工作进程中途退出时最后一行可能不完整，与其他死信一样在读取时跳过，这里补上换行避免粘连
+        if data and not data.endswith(b'\n'):
+            data += b'\n'
+        if data:
+            os.makedirs(dest_dir, exist_ok=True)
+            with open(os.path.join(dest_dir, filename), 'ab') as f:
+                f.write(data)
+            merged += data.count(b'\n')
+        os.remove(path)
+    return merged
+
+
+def record_dead_letter(spider, request, error, detail=''):
+    """
+    爬虫自行捕获的失败（如响应不是合法 JSON）写入死信；未启用死信时什么也不做。
+    species_all 的单接口爬虫不单独打开，死信写到正在运行的爬虫（spider.crawler.spider）上。
+    无论是否启用死信，请求都会打上 PARSE_FAILED_META 标记，该物种 / 文献不会被检查点标记为完成。
+    """
+    request.meta[PARSE_FAILED_META] = True
+    crawler = getattr(spider, 'crawler', None)
+    running = crawler.spider if crawler is not None and crawler.spider is not None else spider
+    writer = getattr(running, 'dead_letters', None)
+    if writer is not None:
+        # 请求的回调属于正在运行的爬虫，按它序列化
+        writer.write(request, running, error, detail)
+        crawler.stats.inc_value('dead_letters/written', spider=running)
@@ -0,0 +1,329 @@
+import json
+import logging
+import os
+import time
+from bisect import bisect_left
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.httpobj import urlparse_cached
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryBudget:
+    """
+    全局内存预算扩展：按字节估算爬虫持有的数据量，超出 MEMORY_BUDGET_MB 时暂停引擎调度新请求，
+    回落到预算的 MEMORY_BUDGET_RESUME_RATIO 以下后恢复。
+    统计的字节数包括：
+        - 各管道缓冲区与写线程队列中尚未落盘的记录（管道实现 buffered_bytes() 即参与统计）
+        - Scraper 中等待解析 / 正在解析的响应（scraper.slot.active_size）
+        - 下载器中正在传输的请求数 × 近期响应体的平均大小
+    超出预算时还会调用各管道的 drain()，把不足一批的缓冲区立即交给写线程 / 写入磁盘，避免暂停后无人清空缓冲。
+    """
+
+    def __init__(self, crawler, budget_bytes, resume_ratio=0.8, interval=0.5):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.budget_bytes = budget_bytes
+        self.resume_bytes = int(budget_bytes * resume_ratio)
+        self.interval = interval
+        self.paused = False
+        self.response_count = 0
+        self.response_bytes = 0
+        self.task = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('MEMORY_BUDGET_ENABLED'):
+            raise NotConfigured
+        budget_mb = settings.getint('MEMORY_BUDGET_MB')
+        if budget_mb <= 0:
+            raise NotConfigured
+        extension = cls(
+            crawler,
+            budget_mb * 1024 * 1024,
+            resume_ratio=settings.getfloat('MEMORY_BUDGET_RESUME_RATIO', 0.8),
+            interval=settings.getfloat('MEMORY_BUDGET_CHECK_INTERVAL', 0.5),
+        )
+        crawler.signals.connect(extension.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(extension.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(extension.response_downloaded, signal=signals.response_downloaded)
+        return extension
+
+    def spider_opened(self, spider):
+        from twisted.internet import task
+
+        self.task = task.LoopingCall(self.check)
+        self.task.start(self.interval, now=False)
+
+    def spider_closed(self, spider):
+        if self.task is not None and self.task.running:
+            self.task.stop()
+
+    def response_downloaded(self, response, request, spider):
+        self.response_count += 1
+        self.response_bytes += len(response.body)
+
+    def pipelines(self):
+        itemproc = getattr(self.crawler.engine.scraper, 'itemproc', None)
+        return [pipe for pipe in getattr(itemproc, 'middlewares', ()) if hasattr(pipe, 'buffered_bytes')]
+
+    def held_bytes(self):
+        """估算当前持有的字节数"""
+        engine = self.crawler.engine
+        held = sum(pipe.buffered_bytes() for pipe in self.pipelines())
+        if engine.scraper.slot is not None:
+            held += engine.scraper.slot.active_size
+        if self.response_count:
+            held += len(engine.downloader.active) * self.response_bytes // self.response_count
+        return held
+
+    def check(self):
+        engine = self.crawler.engine
+        if engine is None or engine.slot is None:
+            return
+        held = self.held_bytes()
+        self.stats.max_value('memory_budget/max_held_bytes', held)
+        if not self.paused and held > self.budget_bytes:
+            for pipe in self.pipelines():
+                if hasattr(pipe, 'drain'):
+                    pipe.drain()
+            engine.pause()
+            self.paused = True
+            self.stats.inc_value('memory_budget/pauses')
+            logger.warning(f'内存占用约 {held / 1048576:.1f}MB，超出预算 {self.budget_bytes / 1048576:.0f}MB，暂停调度新请求')
+        elif self.paused and held <= self.resume_bytes:
+            engine.unpause()
+            self.paused = False
+            # 立即恢复调度，而不是等待引擎的下一次心跳
+            engine.slot.nextcall.schedule()
+            logger.info(f'内存占用回落到约 {held / 1048576:.1f}MB，恢复调度')
+
+
+# 延迟直方图的桶上界（秒），与 Prometheus 的默认桶相近
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def endpoint_of(request):
+    """
+    请求对应的接口名称：/webapi/nb/ 之后的路径，如 SpeciesDistribution/list/concat；
+    GET 接口的最后一段是物种 GUID / icode 等参数（home/code/detail/<guid>），不计入名称。
+    """
+    path = urlparse_cached(request).path
+    path = path.split('/webapi/nb/', 1)[-1].strip('/')
+    if request.method == 'GET' and path.count('/') >= 2:
+        path = path.rsplit('/', 1)[0]
+    return path or '/'
+
+
+class EndpointMetrics:
+    """单个接口的累计指标"""
+
+    __slots__ = ('responses', 'statuses', 'bytes', 'items', 'buckets', 'latency_sum', 'latency_count')
+
+    def __init__(self):
+        self.responses = 0
+        self.statuses = {}  # 状态码 -> 次数
+        self.bytes = 0
+        self.items = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)  # 最后一个为 +Inf
+        self.latency_sum = 0.0
+        self.latency_count = 0
+
+    def observe(self, status, size, latency):
+        self.responses += 1
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        self.bytes += size
+        if latency is not None:
+            self.buckets[bisect_left(LATENCY_BUCKETS, latency)] += 1
+            self.latency_sum += latency
+            self.latency_count += 1
+
+    def to_dict(self):
+        cumulative, buckets = 0, {}
+        for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), self.buckets):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {
+            'responses': self.responses,
+            'statuses': {str(status): count for status, count in sorted(self.statuses.items())},
+            'bytes': self.bytes,
+            'items': self.items,
+            'latency': {'buckets': buckets, 'sum': round(self.latency_sum, 6), 'count': self.latency_count},
+        }
+
+
+class CrawlMetrics:
+    """
+    爬取指标扩展：按接口（见 endpoint_of()）累计响应数、状态码、字节数、记录数与下载延迟直方图，
+    每隔 METRICS_INTERVAL 秒计算条/秒、响应/秒、字节/秒，写到 METRICS_DIR/<爬虫名>.prom
+    （Prometheus textfile 格式，可由 node_exporter 的 textfile collector 采集）或 <爬虫名>.json，
+    并输出一行进度（取代各爬虫逐条打印的 ✅ 日志）。
+    每个事件只做几次字典查找与一次二分查找；文件先写临时文件再原子替换，采集方不会读到半个文件。
+    """
+
+    def __init__(self, crawler, directory, fmt='prometheus', interval=10, progress=True):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.directory = directory
+        self.format = fmt
+        self.interval = interval
+        self.progress = progress
+        self.endpoints = {}  # 接口名称 -> EndpointMetrics
+        self.items = 0
+        self.responses = 0
+        self.bytes = 0
+        self.last = None  # 上一次输出时的 (时间, 记录数, 响应数, 字节数)
+        self.rates = {'items': 0.0, 'responses': 0.0, 'bytes': 0.0}
+        self.started = None
+        self.spider_name = None
+        self.task = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('METRICS_ENABLED'):
+            raise NotConfigured
+        fmt = settings.get('METRICS_FORMAT', 'prometheus')
+        if fmt not in ('prometheus', 'json'):
+            raise NotConfigured(f'METRICS_FORMAT 只能是 prometheus 或 json，而不是 {fmt!r}')
+        extension = cls(
+            crawler,
+            settings.get('METRICS_DIR', 'data/metrics'),
+            fmt=fmt,
+            interval=settings.getfloat('METRICS_INTERVAL', 10),
+            progress=settings.getbool('METRICS_PROGRESS', True),
+        )
+        crawler.signals.connect(extension.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(extension.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(extension.response_received, signal=signals.response_received)
+        crawler.signals.connect(extension.item_scraped, signal=signals.item_scraped)
+        return extension
+
+    def spider_opened(self, spider):
+        from twisted.internet import task
+
+        self.spider_name = spider.name
+        self.started = time.monotonic()
+        self.last = (self.started, 0, 0, 0)
+        os.makedirs(self.directory, exist_ok=True)
+        self.task = task.LoopingCall(self.dump)
+        self.task.start(self.interval, now=False)
+
+    def spider_closed(self, spider, reason):
+        if self.task is not None and self.task.running:
+            self.task.stop()
+        self.dump(final=True)
+
+    def endpoint(self, request):
+        name = endpoint_of(request)
+        metrics = self.endpoints.get(name)
+        if metrics is None:
+            metrics = self.endpoints[name] = EndpointMetrics()
+        return metrics
+
+    def response_received(self, response, request, spider):
+        size = len(response.body)
+        # 命中 HTTP 缓存的响应没有下载延迟
+        self.endpoint(request).observe(response.status, size, request.meta.get('download_latency'))
+        self.responses += 1
+        self.bytes += size
+
+    def item_scraped(self, item, response, spider):
+        self.items += 1
+        if response is not None:
+            self.endpoint(response.request).items += 1
+
+    def dump(self, final=False):
+        now = time.monotonic()
+        last_time, last_items, last_responses, last_bytes = self.last
+        elapsed = now - last_time
+        if elapsed > 0:
+            self.rates = {
+                'items': (self.items - last_items) / elapsed,
+                'responses': (self.responses - last_responses) / elapsed,
+                'bytes': (self.bytes - last_bytes) / elapsed,
+            }
+        self.last = (now, self.items, self.responses, self.bytes)
+        path = os.path.join(self.directory, f'{self.spider_name}.{"prom" if self.format == "prometheus" else "json"}')
+        text = self.prometheus_text() if self.format == 'prometheus' else json.dumps(self.snapshot(), ensure_ascii=False)
+        try:
+            tmp_path = f'{path}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f'写入爬取指标失败: {e}')
+        if self.progress:
+            self.print_progress(now, final)
+
+    def print_progress(self, now, final):
+        errors = self.stats.get_value('downloader/exception_count', 0) + sum(
+            count for metrics in self.endpoints.values()
+            for status, count in metrics.statuses.items() if status >= 400
+        )
+        if final:
+            total = now - self.started
+            print(f'📊 {self.spider_name} 结束：共 {self.items} 条记录、{self.responses} 个响应、'
+                  f'{self.bytes / 1048576:.1f}MB，平均 {self.items / total if total else 0:.1f} 条/秒，失败 {errors} 次')
+        else:
+            print(f'📊 {self.spider_name} 已爬取 {self.items} 条（{self.rates["items"]:.1f} 条/秒），'
+                  f'响应 {self.responses} 个（{self.rates["responses"]:.1f} 个/秒，'
+                  f'{self.rates["bytes"] / 1048576:.2f}MB/秒），失败 {errors} 次')
+
+    def snapshot(self):
+        return {
+            'spider': self.spider_name,
+            'time': time.time(),
+            'elapsed': time.monotonic() - self.started,
+            'items': self.items,
+            'responses': self.responses,
+            'bytes': self.bytes,
+            'download_errors': self.stats.get_value('downloader/exception_count', 0),
+            'rates': self.rates,
+            'endpoints': {name: metrics.to_dict() for name, metrics in sorted(self.endpoints.items())},
+        }
+
+    def prometheus_text(self):
+        spider = self.spider_name
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f'# HELP dp_spider_{name} {help_text}')
+            lines.append(f'# TYPE dp_spider_{name} {kind}')
+            for labels, value in samples:
+                label_text = ','.join(f'{key}="{value_}"' for key, value_ in (('spider', spider),) + labels)
+                lines.append(f'dp_spider_{name}{{{label_text}}} {value}')
+
+        endpoints = sorted(self.endpoints.items())
+        metric('responses_total', 'counter', 'Responses by endpoint and status code', [
+            ((('endpoint', name), ('status', status)), count)
+            for name, metrics in endpoints for status, count in sorted(metrics.statuses.items())
+        ])
+        metric('response_bytes_total', 'counter', 'Response body bytes by endpoint', [
+            ((('endpoint', name),), metrics.bytes) for name, metrics in endpoints
+        ])
+        metric('items_total', 'counter', 'Items scraped by endpoint', [
+            ((('endpoint', name),), metrics.items) for name, metrics in endpoints
+        ])
+        lines.append('# HELP dp_spider_download_latency_seconds Download latency by endpoint')
+        lines.append('# TYPE dp_spider_download_latency_seconds histogram')
+        for name, metrics in endpoints:
+            labels = f'spider="{spider}",endpoint="{name}"'
+            for bound, count in metrics.to_dict()['latency']['buckets'].items():
+                lines.append(f'dp_spider_download_latency_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'dp_spider_download_latency_seconds_sum{{{labels}}} {metrics.latency_sum:.6f}')
+            lines.append(f'dp_spider_download_latency_seconds_count{{{labels}}} {metrics.latency_count}')
+        metric('download_errors_total', 'counter', 'Download exceptions (timeouts, connection errors)', [
+            ((), self.stats.get_value('downloader/exception_count', 0)),
+        ])
+        metric('items_per_second', 'gauge', 'Items per second over the last interval', [((), f'{self.rates["items"]:.3f}')])
+        metric('responses_per_second', 'gauge', 'Responses per second over the last interval', [
+            ((), f'{self.rates["responses"]:.3f}'),
+        ])
+        metric('bytes_per_second', 'gauge', 'Response bytes per second over the last interval', [
+            ((), f'{self.rates["bytes"]:.1f}'),
+        ])
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,182 @@
+import hashlib
+import os
+import sqlite3
+import time
+
+from .items import (
+    CmDiffuseMediumItem, FileMetadataItem, IssueCodeDetailItem, MetaInfoItem, PestchinaScraperItem,
+    PestRelationInfoItem, SpeciesBasicInfoItem, SpeciesHostItem, SpeciesParentItem,
+)
+from .storage import encode_record
+
+# 默认的指纹库路径与变更集目录（相对于项目根目录）
+DEFAULT_STORE_PATH = os.path.join('data', 'fingerprints.sqlite3')
+DEFAULT_CHANGES_DIR = os.path.join('data', 'changes')
+
+# 各类记录的业务主键字段；未列出的类型（如按 rowid 分页的分布、寄主部位）没有稳定主键，
+# 以内容摘要作为主键，内容变化表现为一条 delete 加一条 insert
+FINGERPRINT_KEYS = {
+    PestchinaScraperItem: ('TP_GUID',),
+    MetaInfoItem: ('TP_GUID',),
+    SpeciesBasicInfoItem: ('TP_GUID',),
+    PestRelationInfoItem: ('TP_GUID',),
+    CmDiffuseMediumItem: ('TP_GUID',),
+    SpeciesParentItem: ('species_TP_GUID', 'TP_GUID'),
+    SpeciesHostItem: ('species_id', 'HOST_GUID'),
+    IssueCodeDetailItem: ('Icode',),
+    FileMetadataItem: ('icode', 'guid'),
+}
+
+# 说明爬取不完整的统计项：出现时不推断删除，避免把没抓到的记录当成已删除；
+# 死信包括爬虫自行捕获的解析失败（回调没有抛出异常，其他统计项看不到）
+INCOMPLETE_STATS_PREFIXES = (
+    'retry/max_reached', 'httperror/response_ignored_count', 'spider_exceptions/', 'dead_letters/',
+)
+
+
+def fingerprint(record):
+    """记录内容的摘要（字段顺序由记录类固定，序列化结果稳定）"""
+    return hashlib.blake2b(encode_record(record), digest_size=16).hexdigest()
+
+
+def record_key(item_class, record, digest):
+    fields = FINGERPRINT_KEYS.get(item_class)
+    if fields:
+        values = [record.get(field) for field in fields]
+        if all(value not in (None, '') for value in values):
+            return '|'.join(str(value) for value in values)
+    return digest
+
+
+def crawl_was_complete(stats):
+    """根据统计项判断本次爬取是否有请求或回调失败"""
+    return not any(key.startswith(INCOMPLETE_STATS_PREFIXES) for key in stats)
+
+
+class FingerprintStore:
+    """
+    记录指纹库：SQLite 表 fingerprint 以 (爬虫, 记录类型, 主键) 为主键，保存内容摘要、所属范围（物种 / 文献）与最后出现的运行编号。
+    本次运行看到的记录先写入暂存表 pending，每 commit_every 条提交一次，不会在整次运行中占着一个事务；
+    爬虫正常结束时把暂存表并入 fingerprint，中途失败时丢弃暂存表，
+    下次运行会把这些记录重新视为变化，宁可重复输出也不会漏掉。
+    check_many() 按响应成批查询与写入，每个响应只有少量 SQL 语句，而不是每条记录一次查询一次写入。
+    """
+
+    # 单条 SQL 中 IN (...) 的参数个数上限（SQLite 默认上限为 999）
+    QUERY_CHUNK = 500
+
+    def __init__(self, path=DEFAULT_STORE_PATH, spider_name='', commit_every=10000):
+        self.path = path
+        self.spider_name = spider_name
+        self.commit_every = commit_every
+        self.run = int(time.time() * 1000)
+        self.item_types = set()  # 本次运行出现过的记录类型，只在这些类型中推断删除
+        self.uncommitted = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        with self.connection:
+            for table in ('fingerprint', 'pending'):
+                self.connection.execute(
+                    f'CREATE TABLE IF NOT EXISTS {table} ('
+                    'spider TEXT, item_type TEXT, key TEXT, scope TEXT, digest TEXT, run INTEGER, '
+                    'PRIMARY KEY (spider, item_type, key))'
+                )
+            self.connection.execute('CREATE INDEX IF NOT EXISTS fingerprint_scope ON fingerprint (spider, scope)')
+            # 上次中途失败的运行留下的暂存记录
+            self.connection.execute('DELETE FROM pending WHERE spider = ?', (self.spider_name,))
+
+    def check_many(self, records):
+        """
+        登记一批记录 (item_type, key, scope, digest)，返回每条记录的变化类型：insert / update / unchanged。
+        本次运行中已出现过的记录与本次的摘要比较，否则与上次运行保存的摘要比较。
+        """
+        known = {}
+        for item_type in {record[0] for record in records}:
+            self.item_types.add(item_type)
+            keys = list({record[1] for record in records if record[0] == item_type})
+            for table in ('fingerprint', 'pending'):  # pending 在后，覆盖上次运行的摘要
+                known.update(((item_type, key), digest) for key, digest in self._digests(table, item_type, keys))
+        ops = []
+        for item_type, key, scope, digest in records:
+            previous = known.get((item_type, key))
+            ops.append('insert' if previous is None else 'unchanged' if previous == digest else 'update')
+            known[(item_type, key)] = digest
+        self.connection.executemany(
+            'INSERT OR REPLACE INTO pending (spider, item_type, key, scope, digest, run) VALUES (?, ?, ?, ?, ?, ?)',
+            ((self.spider_name, item_type, key, scope, digest, self.run) for item_type, key, scope, digest in records),
+        )
+        self.uncommitted += len(records)
+        if self.uncommitted >= self.commit_every:
+            self.connection.commit()
+            self.uncommitted = 0
+        return ops
+
+    def _digests(self, table, item_type, keys):
+        for start in range(0, len(keys), self.QUERY_CHUNK):
+            chunk = keys[start:start + self.QUERY_CHUNK]
+            yield from self.connection.execute(
+                f'SELECT key, digest FROM {table} WHERE spider = ? AND item_type = ? '
+                f'AND key IN ({",".join("?" * len(chunk))})',
+                (self.spider_name, item_type, *chunk),
+            )
+
+    def deletions(self, scopes):
+        """
+        本次访问过的范围内、属于本次出现过的记录类型、但本次运行没有再出现的记录，
+        返回 (item_type, key, scope) 列表并从指纹库删除。只访问部分接口（如 species_all -a endpoints=...）时，
+        其他接口的记录类型不在本次的类型中，不会被误判为删除。
+        """
+        self.connection.execute('CREATE TEMP TABLE IF NOT EXISTS visited (scope TEXT PRIMARY KEY)')
+        self.connection.execute('CREATE TEMP TABLE IF NOT EXISTS seen_type (item_type TEXT PRIMARY KEY)')
+        self.connection.execute('DELETE FROM visited')
+        self.connection.execute('DELETE FROM seen_type')
+        self.connection.executemany('INSERT OR IGNORE INTO visited (scope) VALUES (?)', ((s,) for s in scopes))
+        self.connection.executemany('INSERT INTO seen_type (item_type) VALUES (?)', ((t,) for t in self.item_types))
+        condition = (
+            'spider = ? AND scope IN (SELECT scope FROM visited) AND item_type IN (SELECT item_type FROM seen_type) '
+            'AND NOT EXISTS (SELECT 1 FROM pending p WHERE p.spider = fingerprint.spider '
+            'AND p.item_type = fingerprint.item_type AND p.key = fingerprint.key)'
+        )
+        rows = self.connection.execute(
+            f'SELECT item_type, key, scope FROM fingerprint WHERE {condition}', (self.spider_name,)
+        ).fetchall()
+        self.connection.execute(f'DELETE FROM fingerprint WHERE {condition}', (self.spider_name,))
+        return rows
+
+    def close(self, commit=True):
+        """commit 为真时把本次运行的暂存记录并入指纹库，否则丢弃"""
+        if commit:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO fingerprint (spider, item_type, key, scope, digest, run) '
+                'SELECT spider, item_type, key, scope, digest, run FROM pending WHERE spider = ?',
+                (self.spider_name,),
+            )
+        self.connection.execute('DELETE FROM pending WHERE spider = ?', (self.spider_name,))
+        self.connection.commit()
+        self.connection.close()
+
+
+class ChangeSetWriter:
+    """
+    变更集：每次运行一个 <目录>/<爬虫名>_<运行编号>.jsonl，
+    每行 {"op": "insert" | "update" | "delete", "type": 记录类型, "key": 主键, "scope": 范围}。
+    insert / update 的完整记录照常交给管道写入批次文件，delete 只出现在变更集中。
+    """
+
+    def __init__(self, directory, spider_name, run):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f'{spider_name}_{run}.jsonl')
+        self.file = open(self.path, 'ab')
+        self.counts = {}
+
+    def write(self, op, item_type, key, scope):
+        self.file.write(encode_record({'op': op, 'type': item_type, 'key': key, 'scope': scope}) + b'\n')
+        self.counts[op] = self.counts.get(op, 0) + 1
+
+    def close(self):
+        self.file.close()
+
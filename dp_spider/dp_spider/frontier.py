@@ -0,0 +1,468 @@
+import heapq
+import itertools
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from scrapy import signals
+from scrapy.core.scheduler import BaseScheduler, Scheduler
+from scrapy.exceptions import DontCloseSpider, NotConfigured
+from scrapy.utils.request import request_from_dict
+from twisted.internet import defer, task, threads
+from twisted.python.threadpool import ThreadPool
+
+logger = logging.getLogger(__name__)
+
+# 序列化请求时去掉的 meta：由下载器中间件在每次下载前重新设置，且不一定能被 pickle
+TRANSIENT_META_KEYS = ('ssl_context_factory', 'download_slot', 'download_latency')
+
+
+class MemoryBackend:
+    """
+    进程内后端：同名实例共享同一份队列与集合，用于单进程测试或多个爬虫在同一进程内协作。
+    队列按优先级从高到低、同优先级先进先出。
+    """
+
+    _stores = {}
+    _stores_lock = threading.Lock()
+
+    def __init__(self, name='default'):
+        with self._stores_lock:
+            self.store = self._stores.setdefault(
+                name, {'queues': {}, 'sets': {}, 'lock': threading.Lock(), 'counter': itertools.count()}
+            )
+        self.lock = self.store['lock']
+
+    def push(self, key, values, priority=0):
+        with self.lock:
+            queue = self.store['queues'].setdefault(key, [])
+            for value in values:
+                heapq.heappush(queue, (-priority, next(self.store['counter']), value))
+
+    def pop(self, key):
+        with self.lock:
+            queue = self.store['queues'].get(key)
+            return heapq.heappop(queue)[2] if queue else None
+
+    def size(self, key):
+        return len(self.store['queues'].get(key, ()))
+
+    def add(self, key, member):
+        """加入集合，返回是否为新成员"""
+        with self.lock:
+            members = self.store['sets'].setdefault(key, set())
+            if member in members:
+                return False
+            members.add(member)
+            return True
+
+    def contains(self, key, member):
+        return member in self.store['sets'].get(key, ())
+
+    def delete(self, *keys):
+        with self.lock:
+            for key in keys:
+                self.store['queues'].pop(key, None)
+                self.store['sets'].pop(key, None)
+
+    def close(self):
+        pass
+
+
+class SqliteBackend:
+    """
+    单文件后端：同一台机器上的多个爬虫进程共享一个 SQLite 文件，出队在 BEGIN IMMEDIATE 事务内完成，
+    一个请求只会被一个进程取走。用于在单机上测试或运行多进程分布式爬取。
+    等待写锁最多 60 秒，只在 FrontierScheduler 的后端线程中调用，不阻塞 reactor。
+    """
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS queue ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT, priority INTEGER, value BLOB)'
+        )
+        self.connection.execute('CREATE INDEX IF NOT EXISTS queue_order ON queue (key, priority DESC, id)')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS member (key TEXT, value BLOB, PRIMARY KEY (key, value)) WITHOUT ROWID'
+        )
+
+    def push(self, key, values, priority=0):
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            self.connection.executemany(
+                'INSERT INTO queue (key, priority, value) VALUES (?, ?, ?)',
+                ((key, priority, value) for value in values),
+            )
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            raise
+        self.connection.execute('COMMIT')
+
+    def pop(self, key):
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = self.connection.execute(
+                'SELECT id, value FROM queue WHERE key = ? ORDER BY priority DESC, id LIMIT 1', (key,)
+            ).fetchone()
+            if row is not None:
+                self.connection.execute('DELETE FROM queue WHERE id = ?', (row[0],))
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            raise
+        self.connection.execute('COMMIT')
+        return row[1] if row is not None else None
+
+    def size(self, key):
+        return self.connection.execute('SELECT COUNT(*) FROM queue WHERE key = ?', (key,)).fetchone()[0]
+
+    def add(self, key, member):
+        cursor = self.connection.execute('INSERT OR IGNORE INTO member (key, value) VALUES (?, ?)', (key, member))
+        return cursor.rowcount == 1
+
+    def contains(self, key, member):
+        return self.connection.execute(
+            'SELECT 1 FROM member WHERE key = ? AND value = ?', (key, member)
+        ).fetchone() is not None
+
+    def delete(self, *keys):
+        for key in keys:
+            self.connection.execute('DELETE FROM queue WHERE key = ?', (key,))
+            self.connection.execute('DELETE FROM member WHERE key = ?', (key,))
+
+    def close(self):
+        self.connection.close()
+
+
+class RedisBackend:
+    """
+    Redis 后端：队列为有序集合（分数为 -优先级，ZPOPMIN 原子出队），去重与标记为集合，
+    多台机器上的爬虫进程连接同一个 Redis 即可分担任务。需要安装 redis（redis-py），要求 Redis >= 5.0。
+
+    同分数的成员按字节序排列，且相同的值只会保留一个，因此每个成员前加 8 字节大端序号（<键>:seq 计数器分配）：
+    同优先级先进先出，dont_filter 的重复请求也各自保留。
+    """
+
+    SEQUENCE_BYTES = 8
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise NotConfigured('Redis 后端需要安装 redis')
+        self.server = redis.Redis.from_url(url)
+
+    def push(self, key, values, priority=0):
+        values = list(values)
+        if not values:
+            return
+        last = self.server.incrby(f'{key}:seq', len(values))
+        first = last - len(values) + 1
+        self.server.zadd(key, {
+            (first + i).to_bytes(self.SEQUENCE_BYTES, 'big') + value: -priority for i, value in enumerate(values)
+        })
+
+    def pop(self, key):
+        result = self.server.zpopmin(key)
+        return result[0][0][self.SEQUENCE_BYTES:] if result else None
+
+    def size(self, key):
+        return self.server.zcard(key)
+
+    def add(self, key, member):
+        return self.server.sadd(key, member) == 1
+
+    def contains(self, key, member):
+        return bool(self.server.sismember(key, member))
+
+    def delete(self, *keys):
+        self.server.delete(*keys, *(f'{key}:seq' for key in keys))
+
+    def close(self):
+        self.server.close()
+
+
+def open_backend(url):
+    """
+    按 URL 创建后端：
+        memory://<名称>      进程内
+        sqlite:///<路径>     单机多进程（SQLite 文件）
+        redis://host:port/db 多机
+    """
+    scheme, _, rest = url.partition('://')
+    if scheme == 'memory':
+        return MemoryBackend(rest or 'default')
+    if scheme == 'sqlite':
+        return SqliteBackend(rest)
+    if scheme in ('redis', 'rediss', 'unix'):
+        return RedisBackend(url)
+    raise NotConfigured(f'不支持的分布式队列后端: {url}')
+
+
+class FrontierScheduler(BaseScheduler):
+    """
+    分布式调度器：请求序列化后放入共享队列（FRONTIER_BACKEND），去重指纹放入共享集合，
+    多个爬虫进程 / 主机从同一个队列取任务，分页扇出的请求也会被其他进程取走。
+    物种 ID 同样放入共享队列（见 species_ids()）：第一个启动的进程负责把本地 ID 文件灌入队列，
+    各进程在本地待处理的请求不足时成批领取，调用爬虫的 species_requests 生成起始请求（与编排器的 StreamFeeder 相同），
+    因此只需在一台机器上准备 data/species_id。
+
+    后端读写可能阻塞（SQLite 等待写锁、Redis 网络往返），全部在一个专用线程中执行，reactor 线程只操作本地缓冲：
+    enqueue_request 把请求放入待推送缓冲，next_request 从预取缓冲中取；每 FRONTIER_POLL_INTERVAL 秒
+    由 LoopingCall 在后台线程中推送缓冲的请求并去重，再把预取缓冲补足到 FRONTIER_PREFETCH 个。
+    去重因此是异步的：被过滤的请求计入 frontier/filtered，不再触发 request_dropped 信号。
+
+    FRONTIER_BACKEND 为空时退化为 Scrapy 默认调度器，单机运行不受影响。
+    队列默认持久保存，中断后重新启动即从剩余的任务继续；FRONTIER_RESET 为真时启动前清空。
+    队列暂时为空时等待 FRONTIER_IDLE_TIMEOUT 秒再关闭爬虫，以便接收其他进程扇出的分页。
+    关闭时预取但未执行的请求放回共享队列；已被取走但尚未完成的请求在进程崩溃时会丢失，与 Scrapy-Redis 相同。
+    """
+
+    def __init__(self, crawler, backend, prefix='dp_spider', reset=False, idle_timeout=10, prefetch=100,
+                 poll_interval=0.1, species_batch=100):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.backend = backend
+        self.prefix = prefix
+        self.reset = reset
+        self.idle_timeout = idle_timeout
+        self.prefetch = prefetch  # 预取缓冲的容量
+        self.poll_interval = poll_interval
+        self.species_batch = species_batch  # 每次领取的物种 ID 数
+        self.low_water = crawler.settings.getint('CONCURRENT_REQUESTS', 16)  # 待处理的请求少于此数时领取物种
+        self.fingerprinter = crawler.request_fingerprinter
+        self.spider = None
+        self.last_activity = time.monotonic()
+        self.outgoing = []  # 待推送的 (指纹，dont_filter 时为 None, 优先级, 序列化的请求)
+        self.incoming = deque()  # 已预取、尚未交给引擎的序列化请求
+        self.remote_size = 0  # 上次交换后共享队列中的请求数
+        self.exchanging = None  # 正在后台线程中进行的交换
+        self.species_feeding = False  # 是否从共享队列领取物种 ID（调用过 species_ids()）
+        self.species_exhausted = False
+        self.species_deadline = None
+        self.pool = ThreadPool(minthreads=1, maxthreads=1, name='frontier')
+        self.task = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        url = settings.get('FRONTIER_BACKEND')
+        if not url:
+            return Scheduler.from_crawler(crawler)
+        scheduler = cls(
+            crawler,
+            open_backend(url),
+            prefix=settings.get('FRONTIER_PREFIX', 'dp_spider'),
+            reset=settings.getbool('FRONTIER_RESET'),
+            idle_timeout=settings.getfloat('FRONTIER_IDLE_TIMEOUT', 10),
+            prefetch=settings.getint('FRONTIER_PREFETCH', 100),
+            poll_interval=settings.getfloat('FRONTIER_POLL_INTERVAL', 0.1),
+        )
+        crawler.signals.connect(scheduler.spider_idle, signal=signals.spider_idle)
+        return scheduler
+
+    def key(self, name):
+        return f'{self.prefix}:{self.spider.name}:{name}'
+
+    def _call(self, f, *args):
+        """在后端线程中执行 f，返回 Deferred；线程只有一个，调用按提交顺序执行"""
+        from twisted.internet import reactor
+        return threads.deferToThreadPool(reactor, self.pool, f, *args)
+
+    def open(self, spider):
+        self.spider = spider
+        spider.frontier = self
+        self.pool.start()
+        d = self._call(self._open_backend)
+        d.addCallback(self._opened)
+        return d
+
+    def _open_backend(self):
+        if self.reset:
+            self.backend.delete(
+                self.key('requests'), self.key('seen'), self.key('species'), self.key('flags')
+            )
+        return self.backend.size(self.key('requests'))
+
+    def _opened(self, size):
+        self.remote_size = size
+        logger.info(f'分布式队列：{size} 个待处理请求')
+        self.task = task.LoopingCall(self.poll)
+        self.task.start(self.poll_interval)
+
+    def close(self, reason):
+        if self.task is not None and self.task.running:
+            self.task.stop()
+        d = self.exchanging if self.exchanging is not None else defer.succeed(None)
+        d.addBoth(lambda _: self._call(self._close_backend, self.outgoing, list(self.incoming)))
+        d.addErrback(lambda failure: logger.error(f'关闭分布式队列失败: {failure.getErrorMessage()}'))
+        d.addBoth(self._stop)
+        return d
+
+    def _close_backend(self, outgoing, incoming):
+        self._push(outgoing)
+        for value in incoming:
+            self.backend.push(self.key('requests'), [value], pickle.loads(value)['priority'])
+        self.backend.close()
+
+    def _stop(self, result):
+        self.pool.stop()
+        return result
+
+    def has_pending_requests(self):
+        return bool(self.incoming or self.outgoing or self.remote_size)
+
+    def enqueue_request(self, request):
+        fingerprint = None if request.dont_filter else self.fingerprinter.fingerprint(request)
+        data = request.to_dict(spider=self.spider)
+        for key in TRANSIENT_META_KEYS:
+            data['meta'].pop(key, None)
+        self.outgoing.append((fingerprint, request.priority, pickle.dumps(data, protocol=4)))
+        self.last_activity = time.monotonic()
+        return True
+
+    def next_request(self):
+        if not self.incoming:
+            return None
+        self.stats.inc_value('frontier/dequeued', spider=self.spider)
+        self.last_activity = time.monotonic()
+        return request_from_dict(pickle.loads(self.incoming.popleft()), spider=self.spider)
+
+    def spider_idle(self, spider):
+        if self.incoming or self.outgoing or self.exchanging is not None:
+            raise DontCloseSpider
+        if self.species_feeding and not self.species_exhausted:
+            raise DontCloseSpider
+        # 其他进程可能还在扇出分页，队列空了一段时间后才关闭
+        if time.monotonic() - self.last_activity < self.idle_timeout:
+            raise DontCloseSpider
+
+    def poll(self):
+        """与共享队列交换一次：推送待推送缓冲、补足预取缓冲、按需领取物种 ID；上一次交换未完成时跳过"""
+        if self.exchanging is not None:
+            return
+        want = max(self.prefetch - len(self.incoming), 0)
+        species = self.species_batch if self._wants_species() else 0
+        if not self.outgoing and not want and not species:
+            return
+        outgoing, self.outgoing = self.outgoing, []
+        d = self.exchanging = self._call(self._exchange, outgoing, want, species)
+        d.addCallbacks(self._exchanged, self._exchange_failed, callbackArgs=(species,), errbackArgs=(outgoing,))
+        d.addBoth(self._exchange_done)
+
+    def _wants_species(self):
+        if not self.species_feeding or self.species_exhausted:
+            return False
+        return len(self.incoming) + len(self.outgoing) < self.low_water and self.remote_size < self.low_water
+
+    def _exchange(self, outgoing, want, species):
+        """后端线程：推送请求，预取至多 want 个请求，领取至多 species 个物种 ID"""
+        filtered = self._push(outgoing)
+        requests = self._pop(self.key('requests'), want)
+        # 先读标记再领取：灌入完成后仍领不满，才说明物种 ID 已取完
+        seeded = bool(species) and self.backend.contains(self.key('flags'), b'seeded')
+        species_ids = self._pop(self.key('species'), species)
+        return len(outgoing) - filtered, filtered, requests, species_ids, seeded, self.backend.size(self.key('requests'))
+
+    def _push(self, outgoing):
+        """去重后按优先级成批推送，返回被过滤的请求数"""
+        filtered = 0
+        groups = {}
+        for fingerprint, priority, value in outgoing:
+            if fingerprint is not None and not self.backend.add(self.key('seen'), fingerprint):
+                filtered += 1
+                continue
+            groups.setdefault(priority, []).append(value)
+        for priority, values in groups.items():
+            self.backend.push(self.key('requests'), values, priority)
+        return filtered
+
+    def _pop(self, key, count):
+        values = []
+        while len(values) < count:
+            value = self.backend.pop(key)
+            if value is None:
+                break
+            values.append(value)
+        return values
+
+    def _exchanged(self, result, species):
+        pushed, filtered, requests, species_ids, seeded, size = result
+        self.stats.inc_value('frontier/enqueued', pushed, spider=self.spider)
+        self.stats.inc_value('frontier/filtered', filtered, spider=self.spider)
+        self.remote_size = size
+        if pushed or requests or species_ids:
+            self.last_activity = time.monotonic()
+        if requests:
+            self.incoming.extend(requests)
+            slot = getattr(self.crawler.engine, 'slot', None)
+            if slot is not None:
+                slot.nextcall.schedule()  # 唤醒引擎，不必等到下一次心跳
+        if species_ids:
+            self._feed_species(species_ids)
+        if species and len(species_ids) < species:
+            if seeded:
+                self.species_exhausted = True
+                logger.info('分布式队列中的物种 ID 已领取完')
+            elif time.monotonic() > self.species_deadline:
+                self.species_exhausted = True
+                logger.warning('等待物种 ID 灌入超时，按队列已取空处理')
+
+    def _exchange_failed(self, failure, outgoing):
+        # 推送失败的请求留在本地，下次交换时重试；指纹可能已写入去重集合，重试时不再去重
+        logger.error(f'分布式队列交换失败: {failure.getErrorMessage()}')
+        self.outgoing[:0] = [(None, priority, value) for _, priority, value in outgoing]
+
+    def _exchange_done(self, result):
+        self.exchanging = None
+        return result
+
+    def _feed_species(self, species_ids):
+        """调用爬虫的 species_requests 生成起始请求，经爬虫中间件的 process_start_requests 后交给引擎"""
+        self.stats.inc_value('frontier/species', len(species_ids), spider=self.spider)
+        engine = self.crawler.engine
+        requests = (
+            request for value in species_ids for request in self.spider.species_requests(value.decode('utf-8'))
+        )
+        d = engine.scraper.spidermw.process_start_requests(requests, self.spider)
+        d.addCallback(lambda results: [engine.crawl(request) for request in results])
+        d.addErrback(lambda failure: logger.error(f'{self.spider.name} 生成请求失败: {failure.getErrorMessage()}'))
+
+    def species_ids(self, local_ids, wait=60):
+        """
+        从共享队列领取物种 ID。第一个抢到 seeding 标记的进程在后端线程中把 local_ids 灌入队列。
+        返回空迭代器，start_requests 不会因等待队列而阻塞 reactor；物种 ID 由 poll() 成批领取后
+        交给爬虫的 species_requests。灌入者中途退出、wait 秒后仍未出现 seeded 标记时，按队列已取空处理。
+        """
+        self.species_feeding = True
+        self.species_deadline = time.monotonic() + wait
+        d = self._call(self._seed, local_ids)
+        d.addErrback(lambda failure: logger.error(f'物种 ID 灌入失败: {failure.getErrorMessage()}'))
+        return iter(())
+
+    def _seed(self, local_ids, chunk_size=1000):
+        species_key, flags_key = self.key('species'), self.key('flags')
+        local_ids = iter(local_ids)
+        first = next(local_ids, None)
+        # 本机没有物种 ID 文件的进程不参与抢占，只领取
+        if first is None or not self.backend.add(flags_key, b'seeding'):
+            return
+        chunk = []
+        for species_id in itertools.chain([first], local_ids):
+            chunk.append(species_id.encode('utf-8'))
+            if len(chunk) >= chunk_size:
+                self.backend.push(species_key, chunk)
+                chunk = []
+        if chunk:
+            self.backend.push(species_key, chunk)
+        self.backend.add(flags_key, b'seeded')
+        logger.info(f'已把 {self.backend.size(species_key)} 个物种 ID 放入分布式队列')
@@ -0,0 +1,137 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+import zlib
+from urllib.parse import parse_qsl, urlencode
+
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+from scrapy.utils.project import data_path
+from w3lib.http import headers_dict_to_raw, headers_raw_to_dict
+from w3lib.url import canonicalize_url
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(request):
+    """
+    缓存主键：请求方法 + 规范化的 URL + 规范化的表单体。
+    表单体按参数名排序后再参与计算，同样的分页参数无论以什么顺序编码都命中同一条缓存。
+    """
+    body = request.body
+    content_type = request.headers.get('Content-Type', b'')
+    if body and content_type.startswith(b'application/x-www-form-urlencoded'):
+        pairs = sorted(parse_qsl(body.decode('utf-8'), keep_blank_values=True))
+        body = urlencode(pairs).encode('utf-8')
+    digest = hashlib.sha1()
+    digest.update(request.method.encode('ascii'))
+    digest.update(b'\0')
+    digest.update(canonicalize_url(request.url).encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(body or b'')
+    return digest.hexdigest()
+
+
+class SqliteCacheStorage:
+    """
+    HTTP 缓存存储（HTTPCACHE_STORAGE）：每个爬虫一个 SQLite 文件 <HTTPCACHE_DIR>/<爬虫名>.sqlite3，
+    响应体以 zlib 压缩保存。与 Scrapy 自带存储不同，主键包含规范化的表单体（见 cache_key），
+    因此 pestchina webapi 的 POST 列表接口也能按分页参数命中缓存，重跑解析与管道时无需访问网络。
+
+    HTTPCACHE_EXPIRATION_SECS 控制过期时间（0 为永不过期）；
+    HTTPCACHE_MAX_MB 控制压缩后的总大小，超出时按最近访问时间淘汰最旧的条目，直到降到上限的 90%。
+    空响应体与 HTTPCACHE_IGNORE_HTTP_CODES 中的状态码是服务器的临时故障，不保存；
+    缓存中已有的此类条目（忽略列表调整之前写入的）读取时视为未命中，重试会重新访问网络。
+    """
+
+    def __init__(self, settings):
+        self.cachedir = data_path(settings['HTTPCACHE_DIR'], createdir=True)
+        self.expiration_secs = settings.getint('HTTPCACHE_EXPIRATION_SECS')
+        self.max_bytes = settings.getint('HTTPCACHE_MAX_MB') * 1024 * 1024
+        self.compression_level = settings.getint('HTTPCACHE_COMPRESSION_LEVEL', 6)
+        self.commit_every = settings.getint('HTTPCACHE_COMMIT_EVERY', 200)
+        self.ignore_http_codes = {int(code) for code in settings.getlist('HTTPCACHE_IGNORE_HTTP_CODES')}
+        self.connection = None
+        self.total_bytes = 0
+        self.uncommitted = 0
+
+    def open_spider(self, spider):
+        path = os.path.join(self.cachedir, f'{spider.name}.sqlite3')
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        with self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS response ('
+                'key TEXT PRIMARY KEY, url TEXT, status INTEGER, headers BLOB, body BLOB, '
+                'size INTEGER, stored REAL, accessed REAL)'
+            )
+            self.connection.execute('CREATE INDEX IF NOT EXISTS response_accessed ON response (accessed)')
+        self.total_bytes = self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM response').fetchone()[0]
+        logger.debug(f'HTTP 缓存: {path}（{self.total_bytes / 1024 / 1024:.1f} MB）')
+
+    def close_spider(self, spider):
+        self.connection.commit()
+        self.connection.close()
+
+    def retrieve_response(self, spider, request):
+        key = cache_key(request)
+        row = self.connection.execute(
+            'SELECT url, status, headers, body, stored FROM response WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        url, status, raw_headers, body, stored = row
+        now = time.time()
+        if 0 < self.expiration_secs < now - stored or status in self.ignore_http_codes:
+            return None
+        self._execute('UPDATE response SET accessed = ? WHERE key = ?', (now, key))
+        headers = Headers(headers_raw_to_dict(raw_headers))
+        body = zlib.decompress(body)
+        if not body:
+            return None
+        respcls = responsetypes.from_args(headers=headers, url=url, body=body)
+        return respcls(url=url, headers=headers, status=status, body=body)
+
+    def store_response(self, spider, request, response):
+        if not response.body:
+            return
+        key = cache_key(request)
+        headers = headers_dict_to_raw(response.headers)
+        body = zlib.compress(response.body, self.compression_level)
+        size = len(headers) + len(body)
+        previous = self.connection.execute('SELECT size FROM response WHERE key = ?', (key,)).fetchone()
+        now = time.time()
+        self._execute(
+            'INSERT OR REPLACE INTO response (key, url, status, headers, body, size, stored, accessed) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (key, response.url, response.status, headers, body, size, now, now),
+        )
+        self.total_bytes += size - (previous[0] if previous else 0)
+        if self.max_bytes and self.total_bytes > self.max_bytes:
+            self._evict()
+
+    def _execute(self, sql, parameters):
+        self.connection.execute(sql, parameters)
+        self.uncommitted += 1
+        if self.uncommitted >= self.commit_every:
+            self.connection.commit()
+            self.uncommitted = 0
+
+    def _evict(self):
+        """按最近访问时间淘汰最旧的条目，直到总大小降到上限的 90%"""
+        target = self.max_bytes * 0.9
+        evicted = []
+        freed = 0
+        for key, size in self.connection.execute('SELECT key, size FROM response ORDER BY accessed'):
+            if self.total_bytes - freed <= target:
+                break
+            evicted.append((key,))
+            freed += size
+        self.connection.executemany('DELETE FROM response WHERE key = ?', evicted)
+        self.connection.commit()
+        self.uncommitted = 0
+        self.total_bytes -= freed
+        logger.debug(f'HTTP 缓存淘汰 {len(evicted)} 条，释放 {freed / 1024 / 1024:.1f} MB')
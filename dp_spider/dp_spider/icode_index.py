@@ -0,0 +1,154 @@
+import csv
+import os
+import sqlite3
+import time
+
+from .species_ids import parse_shard
+
+# 默认的索引文件路径（相对于项目根目录）
+DEFAULT_INDEX_PATH = os.path.join('data', 'icode_index.sqlite3')
+# 旧流程中 reference_cleaning.py 生成的 icode 列表
+REFERENCE_RELATION_CSV = os.path.join('cleaned_data', 'reference_relation.csv')
+
+# 携带文献引用的嵌套字段：字段名 -> (是否为列表, icode 字段名)
+ICODE_SOURCES = {
+    'Icodes': (True, 'ICodeID'),
+    'cankao': (False, 'Icode'),
+}
+
+
+def normalize_icode(value):
+    """把 icode 统一为去除首尾空白的字符串，空值返回 None"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def extract_icodes(record):
+    """
+    从一条记录的 Icodes 列表与 cankao 对象中提取 icode。
+
+    参数:
+        record (dict): ItemAdapter.asdict() 得到的记录
+    返回:
+        list: icode 字符串列表（可能有重复）
+    """
+    icodes = []
+    for source, (is_list, field) in ICODE_SOURCES.items():
+        value = record.get(source)
+        if not value:
+            continue
+        for entry in (value if is_list else [value]):
+            icode = normalize_icode(entry.get(field)) if isinstance(entry, dict) else None
+            if icode:
+                icodes.append(icode)
+    return icodes
+
+
+class IcodeIndex:
+    """
+    持久化的文献 icode 索引：SQLite 单表，icode 为主键。
+    各爬虫的 IcodeIndexPipeline 在 Item 流过时增量写入（INSERT OR IGNORE，只处理新增的 icode），
+    issue_code_detail / file_metadata 爬虫直接从索引读取，无需再运行 reference_cleaning.py 全量扫描。
+    进程内维护一份已知 icode 集合，重复的 icode 不会触发数据库写入，成员判断为 O(1)。
+    """
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        with self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS icode (icode TEXT PRIMARY KEY, source TEXT, first_seen REAL)'
+            )
+        self.known = {row[0] for row in self.connection.execute('SELECT icode FROM icode')}
+        self.pending = {}  # 尚未写入数据库的新 icode -> 来源
+
+    def __contains__(self, icode):
+        return normalize_icode(icode) in self.known
+
+    def __len__(self):
+        return len(self.known)
+
+    def __iter__(self):
+        return iter(sorted(self.known))
+
+    def add(self, icode, source=None):
+        """登记一个 icode，返回它是否为新增"""
+        icode = normalize_icode(icode)
+        if not icode or icode in self.known:
+            return False
+        self.known.add(icode)
+        self.pending[icode] = source
+        return True
+
+    def flush(self):
+        """把新增的 icode 批量写入数据库，返回写入条数"""
+        if not self.pending:
+            return 0
+        now = time.time()
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO icode (icode, source, first_seen) VALUES (?, ?, ?)',
+                [(icode, source, now) for icode, source in self.pending.items()],
+            )
+        count = len(self.pending)
+        self.pending = {}
+        return count
+
+    def import_csv(self, path=REFERENCE_RELATION_CSV, source='reference_relation'):
+        """导入旧流程生成的 reference_relation.csv，返回新增条数"""
+        added = 0
+        with open(path, 'r', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                added += self.add(row.get('icode'), source)
+        self.flush()
+        return added
+
+    def export_csv(self, path=REFERENCE_RELATION_CSV):
+        """按 reference_cleaning.py 的格式导出 icode 列表"""
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['icode'])
+            for icode in self:
+                writer.writerow([icode])
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+
+def load_icodes(index_path=DEFAULT_INDEX_PATH, csv_path=REFERENCE_RELATION_CSV, shard=None):
+    """
+    读取待请求的 icode 列表：优先使用 icode 索引，不存在时回退到 reference_relation.csv。
+    索引为空（新建、尚未有爬虫登记过 icode）而 reference_relation.csv 存在时，先把 CSV 导入索引。
+    shard="i/n" 时只返回排序后序号 % n == i 的 icode，多个爬虫进程各取一片。
+
+    返回:
+        list: 排序后的 icode 列表；两者都不存在时抛出 FileNotFoundError
+    """
+    shard_index, shard_count = parse_shard(shard)
+    if os.path.exists(index_path):
+        index = IcodeIndex(index_path)
+        try:
+            if not len(index) and os.path.exists(csv_path):
+                index.import_csv(csv_path)
+            icodes = list(index)
+        finally:
+            index.close()
+    else:
+        icodes = set()
+        with open(csv_path, 'r', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                icode = normalize_icode(row.get('icode'))
+                if icode:
+                    icodes.add(icode)
+        icodes = sorted(icodes)
+    if shard_count > 1:
+        icodes = icodes[shard_index::shard_count]
+    return icodes
@@ -0,0 +1,140 @@
+import glob
+import json
+import logging
+import os
+
+from .fingerprints import crawl_was_complete
+
+logger = logging.getLogger(__name__)
+
+_PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 各数据源的 TP_MODIFIED 高水位（相对于项目根目录）
+DEFAULT_STATE_PATH = os.path.join('data', 'incremental_state.json')
+# 增量模式下发生变化的物种 ID 目录，文件格式与 data/species_id 相同
+DEFAULT_DELTA_DIR = os.path.join(_PROJECT_DIR, 'data', 'species_id_delta')
+
+
+def incremental_enabled(spider):
+    """爬虫参数 -a incremental=1 或配置 INCREMENTAL_ENABLED 开启增量模式，爬虫参数优先"""
+    value = getattr(spider, 'incremental', None)
+    if value is None:
+        return spider.settings.getbool('INCREMENTAL_ENABLED')
+    return str(value).lower() not in ('', '0', 'false', 'no')
+
+
+def delta_dir(settings):
+    return settings.get('SPECIES_ID_DELTA_DIR') or DEFAULT_DELTA_DIR
+
+
+def is_older(modified, mark):
+    """
+    modified 是否早于高水位 mark。TP_MODIFIED 形如 "2024-03-30 16:10:48.000"，可直接按字符串比较；
+    缺失的时间戳在倒序排列中排在最后，视为更早。
+    """
+    return not modified or modified < mark
+
+
+class HighWaterMarks:
+    """各数据源已完整处理到的最大 TP_MODIFIED，保存在 JSON 文件中"""
+
+    def __init__(self, path=DEFAULT_STATE_PATH):
+        self.path = path
+        self.marks = {}  # 数据源 -> TP_MODIFIED
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return self
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.marks = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f'读取增量高水位失败，将执行全量爬取: {e}')
+        return self
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.marks, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def get(self, source):
+        return self.marks.get(source)
+
+    def advance(self, source, modified):
+        if modified and (source not in self.marks or modified > self.marks[source]):
+            self.marks[source] = modified
+
+
+def write_delta_ids(directory, species_ids):
+    """
+    用本次变化的物种 ID 替换 directory 中的 species_ids_<N>.json，
+    下游爬虫以 -a incremental=1 运行时通过 SpeciesIdSource 读取。
+    """
+    os.makedirs(directory, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, 'species_ids_*.json*')):
+        os.remove(path)
+    path = os.path.join(directory, 'species_ids_1.json')
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(list(species_ids), f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+class IncrementalListCrawl:
+    """
+    按 TP_MODIFIED 倒序分页的列表接口的增量爬取：
+    记录上次完整爬取时的最大 TP_MODIFIED（高水位），本次遇到早于高水位的记录即停止翻页，
+    只把不早于高水位的记录（同一时间戳可能有上次之后新增的记录，因此包含等于）视为变化。
+    爬虫正常结束且没有请求失败（见 crawl_was_complete，含写入死信的解析失败）时写出变化的物种 ID 并推进高水位；
+    否则高水位不变，下次重新覆盖这段区间。
+
+    变化只按列表接口自身的 TP_MODIFIED 判定，不比较详情记录（分布、寄主、关联信息等）的时间戳：
+    这些接口只能按物种 ID 逐个查询，没有跨物种按修改时间排序的列表，要取得其时间戳就得把每个物种都请求一遍，
+    增量也就无从谈起。因此只改了详情、列表记录的 TP_MODIFIED 没有变化的物种不会进入增量，
+    需要定期（如每周）以全量模式运行下游爬虫兜底；同时开启 CHANGE_DETECTION_ENABLED 时全量运行只输出真正变化的记录。
+    """
+
+    def __init__(self, source, marks, delta_dir=DEFAULT_DELTA_DIR, key_field='TP_GUID'):
+        self.source = source
+        self.marks = marks
+        self.mark = marks.get(source)  # 为 None 时本次为全量爬取
+        self.delta_dir = delta_dir
+        self.key_field = key_field
+        self.changed = {}  # 变化的物种 ID（保持顺序去重）
+        self.newest = None
+        self.exhausted = False  # 已经遇到早于高水位的记录
+
+    @classmethod
+    def from_spider(cls, spider, source):
+        settings = spider.settings
+        marks = HighWaterMarks(settings.get('INCREMENTAL_STATE_PATH') or DEFAULT_STATE_PATH).load()
+        return cls(source, marks, delta_dir=delta_dir(settings))
+
+    def accept(self, record):
+        """记录是否属于本次增量；遇到早于高水位的记录后不再翻页"""
+        modified = record.get('TP_MODIFIED')
+        if self.mark is not None and is_older(modified, self.mark):
+            self.exhausted = True
+            return False
+        if modified and (self.newest is None or modified > self.newest):
+            self.newest = modified
+        key = record.get(self.key_field)
+        if key:
+            self.changed[key] = None
+        return True
+
+    def close(self, reason, stats):
+        if reason != 'finished':
+            logger.warning(f'{self.source} 增量爬取未正常结束（{reason}），保留原高水位 {self.mark}')
+            return
+        if not crawl_was_complete(stats):
+            logger.warning(f'{self.source} 增量爬取有列表页失败，保留原高水位 {self.mark}')
+            return
+        write_delta_ids(self.delta_dir, self.changed)
+        self.marks.advance(self.source, self.newest)
+        self.marks.save()
+        logger.info(f'{self.source} 增量爬取完成：{len(self.changed)} 个物种有变化，高水位 {self.marks.get(self.source)}')
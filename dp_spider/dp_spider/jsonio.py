@@ -0,0 +1,38 @@
+import json
+
+try:
+    import orjson
+except ImportError:  # 可选依赖，未安装时使用标准库
+    orjson = None
+
+# 当前使用的解码后端名称
+BACKEND = 'orjson' if orjson is not None else 'json'
+
+# 可用的解码后端：名称 -> loads(bytes)，供基准测试对比
+BACKENDS = {'json': json.loads}
+if orjson is not None:
+    BACKENDS['orjson'] = orjson.loads
+
+_loads = BACKENDS[BACKEND]
+
+
+def loads(data):
+    """
+    解析 JSON 字节串（或字符串）。安装了 orjson 时直接解析 UTF-8 字节，否则交给标准库
+    （json.loads 同样接受字节串，自行识别 UTF-8/16/32）。
+    解析失败抛出 json.JSONDecodeError（orjson.JSONDecodeError 是它的子类）。
+    """
+    return _loads(data)
+
+
+def response_json(response):
+    """
+    解析接口响应：直接解析 response.body，不再先把整个响应体解码成 response.text
+    （5000 行一页的列表接口有数 MB，解码本身就是一次完整的拷贝）。
+    快速路径失败时（非 UTF-8 编码、超出 64 位的整数、NaN 等 orjson 不接受的输入）
+    按响应声明的编码回退到 json.loads(response.text)，真正不合法的 JSON 仍抛出 json.JSONDecodeError。
+    """
+    try:
+        return _loads(response.body)
+    except ValueError:
+        return json.loads(response.text)
@@ -0,0 +1,177 @@
+"""
+多进程分片启动器：为一个爬虫启动 K 个 scrapy crawl 工作进程，每个进程用 -a shard=i/K 领取一片物种 ID
+（或 icode），把批次文件（以及检查点、死信、页大小学习结果、HTTP 缓存、日志与爬取指标）写到自己的目录
+data/shards/<爬虫名>/<i>-of-<K>/ 下，JSON 解析与记录构建分摊到多个核上。
+全部进程结束后把各进程已提交的分片依次移动到原有的 data/<数据集>/<前缀>_batch_<N> 中，编号接在已有文件之后，
+下游的 data_cleaning 脚本无需任何改动；死信追加到 DEAD_LETTER_DIR 下，可直接用 replay 重放。
+
+每个工作进程有独立的检查点与批次日志，中断后用同样的 K 重新运行即从各自的进度继续，
+已合并的记录不会重复爬取；需要重新全量爬取时删除 data/shards/<爬虫名>/。
+
+用法（在 scrapy.cfg 所在目录执行）:
+    python -m dp_spider.launcher species_distribution -k 4
+    python -m dp_spider.launcher issue_code_detail -k 8 -s CONCURRENT_REQUESTS=100
+    python -m dp_spider.launcher species_distribution -k 4 --merge-only
+"""
+import argparse
+import logging
+import os
+import subprocess
+import sys
+
+from scrapy.spiderloader import SpiderLoader
+from scrapy.utils.project import get_project_settings
+
+from .dead_letters import DEFAULT_DEAD_LETTER_DIR, merge_dead_letters
+from .storage import merge_batch_dir
+
+logger = logging.getLogger(__name__)
+
+# 各工作进程输出的根目录（相对于项目根目录）
+DEFAULT_SHARDS_DIR = os.path.join('data', 'shards')
+
+
+def worker_root(shards_dir, spider_name, index, count):
+    """第 index 个工作进程的输出根目录；分片数不同时目录不同，进度互不混用"""
+    return os.path.join(shards_dir, spider_name, f'{index}-of-{count}')
+
+
+def worker_dead_letter_dir(root):
+    return os.path.join(root, 'dead_letters')
+
+
+def worker_command(spider_name, index, count, root, spider_args=(), settings_args=()):
+    """
+    工作进程的命令行：分片参数、独立的输出目录，再附加用户传入的 -a / -s。
+    会被写入的状态文件都放在 root 下：多个进程写同一个文件时，页大小学习结果的临时文件会互相覆盖，
+    死信文件的行会交错，SQLite HTTP 缓存会互相阻塞。
+    """
+    command = [
+        sys.executable, '-m', 'scrapy', 'crawl', spider_name,
+        '-a', f'shard={index}/{count}',
+        '-s', f'BATCH_OUTPUT_ROOT={root}',
+        '-s', 'BATCH_JOURNAL_ENABLED=True',  # 只合并原子落盘的分片
+        '-s', 'CHECKPOINT_ENABLED=True',  # 批次日志靠检查点判定物种完成；重新运行时各工作进程从中断处继续
+        '-s', f'CHECKPOINT_DIR={os.path.join(root, "checkpoints")}',
+        '-s', f'DEAD_LETTER_DIR={worker_dead_letter_dir(root)}',
+        '-s', f'PAGE_SIZE_STATE_PATH={os.path.join(root, "page_sizes.json")}',
+        # 相对路径的 HTTPCACHE_DIR 位于 .scrapy/ 之下，这里给出绝对路径
+        '-s', f'HTTPCACHE_DIR={os.path.abspath(os.path.join(root, "httpcache"))}',
+        '-s', f'LOG_FILE={os.path.join(root, "crawl.log")}',
+        '-s', f'METRICS_DIR={os.path.join(root, "metrics")}',
+    ]
+    for value in spider_args:
+        command += ['-a', value]
+    for value in settings_args:
+        command += ['-s', value]
+    return command
+
+
+def check_spider(settings, spider_name):
+    """确认爬虫支持分片，且当前配置能够多进程运行；不满足时抛出 ValueError"""
+    spider_class = SpiderLoader.from_settings(settings).load(spider_name)
+    if not getattr(spider_class, 'shardable', False):
+        raise ValueError(f'{spider_name} 不按物种 ID / icode 分片，不能多进程运行')
+    if settings.get('FRONTIER_BACKEND'):
+        raise ValueError('已配置 FRONTIER_BACKEND，直接启动多个 scrapy crawl 进程共享队列即可')
+    if settings.getbool('CHANGE_DETECTION_ENABLED'):
+        # 指纹库每次运行持有一个写事务，多个进程会互相阻塞
+        raise ValueError('变化检测（CHANGE_DETECTION_ENABLED）不支持多进程运行')
+
+
+def run_workers(spider_name, count, shards_dir=DEFAULT_SHARDS_DIR, spider_args=(), settings_args=()):
+    """
+    启动 count 个工作进程并等待全部结束。
+
+    返回:
+        dict: 工作进程序号 -> 退出码
+    """
+    processes = {}
+    for index in range(count):
+        root = worker_root(shards_dir, spider_name, index, count)
+        os.makedirs(root, exist_ok=True)
+        command = worker_command(spider_name, index, count, root, spider_args, settings_args)
+        processes[index] = subprocess.Popen(command)
+        logger.info(f'已启动工作进程 {index}/{count}（pid {processes[index].pid}），日志: {root}/crawl.log')
+
+    codes = {}
+    for index, process in processes.items():
+        try:
+            codes[index] = process.wait()
+        except KeyboardInterrupt:
+            # Ctrl-C 同样发给了工作进程，等待它们提交已写入的分片后再合并
+            logger.warning('收到中断，等待工作进程退出')
+            codes[index] = process.wait()
+        logger.info(f'工作进程 {index}/{count} 退出，退出码 {codes[index]}')
+    return codes
+
+
+def merge_workers(spider_name, count, shards_dir=DEFAULT_SHARDS_DIR, dead_letter_dir=DEFAULT_DEAD_LETTER_DIR):
+    """
+    把各工作进程已提交的分片按进程序号依次合并到项目根目录下对应的数据集目录，死信追加到 dead_letter_dir。
+
+    返回:
+        dict: 目标目录 -> 合并的分片数（死信目录为合并的死信条数）
+    """
+    merged = {}
+    for index in range(count):
+        root = worker_root(shards_dir, spider_name, index, count)
+        if not os.path.isdir(root):
+            continue
+        letters = merge_dead_letters(worker_dead_letter_dir(root), dead_letter_dir)
+        if letters:
+            merged[dead_letter_dir] = merged.get(dead_letter_dir, 0) + letters
+        for dirpath, dirnames, _ in os.walk(root):
+            dirnames.sort()
+            dest_dir = os.path.relpath(dirpath, root)
+            if dest_dir == os.curdir:
+                continue
+            moved = merge_batch_dir(dirpath, dest_dir)
+            if moved:
+                merged[dest_dir] = merged.get(dest_dir, 0) + moved
+    return merged
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('spider', help='爬虫名称')
+    parser.add_argument('-k', '--workers', type=int, default=os.cpu_count() or 1, help='工作进程数（默认 CPU 核数）')
+    parser.add_argument('-a', dest='spider_args', action='append', default=[], metavar='NAME=VALUE',
+                        help='传给每个工作进程的爬虫参数')
+    parser.add_argument('-s', dest='settings_args', action='append', default=[], metavar='NAME=VALUE',
+                        help='传给每个工作进程的配置')
+    parser.add_argument('--shards-dir', default=DEFAULT_SHARDS_DIR, help='工作进程输出的根目录')
+    parser.add_argument('--merge-only', action='store_true', help='不启动爬虫，只合并已有的工作进程输出')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(name)s] %(levelname)s: %(message)s')
+
+    if args.workers < 1:
+        parser.error('工作进程数至少为 1')
+    if any(value.split('=', 1)[0] == 'shard' for value in args.spider_args):
+        parser.error('分片参数由启动器指定，不能再传入 -a shard')
+
+    codes = {}
+    settings = get_project_settings()
+    for value in args.settings_args:
+        name, _, setting = value.partition('=')
+        settings.set(name, setting, priority='cmdline')
+    if not args.merge_only:
+        try:
+            check_spider(settings, args.spider)
+        except (KeyError, ValueError) as e:
+            parser.error(str(e))
+        codes = run_workers(args.spider, args.workers, args.shards_dir, args.spider_args, args.settings_args)
+
+    dead_letter_dir = settings.get('DEAD_LETTER_DIR') or DEFAULT_DEAD_LETTER_DIR
+    merged = merge_workers(args.spider, args.workers, args.shards_dir, dead_letter_dir)
+    for dest_dir, moved in sorted(merged.items()):
+        unit = '条死信' if dest_dir == dead_letter_dir else '个分片'
+        logger.info(f'已合并 {moved} {unit}到 {dest_dir}')
+    failed = [index for index, code in codes.items() if code != 0]
+    if failed:
+        logger.error(f'工作进程 {failed} 未正常结束，已合并其已提交的分片；用同样的参数重新运行即可继续')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
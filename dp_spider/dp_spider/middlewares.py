@@ -1,6 +1,29 @@
+import logging
+import time
+
+from itemadapter import is_item
+from scrapy import signals
+from scrapy.exceptions import IgnoreRequest, NotConfigured
+from scrapy.utils.httpobj import urlparse_cached
+from twisted.internet import defer, task
+from twisted.internet.error import TimeoutError
 from twisted.internet._sslverify import ClientTLSOptions
 from twisted.internet.ssl import ClientContextFactory
 
+from .checkpoint import DEFAULT_CHECKPOINT_DIR, CrawlCheckpoint
+from .concurrency import ConcurrencyController
+from .dead_letters import DEFAULT_DEAD_LETTER_DIR, PARSE_FAILED_META, DeadLetterWriter, dead_letter_path
+from .extensions import endpoint_of
+from .fingerprints import (
+    DEFAULT_CHANGES_DIR, DEFAULT_STORE_PATH, ChangeSetWriter, FingerprintStore, crawl_was_complete, fingerprint,
+    record_key,
+)
+from .incremental import incremental_enabled
+from .page_size import PageSizePlanner
+from .records import item_class_of, to_dict
+
+logger = logging.getLogger(__name__)
+
 
 class InsecureContextFactory(ClientContextFactory):
     def getContext(self, hostname=None, port=None):
@@ -14,3 +37,467 @@ class InsecureRequestsMiddleware:
     def process_request(self, request, spider):
         if request.meta.get('dont_verify_ssl'):
             request.meta['ssl_context_factory'] = InsecureContextFactory()
+
+
+class ResumeMiddleware:
+    """
+    断点续爬中间件：丢弃记录已提交到批次日志（spider.committed_keys）的起始请求，
+    使重启后的爬虫只重新请求尚未落盘的物种 / 文献。
+    请求通过 meta 中的 RESUME_META_KEYS（默认 species_id、species_TP_GUID、icode）与已提交的主键匹配；
+    meta 中带 resume_dataset（批次文件前缀）的请求只与该数据集的日志比对（spider.committed_by_dataset），
+    供同时写多个数据集的组合爬虫使用。
+    物种的所有请求都已完成、记录都已落盘后才会写入日志（由 CheckpointMiddleware 判定，见 BatchWriter.finish），
+    未启用检查点时日志中没有主键，不跳过任何请求。
+    增量模式（-a incremental=1）下不跳过：变化的物种正是日志中已有、需要重新爬取的物种。
+    """
+
+    def __init__(self, stats, meta_keys):
+        self.stats = stats
+        self.meta_keys = meta_keys
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        meta_keys = crawler.settings.getlist('RESUME_META_KEYS', ['species_id', 'species_TP_GUID', 'icode'])
+        return cls(crawler.stats, meta_keys)
+
+    def process_start_requests(self, start_requests, spider):
+        if incremental_enabled(spider):
+            yield from start_requests
+            return
+        # 批次管道在 open_spider 中填充 committed_keys，而起始请求在其之后才被消费
+        committed = getattr(spider, 'committed_keys', None)
+        by_dataset = getattr(spider, 'committed_by_dataset', {})
+        for request in start_requests:
+            dataset = request.meta.get('resume_dataset')
+            keys = committed if dataset is None else by_dataset.get(dataset)
+            if keys and self._is_committed(request, keys):
+                self.stats.inc_value('resume/skipped', spider=spider)
+                self._skip_pending(request, spider)
+                continue
+            yield request
+
+    def _is_committed(self, request, committed):
+        for key in self.meta_keys:
+            value = request.meta.get(key)
+            if value is not None:
+                return value in committed
+        return False
+
+    def _skip_pending(self, request, spider):
+        # CheckpointMiddleware 位于本中间件之内，已为跳过的请求计数，视为已完成，否则该物种永远不会被标记
+        checkpoint = getattr(spider, 'checkpoint', None)
+        if checkpoint is None:
+            return
+        for key in self.meta_keys:
+            value = request.meta.get(key)
+            if value is not None:
+                # 已写入批次日志，数据已保存
+                if checkpoint.done_pending(value):
+                    checkpoint.complete(value)
+                return
+
+
+class CheckpointMiddleware:
+    """
+    检查点中间件：为爬虫创建 CrawlCheckpoint（spider.checkpoint，文件名取 spider.checkpoint_name，默认为爬虫名），
+    SpeciesIdSource 据此跳过已完成的物种。
+    每个物种（起始请求 meta 中的 RESUME_META_KEYS）计数其未完成的请求（首页与扇出的分页）与尚未经过管道的记录，
+    计数归零（记录经 item_scraped / item_dropped / item_error 信号确认）时在位图中标记完成，
+    并调用各管道的 finish(key)，批次管道据此把该物种写入批次日志（见 ResumeMiddleware）。
+    下载失败、返回错误状态码或有响应解析失败（回调通过 record_dead_letter() 上报）的物种不会被标记，重启后重新爬取。
+    只有启用了接收本爬虫记录类型、实现了 finish() 的管道（批次、Parquet 与 SQLite 管道）时才标记完成，
+    否则数据没有保存，不应跳过。
+    每隔 CHECKPOINT_FLUSH_INTERVAL 秒先调用各管道的 commit() 让已缓冲的数据落盘，再写入此前的位图快照。
+    """
+
+    def __init__(self, crawler, directory, interval=60, meta_keys=('species_id', 'species_TP_GUID', 'icode')):
+        self.crawler = crawler
+        self.directory = directory
+        self.interval = interval
+        self.meta_keys = meta_keys
+        self.checkpoint = None
+        self.task = None
+        self.flushing = False
+        self.item_classes = set()  # 本爬虫产出过的记录类型
+        self.unsaved_warned = False
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('CHECKPOINT_ENABLED') or settings.get('FRONTIER_BACKEND'):
+            # 分布式模式下由共享队列保存进度，多个进程也不能共用一个位图文件
+            raise NotConfigured
+        middleware = cls(
+            crawler,
+            settings.get('CHECKPOINT_DIR', DEFAULT_CHECKPOINT_DIR),
+            interval=settings.getfloat('CHECKPOINT_FLUSH_INTERVAL', 60),
+            meta_keys=settings.getlist('RESUME_META_KEYS', ['species_id', 'species_TP_GUID', 'icode']),
+        )
+        crawler.signals.connect(middleware.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(middleware.item_processed, signal=signals.item_scraped)
+        crawler.signals.connect(middleware.item_processed, signal=signals.item_dropped)
+        crawler.signals.connect(middleware.item_processed, signal=signals.item_error)
+        crawler.signals.connect(middleware.request_dropped, signal=signals.request_dropped)
+        return middleware
+
+    def spider_opened(self, spider):
+        name = getattr(spider, 'checkpoint_name', None) or spider.name
+        if incremental_enabled(spider):
+            # 增量模式读取的是变化物种 ID，单独保存，不覆盖全量爬取的检查点
+            name = f'{name}-incremental'
+        self.checkpoint = spider.checkpoint = CrawlCheckpoint(self.directory, name)
+        self.task = task.LoopingCall(self.flush)
+        self.task.start(self.interval, now=False)
+
+    def spider_closed(self, spider):
+        if self.task is not None and self.task.running:
+            self.task.stop()
+        # spider_closed 在管道关闭之后发出，已完成的物种此时均已落盘
+        if self.checkpoint.digest is not None:
+            self.checkpoint.write(self.checkpoint.snapshot())
+
+    def process_start_requests(self, start_requests, spider):
+        for request in start_requests:
+            self.checkpoint.start(self._key(request))
+            yield request
+
+    def process_spider_output(self, response, result, spider):
+        key = self._key(response)
+        for output in result:
+            if is_item(output):
+                self.item_classes.add(item_class_of(output))
+                self.checkpoint.add_pending(key)
+            elif hasattr(output, 'meta'):
+                self.checkpoint.add_pending(self._key(output))
+            yield output
+        if response.meta.get(PARSE_FAILED_META):
+            self.checkpoint.fail(key)
+        # 响应产出的请求与记录都已登记后，才结束这个响应本身的计数
+        self.done_pending(key)
+
+    def item_processed(self, item, response, spider, **kwargs):
+        self.done_pending(self._key(response))
+
+    def request_dropped(self, request, spider):
+        self.done_pending(self._key(request))
+
+    def done_pending(self, key):
+        """结束 key 的一个计数；物种因此完成时标记位图并通知管道，其记录此时都已交给管道"""
+        if not self.checkpoint.done_pending(key):
+            return
+        finishers = self._finishers()
+        if not finishers:
+            self.checkpoint.discard(key)
+            if self.item_classes and not self.unsaved_warned:
+                self.unsaved_warned = True
+                logger.warning('没有启用保存本爬虫记录的批次管道，检查点不标记物种完成')
+            return
+        self.checkpoint.complete(key)
+        for pipe in finishers:
+            pipe.finish(key)
+
+    def _finishers(self):
+        """实现了 finish()、且接收本爬虫产出的记录类型的管道"""
+        return [pipe for pipe in self._pipelines() if hasattr(pipe, 'finish') and self._saves(pipe)]
+
+    def _saves(self, pipe):
+        """管道是否写入本爬虫产出的记录：多类型管道声明 item_classes，单类型管道声明 item_class（None 为全部）"""
+        item_classes = getattr(pipe, 'item_classes', None)
+        if item_classes is not None:
+            return not self.item_classes.isdisjoint(item_classes)
+        return getattr(pipe, 'item_class', None) in (None, *self.item_classes)
+
+    def flush(self):
+        """让管道提交已缓冲的数据，再写入提交前的位图快照"""
+        if self.flushing or not self.checkpoint.dirty:
+            return None
+        self.flushing = True
+        snapshot = self.checkpoint.snapshot()
+        commits = [defer.maybeDeferred(pipe.commit) for pipe in self._pipelines() if hasattr(pipe, 'commit')]
+        d = defer.DeferredList(commits, fireOnOneErrback=True, consumeErrors=True)
+        d.addCallback(lambda _: self.checkpoint.write(snapshot))
+        d.addErrback(lambda failure: logger.error(f'检查点写入失败: {failure.getErrorMessage()}'))
+        d.addBoth(self._flushed)
+        return d
+
+    def _flushed(self, result):
+        self.flushing = False
+
+    def _pipelines(self):
+        itemproc = getattr(self.crawler.engine.scraper, 'itemproc', None)
+        return getattr(itemproc, 'middlewares', ())
+
+    def _key(self, request_or_response):
+        meta = request_or_response.meta
+        for key in self.meta_keys:
+            value = meta.get(key)
+            if value is not None:
+                return value
+        return None
+
+
+class ChangeDetectionMiddleware:
+    """
+    变化检测中间件：按 (记录类型, 主键) 计算每条记录的内容指纹并与 FingerprintStore 比对，
+    内容没变的记录直接丢弃，不再进入管道；新增与修改的记录照常输出，并写入变更集。
+    爬虫正常结束且没有请求失败时，已访问的物种 / 文献范围内、本次出现过的记录类型中没再出现的记录记为 delete。
+    每个响应的记录收齐后成批比对（FingerprintStore.check_many），每 FINGERPRINT_COMMIT_ITEMS 条提交一次。
+    记录的范围取自响应 meta 中的 RESUME_META_KEYS；没有范围的记录（物种列表）只在全量模式下推断删除。
+    """
+
+    def __init__(self, crawler, store_path, changes_dir, meta_keys, commit_items=10000):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.store_path = store_path
+        self.commit_items = commit_items
+        self.changes_dir = changes_dir
+        self.meta_keys = meta_keys
+        self.store = None
+        self.changes = None
+        self.scopes = set()  # 本次访问过的范围
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('CHANGE_DETECTION_ENABLED'):
+            raise NotConfigured
+        middleware = cls(
+            crawler,
+            settings.get('FINGERPRINT_STORE_PATH', DEFAULT_STORE_PATH),
+            settings.get('CHANGE_SET_DIR', DEFAULT_CHANGES_DIR),
+            settings.getlist('RESUME_META_KEYS', ['species_id', 'species_TP_GUID', 'icode']),
+            commit_items=settings.getint('FINGERPRINT_COMMIT_ITEMS', 10000),
+        )
+        crawler.signals.connect(middleware.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
+
+    def spider_opened(self, spider):
+        self.store = FingerprintStore(self.store_path, spider.name, commit_every=self.commit_items)
+        self.changes = ChangeSetWriter(self.changes_dir, spider.name, self.store.run)
+
+    def spider_closed(self, spider, reason):
+        complete = reason == 'finished'
+        if complete and crawl_was_complete(self.stats.get_stats()):
+            scopes = set(self.scopes)
+            if incremental_enabled(spider):
+                scopes.discard('')  # 增量模式下物种列表只翻到高水位，不能据此推断删除
+            for item_type, key, scope in self.store.deletions(scopes):
+                self.changes.write('delete', item_type, key, scope)
+                self.stats.inc_value('changes/delete', spider=spider)
+        elif complete:
+            spider.logger.warning('本次爬取有请求失败，跳过删除推断')
+        self.store.close(commit=complete)
+        self.changes.close()
+
+    def process_spider_output(self, response, result, spider):
+        scope = self._scope(response)
+        self.scopes.add(scope)
+        # 请求立即放行；记录收齐后按整个响应成批比对指纹
+        items, entries = [], []
+        for output in result:
+            if not is_item(output):
+                yield output
+                continue
+            item_class = item_class_of(output)
+            record = to_dict(output)
+            digest = fingerprint(record)
+            items.append(output)
+            entries.append((item_class.__name__, record_key(item_class, record, digest), scope, digest))
+        if not items:
+            return
+        for output, (item_type, key, _, _), op in zip(items, entries, self.store.check_many(entries)):
+            self.stats.inc_value(f'changes/{op}', spider=spider)
+            if op == 'unchanged':
+                continue
+            self.changes.write(op, item_type, key, scope)
+            yield output
+
+    def _scope(self, response):
+        for key in self.meta_keys:
+            value = response.meta.get(key)
+            if value is not None:
+                return str(value)
+        return ''
+
+
+class PageSizeMiddleware:
+    """
+    自适应页大小中间件：爬虫启动时加载 PAGE_SIZE_STATE_PATH 中的学习结果，并挂到 spider.page_sizes 上，
+    供爬虫通过 plan_page_size() / record_page() 选择页大小、上报每页的行数；
+    带 pagecount 的请求超时时把该接口的页大小减半；爬虫关闭时保存学习结果。
+    须位于 RetryMiddleware(550) 之后，才能在重试之前看到超时。
+    """
+
+    def __init__(self, planner):
+        self.planner = planner
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('PAGE_SIZE_ENABLED'):
+            raise NotConfigured
+        middleware = cls(PageSizePlanner.from_settings(crawler.settings))
+        crawler.signals.connect(middleware.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
+
+    def spider_opened(self, spider):
+        self.planner.load()
+        spider.page_sizes = self.planner
+
+    def spider_closed(self, spider):
+        self.planner.save()
+
+    def process_exception(self, request, exception, spider):
+        if isinstance(exception, TimeoutError) and 'pagecount' in request.meta:
+            self.planner.on_timeout(request.url, request.meta['pagecount'])
+
+
+class AdaptiveConcurrencyMiddleware:
+    """
+    按接口自适应并发中间件：把每个请求放入 <主机>/<接口> 下载槽（meta['download_slot']，接口名称见 endpoint_of()），
+    使不同接口各自受限、互不拖累；每隔 ADAPTIVE_CONCURRENCY_INTERVAL 秒由 ConcurrencyController
+    根据各接口的延迟分位数、超时、5xx 与空响应比例调整下载槽的并发上限，并记录每次调整。
+    须位于 RetryMiddleware(550) 之后，才能在重试之前看到原始的 5xx 响应与超时。
+    """
+
+    def __init__(self, crawler, controller, interval=5):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.controller = controller
+        self.interval = interval
+        self.slot_keys = {}  # 接口名称 -> 下载槽名称
+        self.task = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('ADAPTIVE_CONCURRENCY_ENABLED'):
+            raise NotConfigured
+        if settings.getbool('AUTOTHROTTLE_ENABLED'):
+            logger.warning('AutoThrottle 会按延迟拉长下载间隔，与自适应并发同时开启会互相干扰，建议关闭 AUTOTHROTTLE_ENABLED')
+        middleware = cls(
+            crawler,
+            ConcurrencyController.from_settings(settings),
+            interval=settings.getfloat('ADAPTIVE_CONCURRENCY_INTERVAL', 5),
+        )
+        crawler.signals.connect(middleware.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
+
+    def spider_opened(self, spider):
+        self.task = task.LoopingCall(self.adjust)
+        self.task.start(self.interval, now=False)
+
+    def spider_closed(self, spider):
+        if self.task is not None and self.task.running:
+            self.task.stop()
+        for endpoint, window in sorted(self.controller.endpoints.items()):
+            logger.info(f'{endpoint} 的最终并发上限: {window.limit}')
+
+    def process_request(self, request, spider):
+        endpoint = endpoint_of(request)
+        key = self.slot_keys.get(endpoint)
+        if key is None:
+            key = self.slot_keys[endpoint] = f'{urlparse_cached(request).hostname}/{endpoint}'
+        request.meta['download_slot'] = key
+        request.meta['adaptive_sent'] = time.monotonic()
+        # 下载槽由下载器在本方法之后按需创建（闲置后会被回收），首个请求之后再同步上限
+        slot = self.crawler.engine.downloader.slots.get(key)
+        if slot is not None:
+            slot.concurrency = self.controller.limit(endpoint)
+
+    def process_response(self, request, response, spider):
+        if 'adaptive_sent' not in request.meta or 'cached' in response.flags:
+            return response
+        if response.status >= 500:
+            failure = '5xx'
+        elif not response.body:
+            failure = 'empty'
+        else:
+            failure = None
+        self._observe(request, failure, request.meta.get('download_latency'))
+        return response
+
+    def process_exception(self, request, exception, spider):
+        if 'adaptive_sent' in request.meta:
+            self._observe(request, 'timeout' if isinstance(exception, TimeoutError) else 'connection', None)
+
+    def _observe(self, request, failure, latency):
+        slot = self.crawler.engine.downloader.slots.get(request.meta['download_slot'])
+        self.controller.observe(
+            endpoint_of(request), request.meta['adaptive_sent'],
+            latency=latency, failure=failure, saturated=bool(slot and slot.queue),
+        )
+
+    def adjust(self):
+        slots = self.crawler.engine.downloader.slots
+        for endpoint, old, new, reason in self.controller.adjust(time.monotonic()):
+            slot = slots.get(self.slot_keys.get(endpoint))
+            if slot is not None:
+                slot.concurrency = new
+            self.stats.set_value(f'adaptive_concurrency/limit/{endpoint}', new)
+            if new < old:
+                self.stats.inc_value('adaptive_concurrency/decreases')
+                logger.warning(f'{endpoint} 并发上限 {old} -> {new}：{reason}')
+            else:
+                self.stats.inc_value('adaptive_concurrency/increases')
+                logger.info(f'{endpoint} 并发上限 {old} -> {new}：{reason}')
+
+
+class DeadLetterMiddleware:
+    """
+    死信中间件：把最终失败的请求追加到 DEAD_LETTER_DIR/<爬虫名>.jsonl（见 DeadLetterWriter），
+    之后用 python -m dp_spider.replay <爬虫名> 只重新请求这些请求，无需整体重爬。
+    记录的失败包括：重试用尽后仍超时 / 连接失败、仍返回 RETRY_HTTP_CODES 中的状态码，
+    回调中未捕获的异常（spider_error 信号），以及爬虫通过 record_dead_letter() 上报的解析失败。
+    须位于 RetryMiddleware(550) 之前，只看到重试之后的结果。
+    """
+
+    def __init__(self, crawler, directory, http_codes):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.directory = directory
+        self.http_codes = set(http_codes)
+        self.writer = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('DEAD_LETTER_ENABLED'):
+            raise NotConfigured
+        middleware = cls(
+            crawler,
+            settings.get('DEAD_LETTER_DIR', DEFAULT_DEAD_LETTER_DIR),
+            [int(code) for code in settings.getlist('RETRY_HTTP_CODES')],
+        )
+        crawler.signals.connect(middleware.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(middleware.spider_error, signal=signals.spider_error)
+        return middleware
+
+    def spider_opened(self, spider):
+        self.writer = spider.dead_letters = DeadLetterWriter(dead_letter_path(self.directory, spider.name))
+
+    def spider_closed(self, spider):
+        self.writer.close()
+        if self.writer.count:
+            logger.warning(f'{self.writer.count} 个请求失败，已写入 {self.writer.path}，'
+                           f'可用 python -m dp_spider.replay {spider.name} 重新请求')
+
+    def process_response(self, request, response, spider):
+        if response.status in self.http_codes and response.status not in getattr(spider, 'handle_httpstatus_list', ()):
+            self._write(request, spider, f'HTTP {response.status}')
+        return response
+
+    def process_exception(self, request, exception, spider):
+        if not isinstance(exception, IgnoreRequest):
+            self._write(request, spider, type(exception).__name__, exception)
+
+    def spider_error(self, failure, response, spider):
+        self._write(response.request, spider, failure.type.__name__, failure.value)
+
+    def _write(self, request, spider, error, detail=''):
+        self.writer.write(request, spider, error, detail)
+        self.stats.inc_value('dead_letters/written', spider=spider)
@@ -0,0 +1,440 @@
+"""
+离线的 pestchina webapi 模拟服务器：实现爬虫用到的全部接口（路由与表单字段取自 webapi.ENDPOINTS），
+分页语义与线上一致（paging[pagecount] / paging[pagenum]，响应的 paging.totalpage 为总页数），
+可配置响应延迟、服务器并发容量与故障注入，在一台机器上可重复地测量爬取吞吐。
+
+数据有两种来源：
+    默认：按 --seed 构造，同样的参数每次生成同样的响应；任意物种 ID / icode 都有数据
+    --data：读取 data/ 下已有的批次文件（在项目根目录运行），按物种 ID / icode 分组，没有的 key 返回空结果
+
+故障按“请求内容 + 第几次请求”确定性地注入：同一个请求重试时重新判定，同样的 --seed 下同一次尝试的结果相同。
+    --error-rate     返回 --error-status 中的状态码
+    --timeout-rate   不响应，直到客户端超时断开
+    --empty-rate     返回 200 与空响应体
+    --malformed-rate 返回 200 与截断的 JSON
+
+爬虫把模拟服务器当作 HTTP 代理访问，URL、allowed_domains 与下载槽都不需要改动。
+需要逐次可比的结果时爬虫加 -s PAGE_SIZE_ENABLED=False：页大小学习会在运行中调整 pagecount，请求随之变化。
+端到端吞吐测量见 benchmarks/crawl_benchmark.py。
+
+用法（在 scrapy.cfg 所在目录执行）:
+    python -m dp_spider.mock_server --port 8765 --latency 0.05 --latency-per-row 0.0001 --capacity 64
+    python -m dp_spider.mock_server --data --error-rate 0.02 --timeout-rate 0.002 --seed 7
+    http_proxy=http://127.0.0.1:8765 scrapy crawl species_distribution
+    curl http://127.0.0.1:8765/__stats
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import random
+import time
+import uuid
+from collections import Counter, OrderedDict
+from urllib.parse import parse_qsl, unquote, urlparse
+
+from twisted.internet import defer, reactor, task
+from twisted.web import resource, server
+
+from .pipelines import (
+    CmDiffuseMediumPipeline, FilePipeline, IssueCodeDetailPipeline, JsonBatchPipeline, MetaInfoJsonBatchPipeline,
+    PestHostPartPipeline, PestRelationPipeline, SpeciesBasicInfoPipeline, SpeciesDistributionPipeline,
+    SpeciesHostPipeline, SpeciesParentPipeline,
+)
+from .records import (
+    CmDiffuseMediumRecord, FileMetadataRecord, IssueCodeDetailRecord, MetaInfoRecord, PestchinaScraperRecord,
+    PestHostPartRecord, PestRelationInfoRecord, SpeciesBasicInfoRecord, SpeciesDistributionRecord, SpeciesHostRecord,
+    SpeciesParentRecord,
+)
+from .storage import BATCH_FILE_PATTERN, encode_record, iter_batch_records
+from .webapi import (
+    BASE_URL, CM_DIFFUSE_MEDIUM, ENDPOINTS, FILE_METADATA, ISSUE_CODE_DETAIL, KEY, META_INFO, PAGING_FIELDS,
+    PEST_HOST_PART, PEST_RELATION_INFO, SPECIES_BASIC_INFO, SPECIES_DISTRIBUTION, SPECIES_HOST, SPECIES_LIST,
+    SPECIES_PARENTS,
+)
+
+logger = logging.getLogger(__name__)
+
+WEBAPI_PATH = urlparse(BASE_URL).path  # /webapi/nb/
+
+# 各接口返回的记录类型、--data 模式下的批次目录，以及记录按哪个字段归属到请求的 key（None 为不分组）
+SOURCES = {
+    SPECIES_LIST: (PestchinaScraperRecord, JsonBatchPipeline.output_dir, None),
+    META_INFO: (MetaInfoRecord, MetaInfoJsonBatchPipeline.output_dir, 'TP_GUID'),
+    SPECIES_BASIC_INFO: (SpeciesBasicInfoRecord, SpeciesBasicInfoPipeline.output_dir, 'SC_GUID'),
+    SPECIES_DISTRIBUTION: (SpeciesDistributionRecord, SpeciesDistributionPipeline.output_dir, 'species_id'),
+    SPECIES_HOST: (SpeciesHostRecord, SpeciesHostPipeline.output_dir, 'species_id'),
+    PEST_HOST_PART: (PestHostPartRecord, PestHostPartPipeline.output_dir, 'species_id'),
+    PEST_RELATION_INFO: (PestRelationInfoRecord, PestRelationPipeline.output_dir, 'SC_GUID'),
+    CM_DIFFUSE_MEDIUM: (CmDiffuseMediumRecord, CmDiffuseMediumPipeline.output_dir, 'species_id'),
+    SPECIES_PARENTS: (SpeciesParentRecord, SpeciesParentPipeline.output_dir, 'species_TP_GUID'),
+    ISSUE_CODE_DETAIL: (IssueCodeDetailRecord, IssueCodeDetailPipeline.output_dir, 'Icode'),
+    FILE_METADATA: (FileMetadataRecord, FilePipeline.output_dir, 'icode'),
+}
+
+# 返回单个对象（而不是记录列表）的接口
+DOCUMENT_ENDPOINTS = (META_INFO, ISSUE_CODE_DETAIL)
+
+# 构造数据时每个 key 的平均记录数（对数正态分布，少数物种的分布、寄主记录成千上万条）
+SYNTHETIC_ROWS = {
+    SPECIES_BASIC_INFO: 2,
+    SPECIES_DISTRIBUTION: 40,
+    SPECIES_HOST: 25,
+    PEST_HOST_PART: 8,
+    PEST_RELATION_INFO: 3,
+    CM_DIFFUSE_MEDIUM: 2,
+    SPECIES_PARENTS: 7,
+    FILE_METADATA: 1,
+}
+
+# 构造数据中各条记录的修改时间从此时刻（2025-01-01）起向前排列，有害生物列表按修改时间倒序
+SYNTHETIC_EPOCH = 1735660800
+
+# 构造数据中物种学名的属名部分，种加词为物种的 TP_GUID（见 synthetic_name）
+SYNTHETIC_GENUS = 'Synthetica'
+
+# 分页表单字段：占位符 -> 字段名
+PAGING_FORM = {placeholder: name for name, placeholder in PAGING_FIELDS}
+
+
+def key_field(endpoint):
+    """POST 接口表单中携带 key 的字段（如 SC_GUID）"""
+    return next((name for name, value in endpoint.form if value is KEY), None)
+
+
+def route(path):
+    """把请求路径解析为 (Endpoint, key)，不是 webapi 接口时返回 (None, None)"""
+    if not path.startswith(WEBAPI_PATH):
+        return None, None
+    rest = path[len(WEBAPI_PATH):]
+    endpoint = ENDPOINTS.get(rest)
+    if endpoint is not None and endpoint.method == 'POST':
+        return endpoint, None
+    prefix, _, key = rest.rpartition('/')
+    endpoint = ENDPOINTS.get(f'{prefix}/')
+    if endpoint is not None and endpoint.method == 'GET' and key:
+        return endpoint, unquote(key)
+    return None, None
+
+
+def synthetic_value(name, rng, index, icode_count):
+    if name == 'rowid':
+        return index + 1
+    if name.endswith('GUID') or name == 'guid':
+        return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+    if name in ('ICodeID', 'Icode', 'icode'):
+        return str(10000000 + rng.randrange(icode_count))
+    if name.startswith(('TP_CREATED', 'TP_MODIFIED')) or name.endswith('Time'):
+        # 按 index 递减，同一 key 下的记录修改时间倒序排列
+        stamp = SYNTHETIC_EPOCH - index * 60 - rng.randrange(60)
+        return time.strftime('%Y-%m-%d %H:%M:%S.000', time.gmtime(stamp))
+    if name == 'IsSpecies':
+        return 1
+    return f'{name}-{index}'
+
+
+def synthetic_name(guid):
+    """构造数据中物种的学名：由 TP_GUID 得出，上级分类接口按学名请求时可以反推回物种"""
+    return f'{SYNTHETIC_GENUS} {guid}'
+
+
+def synthetic_guid(name):
+    """synthetic_name 的逆运算；不是构造出的学名时按名称生成一个固定的 GUID"""
+    prefix = f'{SYNTHETIC_GENUS} '
+    if name.startswith(prefix):
+        return name[len(prefix):]
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, name))
+
+
+def bind_key(endpoint, row, field, key):
+    """把构造的记录归属到请求的 key，并让学名与物种 GUID 一一对应"""
+    if endpoint is SPECIES_PARENTS:
+        # 上级分类接口的 key 是学名，记录归属到该学名对应的物种
+        row[field] = synthetic_guid(key)
+        return
+    if field is not None:
+        row[field] = key
+    if 'SSNameSci' in row and 'TP_GUID' in row:
+        # 有害生物列表与元信息：学名由物种 GUID 得出，不同物种的学名互不相同
+        row['SSNameSci'] = synthetic_name(row['TP_GUID'])
+
+
+def synthetic_record(record_class, rng, index, icode_count):
+    """按记录类的字段（含嵌套字段）构造一条接口数据"""
+    row = {name: synthetic_value(name, rng, index, icode_count) for name in record_class.fields}
+    for name, _, nested_class, is_list in record_class.nested:
+        if is_list:
+            row[name] = [synthetic_record(nested_class, rng, i, icode_count) for i in range(rng.randint(1, 3))]
+        else:
+            row[name] = synthetic_record(nested_class, rng, 0, icode_count)
+    return row
+
+
+class SyntheticData:
+    """
+    构造的数据：每个 (接口, key) 的记录数与内容由 seed 决定。
+    记录数为 SYNTHETIC_ROWS 中的均值乘以 scale 再乘以对数正态随机数；有害生物列表固定 species_count 条。
+    记录中的文献编号取自 icode_count 个固定编号，文献详情与附件接口都能请求到。
+    最近用到的 cache_size 组记录保留编码结果，同一物种的各页不必重复构造。
+    """
+
+    def __init__(self, seed=0, scale=1.0, species_count=50000, icode_count=20000, cache_size=4096):
+        self.seed = seed
+        self.scale = scale
+        self.species_count = species_count
+        self.icode_count = icode_count
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+
+    def rows(self, endpoint, key):
+        """该 key 在该接口的全部记录（已编码的 JSON 字节串列表）"""
+        cache_key = (endpoint.path, key)
+        rows = self.cache.get(cache_key)
+        if rows is not None:
+            self.cache.move_to_end(cache_key)
+            return rows
+        record_class, _, field = SOURCES[endpoint]
+        rng = random.Random(f'{self.seed}:{endpoint.path}:{key}')
+        if endpoint is SPECIES_LIST:
+            count = self.species_count
+        elif endpoint in DOCUMENT_ENDPOINTS:
+            count = 1
+        else:
+            count = int(SYNTHETIC_ROWS[endpoint] * self.scale * rng.lognormvariate(0, 1))
+        rows = []
+        for index in range(count):
+            row = synthetic_record(record_class, rng, index, self.icode_count)
+            bind_key(endpoint, row, field, key)
+            rows.append(encode_record(row))
+        self.cache[cache_key] = rows
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return rows
+
+
+class BatchData:
+    """
+    --data 模式：读取各接口对应的批次目录（.json / .jsonl），按 key 分组后预先编码。
+    上级分类接口按拉丁名请求，通过元信息中的 SSNameSci -> TP_GUID 找到对应的记录。
+    """
+
+    def __init__(self, root='.'):
+        self.groups = {}  # Endpoint -> {key: [编码后的记录]}
+        self.names = {}  # 拉丁名 -> 物种 TP_GUID
+        for endpoint, (_, directory, field) in SOURCES.items():
+            records = list(self.read(os.path.join(root, directory)))
+            if endpoint is SPECIES_LIST:
+                records.sort(key=lambda record: record.get('TP_MODIFIED') or '', reverse=True)
+            if endpoint is META_INFO:
+                self.names.update((record.get('SSNameSci'), record.get('TP_GUID')) for record in records)
+            groups = self.groups[endpoint] = {}
+            for record in records:
+                groups.setdefault(record.get(field) if field else None, []).append(encode_record(record))
+            logger.info(f'{endpoint.path}: {len(records)} 条记录，{len(groups)} 个 key（{directory}）')
+
+    @staticmethod
+    def read(directory):
+        if not os.path.isdir(directory):
+            return
+        for filename in sorted(os.listdir(directory)):
+            match = BATCH_FILE_PATTERN.match(filename)
+            if match and match.group('suffix') in ('.json', '.jsonl'):
+                yield from iter_batch_records(os.path.join(directory, filename))
+
+    def rows(self, endpoint, key):
+        if endpoint is SPECIES_PARENTS:
+            key = self.names.get(key)
+        return self.groups[endpoint].get(key, [])
+
+
+class FaultInjector:
+    """
+    确定性的故障注入：按 (方法, 路径, 请求体) 统计第几次请求，以 (seed, 请求摘要, 次数) 为种子决定本次是否注入故障。
+    返回的 random.Random 同时用于本次请求的延迟抖动，整个响应可以复现。
+    """
+
+    KINDS = ('error', 'timeout', 'empty', 'malformed')
+
+    def __init__(self, seed=0, error_rate=0.0, timeout_rate=0.0, empty_rate=0.0, malformed_rate=0.0,
+                 error_statuses=(500, 502, 503)):
+        self.seed = seed
+        self.rates = (error_rate, timeout_rate, empty_rate, malformed_rate)
+        self.error_statuses = tuple(error_statuses)
+        self.attempts = {}  # 请求摘要 -> 已收到的次数
+
+    def roll(self, method, path, body):
+        """
+        返回:
+            tuple: (故障类型或 None, random.Random)
+        """
+        digest = hashlib.blake2b(b'\0'.join((method, path, body)), digest_size=8).digest()
+        attempt = self.attempts[digest] = self.attempts.get(digest, 0) + 1
+        rng = random.Random(f'{self.seed}:{digest.hex()}:{attempt}')
+        roll = rng.random()
+        for kind, rate in zip(self.KINDS, self.rates):
+            if roll < rate:
+                return kind, rng
+            roll -= rate
+        return None, rng
+
+
+class MockWebapi(resource.Resource):
+    """
+    所有接口共用的资源：按路径路由到 Endpoint，返回分页列表、单个对象或记录列表。
+    延迟为 latency + latency_per_row × 记录数（±jitter 比例的抖动）；capacity 大于 0 时最多同时处理 capacity 个请求，
+    其余请求排队等待，模拟服务器饱和后延迟随并发上升。
+    """
+    isLeaf = True
+
+    def __init__(self, data, faults, latency=0.0, latency_per_row=0.0, jitter=0.0, capacity=0):
+        super().__init__()
+        self.data = data
+        self.faults = faults
+        self.latency = latency
+        self.latency_per_row = latency_per_row
+        self.jitter = jitter
+        self.slots = defer.DeferredSemaphore(capacity) if capacity > 0 else None
+        self.stats = Counter()
+        self.inflight = 0
+        self.max_inflight = 0
+
+    def render(self, request):
+        path = urlparse(request.uri).path.decode('utf-8')  # 作为代理时请求行是完整的 URL
+        if path == '/__stats':
+            return self.render_stats(request)
+        endpoint, key = route(path)
+        method = request.method.decode('ascii')
+        if endpoint is None or endpoint.method != method:
+            request.setResponseCode(404)
+            return b''
+        body = request.content.read() if method == 'POST' else b''
+        form = dict(parse_qsl(body.decode('utf-8'), keep_blank_values=True))
+        if key is None:
+            field = key_field(endpoint)
+            key = form.get(field) if field else None
+
+        self.stats[f'requests/{endpoint.path}'] += 1
+        fault, rng = self.faults.roll(request.method, path.encode('utf-8'), body)
+        if fault is not None:
+            self.stats[f'faults/{fault}'] += 1
+        if fault == 'timeout':
+            return server.NOT_DONE_YET  # 不响应，连接由客户端超时关闭
+
+        status = 200
+        payload, rows = self.payload(endpoint, key, form)
+        if fault == 'error':
+            status, payload = rng.choice(self.faults.error_statuses), b'{"Message":"An error has occurred."}'
+        elif fault == 'empty':
+            payload = b''
+        elif fault == 'malformed':
+            payload = payload[:len(payload) // 2]
+        delay = (self.latency + self.latency_per_row * rows) * rng.uniform(1 - self.jitter, 1 + self.jitter)
+        self.respond(request, status, payload, delay)
+        return server.NOT_DONE_YET
+
+    def payload(self, endpoint, key, form):
+        """返回 (响应体, 响应中的记录数)"""
+        rows = self.data.rows(endpoint, key)
+        if endpoint in DOCUMENT_ENDPOINTS:
+            return (rows[0], 1) if rows else (b'{}', 0)
+        if not endpoint.paging:
+            return b'[' + b','.join(rows) + b']', len(rows)
+        pagecount = max(1, int(form.get(PAGING_FORM['pagecount']) or 20))
+        pagenum = max(1, int(form.get(PAGING_FORM['pagenum']) or 1))
+        content = rows[(pagenum - 1) * pagecount:pagenum * pagecount]
+        paging = {'pagenum': pagenum, 'pagecount': pagecount, 'totalpage': -(-len(rows) // pagecount)}
+        return (b'{"' + endpoint.result_key.encode('ascii') + b'":[' + b','.join(content) + b'],"paging":'
+                + json.dumps(paging).encode('ascii') + b'}'), len(content)
+
+    def respond(self, request, status, payload, delay):
+        self.inflight += 1
+        self.max_inflight = max(self.max_inflight, self.inflight)
+        finished = []
+        request.notifyFinish().addBoth(finished.append)  # 客户端断开后不再写入
+
+        def send():
+            if finished:
+                return
+            request.setResponseCode(status)
+            request.setHeader(b'Content-Type', b'application/json; charset=utf-8')
+            request.setHeader(b'Content-Length', str(len(payload)).encode('ascii'))
+            request.write(payload)
+            request.finish()
+            self.stats[f'status/{status}'] += 1
+            self.stats['bytes'] += len(payload)
+
+        def done(result):
+            self.inflight -= 1
+            return result
+
+        if self.slots is None:
+            d = task.deferLater(reactor, delay, send)
+        else:
+            d = self.slots.run(task.deferLater, reactor, delay, send)
+        d.addBoth(done).addErrback(lambda failure: logger.error(f'响应失败: {failure.value!r}'))
+
+    def render_stats(self, request):
+        stats = dict(sorted(self.stats.items()), inflight=self.inflight, max_inflight=self.max_inflight)
+        request.setHeader(b'Content-Type', b'application/json; charset=utf-8')
+        return json.dumps(stats).encode('utf-8')
+
+    def report(self):
+        requests = sum(count for name, count in self.stats.items() if name.startswith('requests/'))
+        faults = sum(count for name, count in self.stats.items() if name.startswith('faults/'))
+        logger.info(f'已处理 {requests} 个请求，注入故障 {faults} 个，在途 {self.inflight}（峰值 {self.max_inflight}），'
+                    f'发送 {self.stats["bytes"] / 1024 / 1024:.1f} MB')
+
+
+class QuietSite(server.Site):
+    """不逐条记录访问日志"""
+
+    def log(self, request):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址')
+    parser.add_argument('--port', type=int, default=8765, help='监听端口')
+    parser.add_argument('--data', action='store_true', help='读取 data/ 下的批次文件，而不是构造数据')
+    parser.add_argument('--seed', type=int, default=0, help='构造数据与故障注入的随机种子')
+    parser.add_argument('--scale', type=float, default=1.0, help='构造数据时各接口记录数的倍数')
+    parser.add_argument('--species', type=int, default=50000, help='构造数据时有害生物列表的记录数')
+    parser.add_argument('--latency', type=float, default=0.0, help='每个响应的基础延迟（秒）')
+    parser.add_argument('--latency-per-row', type=float, default=0.0, help='响应中每条记录增加的延迟（秒）')
+    parser.add_argument('--jitter', type=float, default=0.0, help='延迟的随机波动比例，如 0.2 为 ±20%%')
+    parser.add_argument('--capacity', type=int, default=0, help='同时处理的请求数上限，超出的排队（0 为不限）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回错误状态码的比例')
+    parser.add_argument('--error-status', default='500,502,503', help='注入的错误状态码，逗号分隔')
+    parser.add_argument('--timeout-rate', type=float, default=0.0, help='不响应的比例')
+    parser.add_argument('--empty-rate', type=float, default=0.0, help='返回空响应体的比例')
+    parser.add_argument('--malformed-rate', type=float, default=0.0, help='返回截断 JSON 的比例')
+    parser.add_argument('--report-interval', type=float, default=10.0, help='输出统计的间隔（秒，0 为不输出）')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(name)s] %(levelname)s: %(message)s')
+
+    if args.data:
+        data = BatchData()
+    else:
+        data = SyntheticData(seed=args.seed, scale=args.scale, species_count=args.species)
+    faults = FaultInjector(
+        seed=args.seed,
+        error_rate=args.error_rate,
+        timeout_rate=args.timeout_rate,
+        empty_rate=args.empty_rate,
+        malformed_rate=args.malformed_rate,
+        error_statuses=[int(status) for status in args.error_status.split(',') if status.strip()],
+    )
+    webapi = MockWebapi(data, faults, latency=args.latency, latency_per_row=args.latency_per_row,
+                        jitter=args.jitter, capacity=args.capacity)
+    reactor.listenTCP(args.port, QuietSite(webapi), backlog=1024, interface=args.host)
+    if args.report_interval > 0:
+        task.LoopingCall(webapi.report).start(args.report_interval, now=False)
+    reactor.addSystemEventTrigger('before', 'shutdown', webapi.report)
+    logger.info(f'模拟 webapi 监听 http://{args.host}:{args.port}/，爬虫设置 http_proxy=http://{args.host}:{args.port} 即可访问')
+    reactor.run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,358 @@
+"""
+整条爬取流程的编排器：以 DAG 声明各阶段（STAGES），在同一个进程、同一个 reactor 中同时启动全部爬虫阶段，
+上游阶段产出记录的同时经数据流（Stream）把物种 ID、元信息、icode 交给下游阶段，不再经过
+data/data_parse.py、species_id 文件与 reference_relation.csv 逐级落盘后再启动下一阶段：
+
+    pests_spider --物种 ID--> species_all --元信息--> species_parents
+                                        \\--icode--> issue_code_detail / file_metadata
+
+清洗阶段（data_cleaning/*.py）在其依赖的爬虫阶段结束后立即以子进程启动，与仍在运行的爬虫并行。
+整体耗时接近最慢的一条链，而不是各阶段耗时之和。
+
+未选中上游阶段时，下游爬虫按原方式从文件读取起始请求；流入的值与 start_requests 一样经过
+爬虫中间件的 process_start_requests（断点续爬等）。
+
+用法（在 scrapy.cfg 所在目录执行）:
+    python -m dp_spider.orchestrator
+    python -m dp_spider.orchestrator --stages species,issue_code_detail,file_metadata --no-cleaning
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from collections import deque
+
+from scrapy import signals
+from scrapy.crawler import CrawlerProcess
+from scrapy.exceptions import DontCloseSpider
+from scrapy.utils.project import get_project_settings
+from twisted.internet import task, utils
+from twisted.python.failure import Failure
+
+from .icode_index import extract_icodes
+from .items import MetaInfoItem, PestchinaScraperItem
+from .records import item_class_of, to_dict
+
+logger = logging.getLogger(__name__)
+
+# 项目根目录（scrapy.cfg 所在目录），清洗脚本以它为工作目录
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def species_ids_of(item_class, record):
+    if item_class is PestchinaScraperItem and record.get('TP_GUID'):
+        yield record['TP_GUID']
+
+
+def meta_infos_of(item_class, record):
+    if item_class is MetaInfoItem and record.get('TP_GUID') and record.get('SSNameSci'):
+        yield {'TP_GUID': record['TP_GUID'], 'SSNameSci': record['SSNameSci']}
+
+
+def icodes_of(item_class, record):
+    return extract_icodes(record)
+
+
+# 数据流：名称 -> (从记录中取值的函数, 去重键)
+STREAMS = {
+    'species': (species_ids_of, None),
+    'meta': (meta_infos_of, lambda meta_info: meta_info['TP_GUID']),
+    'icodes': (icodes_of, None),
+}
+
+
+class CrawlStage:
+    """
+    爬虫阶段：运行 spider；consumes 不为空时起始请求来自该数据流（每个值交给爬虫的 method 方法生成请求），
+    produces 中的数据流从本阶段产出的记录中取值。
+    """
+
+    def __init__(self, name, spider, consumes=None, method=None, produces=()):
+        self.name = name
+        self.spider = spider
+        self.consumes = consumes
+        self.method = method
+        self.produces = produces
+
+
+class CleanStage:
+    """清洗阶段：after 中的阶段全部结束后，以子进程运行 data_cleaning 下的脚本"""
+
+    def __init__(self, name, script, after=()):
+        self.name = name
+        self.script = script
+        self.after = after
+
+
+STAGES = (
+    CrawlStage('pests', 'pests_spider', produces=('species',)),
+    CrawlStage('species', 'species_all', consumes='species', method='species_requests', produces=('meta', 'icodes')),
+    CrawlStage('parents', 'species_parents', consumes='meta', method='meta_requests'),
+    CrawlStage('issue_code_detail', 'issue_code_detail', consumes='icodes', method='icode_requests'),
+    CrawlStage('file_metadata', 'file_metadata', consumes='icodes', method='icode_requests'),
+    CleanStage('clean_meta_info', 'data_cleaning/species_meta_info.py', after=('species',)),
+    CleanStage('clean_basicinfo', 'data_cleaning/species_basicinfo.py', after=('species',)),
+    CleanStage('clean_distribution', 'data_cleaning/species_distribution.py', after=('species',)),
+    CleanStage('clean_host', 'data_cleaning/pest_host.py', after=('species',)),
+    CleanStage('clean_host_part', 'data_cleaning/pest_host_part.py', after=('species',)),
+    CleanStage('clean_relation', 'data_cleaning/pest_relation.py', after=('species',)),
+    CleanStage('clean_cm_diffuse_medium', 'data_cleaning/cm_diffuse_medium_cleaning.py', after=('species',)),
+    CleanStage('clean_taxonomy', 'data_cleaning/species_taxonomy.py', after=('parents',)),
+    CleanStage('clean_reference', 'data_cleaning/reference_cleaning.py', after=(
+        'clean_basicinfo', 'clean_distribution', 'clean_host', 'clean_host_part', 'clean_relation',
+    )),
+    CleanStage('clean_issue_code_detail', 'data_cleaning/issue_code_detail_cleaning.py', after=('issue_code_detail',)),
+    CleanStage('clean_file_metadata', 'data_cleaning/file_metadata_cleaning.py', after=('file_metadata',)),
+)
+
+
+class Stream:
+    """
+    阶段间的数据流：上游记录经 extract 取值、按 key 去重后追加到每个订阅者的队列。
+    所有上游阶段结束后数据流关闭，下游队列取空即可结束。
+    """
+
+    def __init__(self, name, extract, key=None):
+        self.name = name
+        self.extract = extract
+        self.key = key
+        self.seen = set()
+        self.queues = []
+        self.producers = 0  # 尚未结束的上游阶段数
+        self.closed = False
+
+    def subscribe(self):
+        queue = deque()
+        self.queues.append(queue)
+        return queue
+
+    def publish(self, item_class, record):
+        for value in self.extract(item_class, record):
+            key = self.key(value) if self.key else value
+            if key in self.seen:
+                continue
+            self.seen.add(key)
+            for queue in self.queues:
+                queue.append(value)
+
+    def producer_done(self):
+        self.producers -= 1
+        if self.producers <= 0:
+            self.closed = True
+            logger.info(f'数据流 {self.name} 已关闭，共 {len(self.seen)} 个值')
+
+
+class StreamFeeder:
+    """
+    把数据流中的值喂给下游爬虫：调度器中待处理的请求少于 low_water 时取出至多 batch_size 个值，
+    调用爬虫的 method(值) 生成请求，经爬虫中间件的 process_start_requests 后交给引擎。
+    数据流未关闭或队列未取空时阻止爬虫因空闲而关闭。
+    """
+
+    def __init__(self, crawler, stream, method, batch_size=100, low_water=None, interval=0.5):
+        self.crawler = crawler
+        self.stream = stream
+        self.queue = stream.subscribe()
+        self.method = method
+        self.batch_size = batch_size
+        self.low_water = low_water or crawler.settings.getint('CONCURRENT_REQUESTS', 16)
+        self.interval = interval
+        self.task = None
+        crawler.signals.connect(self.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(self.spider_idle, signal=signals.spider_idle)
+        crawler.signals.connect(self.spider_closed, signal=signals.spider_closed)
+
+    @property
+    def exhausted(self):
+        return self.stream.closed and not self.queue
+
+    def spider_opened(self, spider):
+        self.task = task.LoopingCall(self.pump)
+        self.task.start(self.interval, now=False)
+
+    def spider_idle(self, spider):
+        self.pump()
+        if not self.exhausted:
+            raise DontCloseSpider
+
+    def spider_closed(self, spider):
+        if self.task is not None and self.task.running:
+            self.task.stop()
+
+    def pump(self):
+        engine = self.crawler.engine
+        if engine is None or engine.slot is None or not self.queue:
+            return
+        scheduler = engine.slot.scheduler
+        if hasattr(scheduler, '__len__'):
+            pending = len(scheduler)
+        else:
+            pending = self.low_water if scheduler.has_pending_requests() else 0
+        if pending >= self.low_water:
+            return
+        spider = self.crawler.spider
+        build = getattr(spider, self.method)
+        values = [self.queue.popleft() for _ in range(min(self.batch_size, len(self.queue)))]
+        self.crawler.stats.inc_value('orchestrator/fed', len(values), spider=spider)
+        requests = (request for value in values for request in build(value))
+        d = engine.scraper.spidermw.process_start_requests(requests, spider)
+        d.addCallback(self._schedule)
+        d.addErrback(lambda failure: logger.error(f'{spider.name} 生成请求失败: {failure.getErrorMessage()}'))
+
+    def _schedule(self, requests):
+        for request in requests:
+            self.crawler.engine.crawl(request)
+
+
+def streamed(spidercls):
+    """起始请求改由数据流提供的爬虫子类"""
+    return type(spidercls.__name__, (spidercls,), {
+        '__module__': spidercls.__module__,
+        'start_requests': lambda self: iter(()),
+    })
+
+
+class Orchestrator:
+    """按 STAGES 启动选中的阶段，连接数据流，在依赖满足时启动清洗阶段，全部结束后停止 reactor"""
+
+    def __init__(self, settings, stages=STAGES):
+        self.settings = settings
+        self.stages = {stage.name: stage for stage in stages}
+        self.process = CrawlerProcess(settings)
+        self.streams = {}
+        self.feeders = []  # 信号只持有弱引用，由编排器保留
+        self.started = {}  # 阶段名称 -> 开始时间
+        self.finished = {}  # 阶段名称 -> 结束时间
+        self.failed = []
+
+    def run(self):
+        crawl_stages = [stage for stage in self.stages.values() if isinstance(stage, CrawlStage)]
+        for stage in crawl_stages:
+            for name in stage.produces:
+                if name not in self.streams:
+                    extract, key = STREAMS[name]
+                    self.streams[name] = Stream(name, extract, key)
+                self.streams[name].producers += 1
+        for stage in crawl_stages:
+            self._start_crawl(stage)
+        self._start_ready_cleanings()
+        self.process.start(stop_after_crawl=False)
+        self._report()
+        return not self.failed
+
+    def _start_crawl(self, stage):
+        spidercls = self.process.spider_loader.load(stage.spider)
+        stream = self.streams.get(stage.consumes)
+        if stream is not None:
+            spidercls = streamed(spidercls)
+        crawler = self.process.create_crawler(spidercls)
+        if stream is not None:
+            self.feeders.append(StreamFeeder(
+                crawler, stream, stage.method,
+                batch_size=self.settings.getint('ORCHESTRATOR_FEED_BATCH', 100),
+                interval=self.settings.getfloat('ORCHESTRATOR_FEED_INTERVAL', 0.5),
+            ))
+        produced = [self.streams[name] for name in stage.produces]
+        if produced:
+            def publish(item, response, spider):
+                item_class = item_class_of(item)
+                record = to_dict(item)
+                for produced_stream in produced:
+                    produced_stream.publish(item_class, record)
+            crawler.signals.connect(publish, signal=signals.item_scraped, weak=False)
+        self.started[stage.name] = time.monotonic()
+        logger.info(f'阶段 {stage.name} 开始（{stage.spider}{"，从数据流 " + stage.consumes if stream else ""}）')
+        d = self.process.crawl(crawler)
+        d.addBoth(self._crawl_finished, stage, crawler)
+
+    def _crawl_finished(self, result, stage, crawler):
+        if isinstance(result, Failure):
+            logger.error(f'阶段 {stage.name} 出错: {result.getErrorMessage()}')
+        reason = crawler.stats.get_value('finish_reason') if crawler.stats else None
+        if reason != 'finished':
+            self.failed.append(stage.name)
+        for name in stage.produces:
+            self.streams[name].producer_done()
+        self._stage_done(stage.name, reason)
+
+    def _start_ready_cleanings(self):
+        for stage in self.stages.values():
+            if not isinstance(stage, CleanStage) or stage.name in self.started:
+                continue
+            if all(name in self.finished or name not in self.stages for name in stage.after):
+                self._start_cleaning(stage)
+
+    def _start_cleaning(self, stage):
+        self.started[stage.name] = time.monotonic()
+        logger.info(f'阶段 {stage.name} 开始（{stage.script}）')
+        d = utils.getProcessOutputAndValue(sys.executable, [stage.script], env=os.environ, path=PROJECT_DIR)
+        d.addCallback(self._cleaning_finished, stage)
+        d.addErrback(self._cleaning_failed, stage)
+
+    def _cleaning_finished(self, result, stage):
+        out, err, code = result
+        if code != 0:
+            self.failed.append(stage.name)
+            logger.error(f'阶段 {stage.name} 失败（退出码 {code}）:\n{err.decode("utf-8", "replace")[-2000:]}')
+        self._stage_done(stage.name, code)
+
+    def _cleaning_failed(self, failure, stage):
+        self.failed.append(stage.name)
+        logger.error(f'阶段 {stage.name} 无法启动: {failure.getErrorMessage()}')
+        self._stage_done(stage.name, None)
+
+    def _stage_done(self, name, result):
+        self.finished[name] = time.monotonic()
+        logger.info(f'阶段 {name} 结束（{result}），用时 {self.finished[name] - self.started[name]:.1f} 秒')
+        self._start_ready_cleanings()
+        if len(self.finished) == len(self.stages):
+            from twisted.internet import reactor
+            reactor.callLater(0, reactor.stop)
+
+    def _report(self):
+        if not self.started:
+            return
+        begin = min(self.started.values())
+        end = max(self.finished.values(), default=begin)
+        for name in self.stages:
+            if name in self.finished:
+                logger.info(f'{name:<26}{self.started[name] - begin:>8.1f}s 开始{self.finished[name] - begin:>8.1f}s 结束')
+        logger.info(f'总用时 {end - begin:.1f} 秒；失败的阶段: {self.failed or "无"}')
+
+
+def select_stages(names, cleaning=True):
+    """按名称选出阶段，不选时为全部阶段；cleaning 为假时去掉清洗阶段"""
+    stages = [stage for stage in STAGES if cleaning or not isinstance(stage, CleanStage)]
+    if not names:
+        return stages
+    known = {stage.name for stage in STAGES}
+    unknown = [name for name in names if name not in known]
+    if unknown:
+        raise ValueError(f'未知的阶段: {", ".join(unknown)}')
+    return [stage for stage in stages if stage.name in names]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stages', default='', help='只运行这些阶段（逗号分隔），默认全部')
+    parser.add_argument('--no-cleaning', action='store_true', help='不运行清洗阶段')
+    parser.add_argument('-s', dest='settings_args', action='append', default=[], metavar='NAME=VALUE',
+                        help='覆盖配置')
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.stages.split(',') if name.strip()]
+    try:
+        stages = select_stages(names, cleaning=not args.no_cleaning)
+    except ValueError as e:
+        parser.error(str(e))
+    settings = get_project_settings()
+    for value in args.settings_args:
+        name, _, setting = value.partition('=')
+        settings.set(name, setting, priority='cmdline')
+    if not Orchestrator(settings, stages).run():
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+import json
+import logging
+import os
+import time
+
+from .dead_letters import record_dead_letter
+
+logger = logging.getLogger(__name__)
+
+# 默认的学习结果文件（相对于项目根目录）
+DEFAULT_STATE_PATH = os.path.join('data', 'page_sizes.json')
+
+
+class EndpointStats:
+    """
+    单个接口的观测值：对 延迟 = a + b × 行数 做最小二乘拟合（a 为固定开销，b 为每行耗时），
+    并记录每行的平均字节数、见过的最大整页行数与服务器的单页上限（及发现上限的时间）。
+    """
+
+    def __init__(self, pagecount, n=0, sum_x=0.0, sum_y=0.0, sum_xx=0.0, sum_xy=0.0,
+                 rows=0, total_bytes=0, max_rows=0, server_cap=0, server_cap_at=0.0):
+        self.pagecount = pagecount
+        self.n = n
+        self.sum_x = sum_x
+        self.sum_y = sum_y
+        self.sum_xx = sum_xx
+        self.sum_xy = sum_xy
+        self.rows = rows
+        self.total_bytes = total_bytes
+        self.max_rows = max_rows
+        self.server_cap = server_cap
+        self.server_cap_at = server_cap_at
+
+    def observe(self, rows, latency, size):
+        self.n += 1
+        self.sum_x += rows
+        self.sum_y += latency
+        self.sum_xx += rows * rows
+        self.sum_xy += rows * latency
+        self.rows += rows
+        self.total_bytes += size
+        self.max_rows = max(self.max_rows, rows)
+
+    def fit(self):
+        """返回 (固定开销秒数, 每行秒数)，样本不足或行数没有变化时返回 None"""
+        denominator = self.n * self.sum_xx - self.sum_x * self.sum_x
+        if self.n < 2 or denominator <= 0:
+            return None
+        per_row = (self.n * self.sum_xy - self.sum_x * self.sum_y) / denominator
+        base = (self.sum_y - per_row * self.sum_x) / self.n
+        return max(base, 0.0), per_row
+
+    def bytes_per_row(self):
+        return self.total_bytes / self.rows if self.rows else 0
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+class PageSizePlanner:
+    """
+    按接口自适应选择 paging[pagecount]：测量每个接口的响应大小与延迟，
+    在单页预计耗时不超过 target_seconds、单页字节数不超过 max_bytes 的前提下选尽量大的页，
+    以减少总请求数。学习结果保存在 path 指向的 JSON 文件中，下次运行直接沿用。
+
+    为了不把少量观测外推太远，新页大小最多为见过的最大整页行数的 growth 倍；
+    请求超时时该接口的页大小减半。同一物种的所有页必须使用相同的页大小，
+    因此页大小只在发起第一页时确定，并通过 meta['pagecount'] 传给后续页。
+
+    非最后一页没有装满说明服务器限制了单页行数，之后的页大小不超过该上限；
+    上限只保留 cap_ttl 秒，过期后（含从学习结果加载时已过期）重新按拟合结果选择，服务器放宽限制后不会永久受限。
+    """
+
+    def __init__(self, path=DEFAULT_STATE_PATH, target_seconds=7.5, max_bytes=16 * 1024 * 1024,
+                 min_pagecount=10, max_pagecount=5000, min_samples=20, growth=4, cap_ttl=86400):
+        self.path = path
+        self.target_seconds = target_seconds
+        self.max_bytes = max_bytes
+        self.min_pagecount = min_pagecount
+        self.max_pagecount = max_pagecount
+        self.min_samples = min_samples
+        self.growth = growth
+        self.cap_ttl = cap_ttl
+        self.endpoints = {}  # 接口地址 -> EndpointStats
+
+    @classmethod
+    def from_settings(cls, settings):
+        target = settings.getfloat('PAGE_SIZE_TARGET_SECONDS') or settings.getfloat('DOWNLOAD_TIMEOUT', 180) / 4
+        return cls(
+            path=settings.get('PAGE_SIZE_STATE_PATH', DEFAULT_STATE_PATH),
+            target_seconds=target,
+            max_bytes=settings.getint('PAGE_SIZE_MAX_BYTES', 16 * 1024 * 1024),
+            min_pagecount=settings.getint('PAGE_SIZE_MIN', 10),
+            max_pagecount=settings.getint('PAGE_SIZE_MAX', 5000),
+            cap_ttl=settings.getfloat('PAGE_SIZE_CAP_TTL', 86400),
+        )
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f'读取页大小学习结果失败，将重新学习: {e}')
+            return
+        self.endpoints = {endpoint: EndpointStats(**values) for endpoint, values in state.items()}
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({endpoint: stats.to_dict() for endpoint, stats in self.endpoints.items()},
+                      f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def stats(self, endpoint, default):
+        stats = self.endpoints.get(endpoint)
+        if stats is None:
+            stats = self.endpoints[endpoint] = EndpointStats(default)
+        return stats
+
+    def page_size(self, endpoint, default):
+        """返回该接口下一个物种第一页应使用的页大小"""
+        stats = self.stats(endpoint, default)
+        if stats.n < self.min_samples:
+            return stats.pagecount
+        fit = stats.fit()
+        planned = self.max_pagecount
+        if fit is not None:
+            base, per_row = fit
+            if per_row > 0:
+                planned = int((self.target_seconds - base) / per_row)
+        if stats.bytes_per_row():
+            planned = min(planned, int(self.max_bytes / stats.bytes_per_row()))
+        # 只在见过整页数据时才放大页大小，且最多放大到最大整页行数的 growth 倍
+        planned = min(planned, max(stats.max_rows * self.growth, stats.pagecount), self.max_pagecount)
+        if stats.server_cap:
+            if time.time() - stats.server_cap_at < self.cap_ttl:
+                planned = min(planned, stats.server_cap)
+            else:
+                stats.server_cap = 0
+        stats.pagecount = max(planned, self.min_pagecount)
+        return stats.pagecount
+
+    def observe(self, endpoint, pagecount, pagenum, totalpage, rows, latency, size):
+        """记录一页响应：行数、下载耗时（秒）与响应体字节数"""
+        stats = self.stats(endpoint, pagecount)
+        stats.observe(rows, latency, size)
+        if is_truncated(pagecount, pagenum, totalpage, rows):
+            stats.server_cap = rows
+            stats.server_cap_at = time.time()
+
+    def on_timeout(self, endpoint, pagecount):
+        stats = self.endpoints.get(endpoint)
+        if stats is None:
+            return
+        stats.pagecount = max(min(stats.pagecount, pagecount) // 2, self.min_pagecount)
+        # 超时说明拟合过于乐观，丢弃旧样本重新学习
+        self.endpoints[endpoint] = EndpointStats(stats.pagecount, server_cap=stats.server_cap,
+                                                 server_cap_at=stats.server_cap_at)
+        logger.warning(f'{endpoint} 请求超时，页大小降为 {stats.pagecount}')
+
+
+def is_truncated(pagecount, pagenum, totalpage, rows):
+    """不是最后一页却没有装满，说明服务器限制了单页行数，该页超出上限的行没有返回"""
+    return pagenum < totalpage and 0 < rows < pagecount
+
+
+def plan_page_size(spider, endpoint, default):
+    """返回接口的页大小；未启用 PageSizeMiddleware 时返回 default"""
+    planner = getattr(spider, 'page_sizes', None)
+    return planner.page_size(endpoint, default) if planner is not None else default
+
+
+def record_page(spider, endpoint, response, rows, totalpage):
+    """
+    把一页响应的行数、耗时与大小交给页大小规划器。
+
+    该页被服务器截断时（见 is_truncated()），同一物种的其余页已按同样的页大小发出，缺失的行无法补齐：
+    该页写入死信并打上解析失败标记，检查点不会把这个物种标记为完成，下次运行按学到的上限重新爬取。
+    """
+    meta = response.meta
+    if 'pagecount' in meta and is_truncated(meta['pagecount'], meta.get('pagenum', 1), totalpage, rows):
+        spider.logger.error(f'{endpoint} 第 {meta.get("pagenum", 1)} 页只返回 {rows} 行（页大小 {meta["pagecount"]}），'
+                            f'服务器限制了单页行数，该物种的数据不完整')
+        spider.crawler.stats.inc_value('pagination/truncated_pages', spider=spider)
+        record_dead_letter(spider, response.request, 'TruncatedPage', f'{rows} < {meta["pagecount"]}')
+    planner = getattr(spider, 'page_sizes', None)
+    if planner is None or 'pagecount' not in meta or 'cached' in response.flags:
+        return  # 命中 HTTP 缓存的响应没有真实的下载耗时
+    planner.observe(
+        endpoint,
+        response.meta['pagecount'],
+        response.meta.get('pagenum', 1),
+        totalpage,
+        rows,
+        response.meta.get('download_latency', 0.0),
+        len(response.body),
+    )
@@ -0,0 +1,38 @@
+def page_count(paging, default=0):
+    """从响应的 paging 对象中读取总页数，缺失或非法时返回 default"""
+    try:
+        return int(paging.get('totalpage') or default)
+    except (TypeError, ValueError):
+        return default
+
+
+def fan_out_pages(spider, endpoint, key, pagenum, totalpage, build_request):
+    """
+    分页扇出：第一页响应拿到 totalpage 后，一次性调度第 2 ~ totalpage 页，
+    替代“每收到一页才请求下一页”的串行链。其余页的响应不会再扇出。
+    每个 (endpoint, key) 只扇出一次，同一物种的第一页被重复抓取（如重试）时不会重复扇出。
+    第 2 页起的请求只在这里生成，扇出一次即每页只请求一次，因此不再逐页记录 (endpoint, key, pagenum)：
+    集合大小与物种数成正比，而不是与总页数成正比。
+    这里不依赖 Scrapy 的去重过滤器（species_distribution 的分页请求带 dont_filter=True），
+    同一页的重复请求只可能来自重试（由 RetryMiddleware 控制次数）。
+
+    参数:
+        spider: 当前爬虫，已扇出的 (endpoint, key) 保存在 spider.seen_pages 上
+        endpoint (str): 接口地址
+        key: 分页所属的对象（通常为 SC_GUID），无则为 None
+        pagenum (int): 当前响应的页码
+        totalpage (int): 服务器返回的总页数
+        build_request (callable): build_request(pagenum) -> Request
+    返回:
+        generator: 其余页的请求
+    """
+    if pagenum != 1 or totalpage <= 1:
+        return
+    seen = spider.__dict__.setdefault('seen_pages', set())
+    if (endpoint, key) in seen:
+        spider.crawler.stats.inc_value('pagination/duplicate_fan_out', spider=spider)
+        return
+    seen.add((endpoint, key))
+    for page in range(2, totalpage + 1):
+        spider.crawler.stats.inc_value('pagination/fan_out_pages', spider=spider)
+        yield build_request(page)
@@ -1,426 +1,511 @@
-import json
 import os
-from pathlib import Path
-
-from itemadapter import ItemAdapter
-from scrapy.utils import spider
-
-from .items import CankaoItem
-
-
-class JsonBatchPipeline:
-    def __init__(self):
-        self.batch_size = 5000
-        self.data_buffer = []
-        self.file_counter = 1
-        self.output_dir = 'data/pests_list'
+import sqlite3
+from collections import defaultdict
+
+from scrapy.exceptions import NotConfigured
+
+from .icode_index import DEFAULT_INDEX_PATH, IcodeIndex, extract_icodes
+from .items import (
+    CankaoItem, CmDiffuseMediumItem, FileMetadataItem, ICodeItem, IcodeItem, IssueCodeDetailItem,
+    MetaInfoItem, PestchinaScraperItem, PestHostPartItem, PestRelationInfoItem, SpeciesBasicInfoItem,
+    SpeciesDistributionItem, SpeciesHostItem, SpeciesParentItem, YMMetaItem,
+)
+from .records import item_class_of, to_dict
+from .storage import (
+    BackgroundBatchWriter, BatchJournal, BatchWriter, ParquetBatchWriter, RecordSizeEstimator, build_arrow_schema,
+)
+from .tables import INTEGER_COLUMNS, ROW_HASH_COLUMN, TABLES, iter_table_specs, split_record
+
+
+class StreamingBatchPipeline:
+    """
+    流式批次写入管道基类：每个 Item 到达即以紧凑 JSON 追加到当前分片，
+    按条目数（BATCH_MAX_ITEMS / batch_size）或字节数（BATCH_MAX_BYTES）滚动文件，
+    不再在内存中缓存整批数据。
+    BATCH_WRITE_MODE 为 thread 时，每攒够 BATCH_FLUSH_ITEMS 条就把整批交给后台写线程，
+    写线程落后超过 BATCH_WRITE_QUEUE 批时 process_item 返回 Deferred 反压爬取。
+    BATCH_JOURNAL_ENABLED 开启时分片原子落盘，并在 <输出目录>/<前缀>.journal 中记录数据已完整落盘的
+    key_field 字段值（CheckpointMiddleware 在物种完成时调用 finish()），供 ResumeMiddleware 在重启后跳过这些请求。
+    BATCH_OUTPUT_ROOT 不为空时输出目录改为 <BATCH_OUTPUT_ROOT>/<output_dir>（多进程启动器为每个工作进程指定）。
+    buffered_bytes() / drain() 供 MemoryBudget 扩展统计缓冲区字节数并在超出预算时立即投递缓冲区；
+    commit() 供 CheckpointMiddleware 在写检查点前让已缓冲的记录落盘。
+    声明了 item_class 的管道只写入该类型的记录，同时启用多个管道（如 species_all 组合爬虫）时各写各的。
+    子类只需声明记录类型、输出目录、文件前缀、默认批次大小和记录主键字段。
+    """
+    item_class = None  # 写入的记录类型，None 表示写入所有流过的记录
+    output_dir = None  # 输出目录
+    file_prefix = None  # 批次文件前缀，文件名为 <file_prefix>_batch_<N>.<后缀>
+    batch_size = 5000  # 每个文件的默认记录数
+    first_batch = 1  # 第一个批次文件的编号
+    key_field = None  # 提交到日志的记录主键字段
+
+    def __init__(self, max_items=None, max_bytes=0, fmt='json',
+                 write_mode='sync', flush_items=500, max_pending=4, journal_enabled=False, output_root=''):
+        if output_root:
+            self.output_dir = os.path.join(output_root, self.output_dir)
+        self.max_items = max_items or self.batch_size
+        self.max_bytes = max_bytes
+        self.fmt = fmt
+        self.write_mode = write_mode  # sync：在 reactor 线程写入；thread：交给后台写线程
+        self.flush_items = flush_items  # thread 模式下每次投递的记录数
+        self.max_pending = max_pending  # thread 模式下允许排队的批次数
+        self.journal_enabled = journal_enabled  # 是否原子落盘并记录提交日志
+        self.writer = None
+        self.background = None
+        self.buffer = []
+        self.finished = []  # thread 模式下随下一批记录投递的已完成主键
+        self.sizes = RecordSizeEstimator()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(
+            max_items=settings.getint('BATCH_MAX_ITEMS'),
+            max_bytes=settings.getint('BATCH_MAX_BYTES'),
+            fmt=settings.get('BATCH_FORMAT', 'json'),
+            write_mode=settings.get('BATCH_WRITE_MODE', 'sync'),
+            flush_items=settings.getint('BATCH_FLUSH_ITEMS', 500),
+            max_pending=settings.getint('BATCH_WRITE_QUEUE', 4),
+            journal_enabled=settings.getbool('BATCH_JOURNAL_ENABLED'),
+            output_root=settings.get('BATCH_OUTPUT_ROOT', ''),
+        )
 
     def open_spider(self, spider):
-        os.makedirs(self.output_dir, exist_ok=True)
+        journal = None
+        if self.journal_enabled:
+            os.makedirs(self.output_dir, exist_ok=True)
+            journal = BatchJournal(os.path.join(self.output_dir, f'{self.file_prefix}.journal'))
+            # 已落盘的记录主键挂到 spider 上，由 ResumeMiddleware 过滤起始请求
+            if not hasattr(spider, 'committed_keys'):
+                spider.committed_keys = set()
+            spider.committed_keys.update(journal.keys)
+            # 按数据集分开的已提交主键，供同时写多个数据集的爬虫逐个接口判断
+            spider.__dict__.setdefault('committed_by_dataset', {})[self.file_prefix] = journal.keys
+        self.writer = BatchWriter(
+            self.output_dir,
+            self.file_prefix,
+            max_items=self.max_items,
+            max_bytes=self.max_bytes,
+            first_batch=self.first_batch,
+            fmt=self.fmt,
+            journal=journal,
+            key_field=self.key_field,
+        )
+        if self.write_mode == 'thread':
+            self.background = BackgroundBatchWriter(self.writer, max_pending=self.max_pending)
 
     def process_item(self, item, spider):
-        self.data_buffer.append(dict(item))
-        if len(self.data_buffer) >= self.batch_size:
-            self._flush_buffer()
-        return item
-
-    def close_spider(self, spider):
-        if self.data_buffer:
-            self._flush_buffer()
-
-    def _flush_buffer(self):
-        filename = os.path.join(self.output_dir, f'pests_batch_{self.file_counter}.json')
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(self.data_buffer, f, ensure_ascii=False, indent=2)
-        self.data_buffer = []
-        self.file_counter += 1
-        spider.logger.info(f'已保存批次文件：{filename}')
-
-
-class MetaInfoJsonBatchPipeline:
-    def __init__(self):
-        self.batch_size = 5000
-        self.data_buffer = []
-        self.batch_count = 1
-
-        # 创建输出目录
-        output_dir = 'data/meta_info_list'
-        self.output_dir = output_dir
-        os.makedirs(output_dir, exist_ok=True)
-
-    def process_item(self, item, spider):
-        self.data_buffer.append(ItemAdapter(item).asdict())
-        if len(self.data_buffer) >= self.batch_size:
-            self.flush_buffer()
-        return item
-
-    def close_spider(self, spider):
-        if self.data_buffer:
-            self.flush_buffer()
-
-    def flush_buffer(self):
-        """写入文件并清空缓冲区"""
-        filename = os.path.join(self.output_dir, f'meta_batch_{self.batch_count}.json')
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(self.data_buffer, f, ensure_ascii=False, indent=2)
-
-        spider.logger.info(f'✅ 成功写入批次 {self.batch_count}（{len(self.data_buffer)}条）')
-        self.data_buffer = []
-        self.batch_count += 1
-
-
-class SpeciesDistributionPipeline:
-    """物种分布数据存储管道"""
-
-    def __init__(self):
-        self.batch_size = 5000  # 每个文件存储量
-        self.file_counter = 1  # 文件序号
-        self.data_buffer = []  # 数据缓存
-        self.output_dir = Path('data/species_distribution')  # 存储目录
-
-        # 创建存储目录
-        self.output_dir.mkdir(parents=True, exist_ok=True)
-
-    def process_item(self, item, spider):
-        """处理每个Item"""
-        if spider.name != 'species_distribution':
+        if self.item_class is not None and item_class_of(item) is not self.item_class:
+            return item
+        record = self.serialize(item)
+        if self.background is None:
+            self.writer.write(record)
             return item
 
-        # 转换嵌套的Item对象为字典
-        item_dict = dict(item)
-        if 'Icodes' in item_dict:
-            item_dict['Icodes'] = [
-                dict(icode) for icode in item_dict['Icodes']
-            ]
-
-        self.data_buffer.append(item_dict)
-
-        # 达到批次数量时写入文件
-        if len(self.data_buffer) >= self.batch_size:
-            self.flush_buffer()
-
-        return item
-
-    def close_spider(self, spider):
-        """爬虫关闭时处理剩余数据"""
-        if spider.name == 'species_distribution' and self.data_buffer:
-            self.flush_buffer()
-
-    def flush_buffer(self):
-        """将缓存数据写入文件"""
-        filename = f'species_distribution_batch_{self.file_counter}.json'
-        file_path = self.output_dir / filename
-
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(self.data_buffer, f, ensure_ascii=False, indent=2)
-
-        spider.logger.info(f'已写入 {len(self.data_buffer)} 条数据到 {file_path}')
-        print(f'已写入 {len(self.data_buffer)} 条数据到 {file_path}')
-        self.data_buffer = []
-        self.file_counter += 1
-
-
-class SpeciesBasicInfoPipeline:
-    def __init__(self):
-        self.items = []  # 存储Item的列表
-        self.file_count = 0  # 文件编号
-        self.item_count = 0  # 当前记录数
-        self.max_items_per_file = 5000  # 每个文件最大记录数
-        self.output_dir = 'data/species_basicinfo'  # 输出目录
-        if not os.path.exists(self.output_dir):
-            os.makedirs(self.output_dir)
-
-    def process_item(self, item, spider):
-        """处理每个 item，将其转换为字典并处理嵌套的 cankao 字段"""
-        # 将顶层 item 转换为字典
-        item_dict = dict(item)
-
-        # 检查 'cankao' 是否存在且不为空，然后将其转换为字典
-        if 'cankao' in item_dict and item_dict['cankao']:
-            item_dict['cankao'] = dict(item_dict['cankao'])
-
-        # 将完全转换后的字典添加到 items 列表
-        self.items.append(item_dict)
-
-
-        self.item_count += 1
-        if self.item_count >= self.max_items_per_file:
-            self.save_to_json()
-            self.items = []
-            self.item_count = 0
-            self.file_count += 1
-        return item
+        self.buffer.append(record)
+        self.sizes.observe(record)
+        if len(self.buffer) < self.flush_items:
+            return item
+        self.drain()
+        if not self.background.is_full():
+            return item
+        # 写线程跟不上时挂起当前 Item，直到有批次写完
+        return self.background.wait().addCallback(lambda _: item)
 
     def close_spider(self, spider):
-        """爬虫结束时保存剩余的Item"""
-        if self.items:
-            self.save_to_json()
+        if self.background is None:
+            self.writer.close()
+            return None
+        self.drain()
+        return self.background.close()
 
-    def save_to_json(self):
-        """将Item列表保存到JSON文件"""
-        filename = f'species_basicinfo_batch_{self.file_count}.json'
-        filepath = os.path.join(self.output_dir, filename)
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(self.items, f, ensure_ascii=False, indent=4)
-
-
-class SpeciesHostPipeline:
-    def __init__(self):
+    def finish(self, key):
         """
-        初始化Pipeline，设置存储参数
+        key 对应的物种 / 文献已完成（记录都已经过本管道），由 CheckpointMiddleware 调用。
+        thread 模式下排在缓冲区中的记录之后交给写线程，保证日志不会领先于数据。
         """
-        self.items = []  # 暂存Item的列表
-        self.batch_size = 5000  # 每批保存5000条数据
-        self.batch_count = 1  # 文件批次编号
-        # 输出目录路径
-        self.output_dir = 'data/species_host_list'  # 输出目录
-        os.makedirs(self.output_dir, exist_ok=True)  # 创建目录（如果不存在）
-
-    def process_item(self, item, spider):
+        if not self.journal_enabled:
+            return
+        if self.background is None:
+            self.writer.finish((key,))
+        else:
+            self.finished.append(key)
+
+    def serialize(self, item):
+        """将 Item / 记录（含嵌套的列表）转换为可序列化的字典"""
+        return to_dict(item)
+
+    def buffered_bytes(self):
+        """估算 thread 模式下缓冲区与写线程队列中尚未落盘的字节数；sync 模式逐条写入，不占缓冲"""
+        if self.background is None:
+            return 0
+        return self.sizes.estimate(len(self.buffer) + self.background.pending_records)
+
+    def drain(self):
+        """把缓冲区中不足一批的记录（及已完成的主键）立即交给写线程"""
+        if self.background is not None and (self.buffer or self.finished):
+            self.background.submit(self.buffer, self.finished)
+            self.buffer = []
+            self.finished = []
+
+    def commit(self):
         """
-        处理每个Item，添加到列表并检查是否需要保存
+        结束当前分片，使已经过管道的记录全部落盘（开启日志时原子提交），供 CheckpointMiddleware 在写检查点前调用。
+        thread 模式返回分片提交后触发的 Deferred。
         """
-        # 将Item转换为字典
-        item_dict = dict(item)
-        # 处理嵌套的Icodes字段，转换为字典列表
-        if 'Icodes' in item_dict:
-            item_dict['Icodes'] = [dict(icode) for icode in item_dict['Icodes']]
-        self.items.append(item_dict)
-        # 如果达到批次大小，保存数据
-        if len(self.items) >= self.batch_size:
-            self.save_batch()
-        return item
+        if self.background is None:
+            self.writer.rotate()
+            return None
+        self.drain()
+        return self.background.rotate()
 
-    def save_batch(self):
-        """
-        将当前批次数据保存为JSON文件
-        """
-        filename = f'species_host_batch_{self.batch_count}.json'  # 文件名
-        filepath = os.path.join(self.output_dir, filename)  # 文件路径
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(self.items, f, ensure_ascii=False, indent=2)  # 保存为JSON
-        self.items = []  # 清空列表
-        self.batch_count += 1  # 增加批次编号
 
-    def close_spider(self, spider):
-        """
-        爬虫关闭时，保存剩余数据
-        """
-        if self.items:
-            self.save_batch()
+class JsonBatchPipeline(StreamingBatchPipeline):
+    """物种列表存储管道"""
+    item_class = PestchinaScraperItem
+    output_dir = 'data/pests_list'
+    file_prefix = 'pests'
+    batch_size = 5000
+    key_field = 'TP_GUID'
 
 
-class SpeciesParentPipeline:
-    def __init__(self):
-        """初始化管道，设置批次大小和输出目录"""
-        self.items = []  # 存储 Item 的列表
-        self.batch_size = 100  # 每批保存 5000 条数据
-        self.batch_num = 1  # 当前批次编号
-        self.output_dir = 'data/species_parent_list'  # 输出目录
-        # 确保输出目录存在
-        if not os.path.exists(self.output_dir):
-            os.makedirs(self.output_dir)
+class MetaInfoJsonBatchPipeline(StreamingBatchPipeline):
+    """物种元信息存储管道"""
+    item_class = MetaInfoItem
+    output_dir = 'data/meta_info_list'
+    file_prefix = 'meta'
+    batch_size = 5000
+    key_field = 'TP_GUID'
 
-    def process_item(self, item, spider):
-        """处理每个 Item，添加到列表并在达到批次大小时保存"""
-        self.items.append(dict(item))  # 将 Item 转换为字典
-        if len(self.items) >= self.batch_size:
-            self.save_to_json()
-        return item
 
-    def close_spider(self, spider):
-        """爬虫关闭时保存剩余的 Item"""
-        if self.items:
-            self.save_to_json()
-
-    def save_to_json(self):
-        """将当前批次的 Item 保存到 JSON 文件"""
-        filename = f'species_parent_batch_{self.batch_num}.json'
-        filepath = os.path.join(self.output_dir, filename)
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(self.items, f, ensure_ascii=False, indent=2)  # 保存为 JSON 文件
-        self.items = []  # 清空列表
-        self.batch_num += 1  # 增加批次编号
-
-
-class PestRelationPipeline:
-    def __init__(self):
-        self.items = []
-        self.file_count = 1
-        self.item_count = 0
-        self.max_items_per_file = 5000
-        self.output_dir = 'data/pest_relation'
-        if not os.path.exists(self.output_dir):
-            os.makedirs(self.output_dir)
+class SpeciesDistributionPipeline(StreamingBatchPipeline):
+    """物种分布数据存储管道"""
+    item_class = SpeciesDistributionItem
+    output_dir = 'data/species_distribution'
+    file_prefix = 'species_distribution'
+    batch_size = 5000
+    key_field = 'species_id'
+
+
+class SpeciesBasicInfoPipeline(StreamingBatchPipeline):
+    """物种基本信息存储管道"""
+    item_class = SpeciesBasicInfoItem
+    output_dir = 'data/species_basicinfo'
+    file_prefix = 'species_basicinfo'
+    batch_size = 5000
+    first_batch = 0
+    key_field = 'SC_GUID'
+
+
+class SpeciesHostPipeline(StreamingBatchPipeline):
+    """物种寄主信息存储管道"""
+    item_class = SpeciesHostItem
+    output_dir = 'data/species_host_list'
+    file_prefix = 'species_host'
+    batch_size = 5000
+    key_field = 'species_id'
+
+
+class SpeciesParentPipeline(StreamingBatchPipeline):
+    """物种父级分类信息存储管道"""
+    item_class = SpeciesParentItem
+    output_dir = 'data/species_parent_list'
+    file_prefix = 'species_parent'
+    batch_size = 100
+    key_field = 'species_TP_GUID'
+
+
+class PestRelationPipeline(StreamingBatchPipeline):
+    """物种关联信息存储管道"""
+    item_class = PestRelationInfoItem
+    output_dir = 'data/pest_relation'
+    file_prefix = 'pest_relation'
+    batch_size = 5000
+    key_field = 'SC_GUID'
+
+
+class PestHostPartPipeline(StreamingBatchPipeline):
+    """害虫寄主部位存储管道"""
+    item_class = PestHostPartItem
+    output_dir = os.path.join('data', 'pest_host_part_list')
+    file_prefix = 'pest_host_part'
+    batch_size = 2000
+    key_field = 'species_id'
+
+
+class CmDiffuseMediumPipeline(StreamingBatchPipeline):
+    """扩散媒介存储管道"""
+    item_class = CmDiffuseMediumItem
+    output_dir = os.path.join('data', 'cm_diffuse_medium_list')
+    file_prefix = 'cm_diffuse_medium'
+    batch_size = 200
+    key_field = 'species_id'
+
+
+class IssueCodeDetailPipeline(StreamingBatchPipeline):
+    """参考文献详情存储管道"""
+    item_class = IssueCodeDetailItem
+    output_dir = os.path.join('data', 'issue_code_detail_list')
+    file_prefix = 'issue_code_detail'
+    batch_size = 500
+    key_field = 'Icode'
+
+
+class FilePipeline(StreamingBatchPipeline):
+    """文件元数据存储管道"""
+    item_class = FileMetadataItem
+    output_dir = os.path.join('data', 'file_metadata_list')
+    file_prefix = 'file_metadata'
+    batch_size = 200
+    key_field = 'icode'
+
+
+class ParquetPipeline:
+    """
+    Parquet 列式存储管道：覆盖 items.py 中的全部 Item 类型，按类型分别写入
+    <对应 JSON 管道的输出目录>/<前缀>_batch_<N>.parquet，编号接在已有文件之后，每个文件至多 PARQUET_MAX_ROWS 行。
+    每攒够 PARQUET_ROW_GROUP_SIZE 条写出一个 row group，区域、分类等重复字符串列使用字典编码，
+    Icodes / ym 存为 list<struct> 列，cankao 存为 struct 列。需要安装 pyarrow。
+    commit() 供 CheckpointMiddleware 在写检查点前结束各类型的当前文件（Parquet 文件写出 footer 后才可读），
+    因此开启检查点时每个刷新周期都会产生一批较小的文件，见 ParquetBatchWriter。
+    """
+    # Item 类型 -> (沿用其输出目录与文件前缀的批次管道, 嵌套字段)
+    datasets = {
+        PestchinaScraperItem: (JsonBatchPipeline, {}),
+        MetaInfoItem: (MetaInfoJsonBatchPipeline, {'ym': (YMMetaItem, True)}),
+        SpeciesDistributionItem: (SpeciesDistributionPipeline, {'Icodes': (ICodeItem, True)}),
+        SpeciesBasicInfoItem: (SpeciesBasicInfoPipeline, {'cankao': (CankaoItem, False)}),
+        SpeciesHostItem: (SpeciesHostPipeline, {'Icodes': (IcodeItem, True)}),
+        SpeciesParentItem: (SpeciesParentPipeline, {}),
+        PestRelationInfoItem: (PestRelationPipeline, {'cankao': (CankaoItem, False)}),
+        PestHostPartItem: (PestHostPartPipeline, {'Icodes': (ICodeItem, True)}),
+        CmDiffuseMediumItem: (CmDiffuseMediumPipeline, {}),
+        IssueCodeDetailItem: (IssueCodeDetailPipeline, {}),
+        FileMetadataItem: (FilePipeline, {}),
+    }
+    item_classes = tuple(datasets)  # 写入的记录类型，CheckpointMiddleware 据此判断本管道是否保存了爬虫的记录
+
+    def __init__(self, row_group_size=10000, compression='zstd', max_rows=0, output_root=''):
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.max_rows = max_rows
+        self.output_root = output_root
+        self.writers = {}  # Item 类型 -> ParquetBatchWriter
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise NotConfigured('ParquetPipeline 需要安装 pyarrow')
+        settings = crawler.settings
+        return cls(
+            row_group_size=settings.getint('PARQUET_ROW_GROUP_SIZE', 10000),
+            compression=settings.get('PARQUET_COMPRESSION', 'zstd'),
+            max_rows=settings.getint('PARQUET_MAX_ROWS'),
+            output_root=settings.get('BATCH_OUTPUT_ROOT', ''),
+        )
 
     def process_item(self, item, spider):
-        """处理每个项目，并在达到 5000 个项目时保存到文件。"""
-        # 将 item 转换为字典，并处理嵌套的 cankao 字段
-        item_dict = dict(item)
-        if 'cankao' in item_dict and item_dict['cankao'] is not None:
-            item_dict['cankao'] = dict(item_dict['cankao'])  # 将 CankaoItem 转换为普通字典
-
-        self.items.append(item_dict)
-        self.item_count += 1
-        if self.item_count >= self.max_items_per_file:
-            self.save_to_file()
-            self.items = []
-            self.item_count = 0
-            self.file_count += 1
+        item_class = item_class_of(item)
+        if item_class not in self.datasets:
+            return item
+        writer = self.writers.get(item_class)
+        if writer is None:
+            writer = self.writers[item_class] = self._open_writer(item_class)
+        writer.write(to_dict(item))
         return item
 
     def close_spider(self, spider):
-        """在爬虫关闭时保存剩余的项目。"""
-        if self.items:
-            self.save_to_file()
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
 
-    def save_to_file(self):
-        """将收集的项目保存到 JSON 文件。"""
-        filename = f'pest_relation_batch_{self.file_count}.json'
-        filepath = os.path.join(self.output_dir, filename)
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(self.items, f, ensure_ascii=False, indent=4)
+    def buffered_bytes(self):
+        return sum(writer.buffered_bytes() for writer in self.writers.values())
 
+    def drain(self):
+        """把各类型缓存的记录立即写成 row group"""
+        for writer in self.writers.values():
+            writer.flush()
 
+    def commit(self):
+        """结束各类型的当前文件，后续记录写入新编号的文件"""
+        for writer in self.writers.values():
+            writer.commit()
 
-class PestHostPartPipeline:
-    def __init__(self):
-        self.items = []  # 存储爬取的Item
-        self.batch_size = 2000  # 每批保存的记录数
-        self.batch_num = 1  # 批次编号
-        self.output_dir = os.path.join('data', 'pest_host_part_list')  # 输出目录
-        if not os.path.exists(self.output_dir):
-            os.makedirs(self.output_dir)  # 创建目录如果不存在
-
-    def process_item(self, item, spider):
-        """处理每个Item，转换为可序列化的字典并累积到列表中"""
-        # 将Item转换为字典，并处理嵌套的Icodes字段
-        item_dict = dict(item)
-        item_dict['Icodes'] = [dict(icode) for icode in item['Icodes']]  # 将每个ICodeItem转换为字典
-        self.items.append(item_dict)  # 添加到列表
-        if len(self.items) >= self.batch_size:
-            self.save_batch()  # 达到5000条时保存
-        return item
-
-    def close_spider(self, spider):
-        """爬虫关闭时保存剩余数据"""
-        if self.items:
-            self.save_batch()
-
-    def save_batch(self):
-        """保存当前批次数据到JSON文件"""
-        filename = f'pest_host_part_batch_{self.batch_num}.json'
-        filepath = os.path.join(self.output_dir, filename)
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(self.items, f, ensure_ascii=False, indent=4)  # 保存为格式化的JSON
-        self.items = []  # 清空列表
-        self.batch_num += 1  # 增加批次编号
-
-
-class CmDiffuseMediumPipeline:
-    def __init__(self):
-        self.items = []  # 存储爬取的Item
-        self.batch_size = 200  # 每批保存的记录数
-        self.batch_num = 1  # 批次编号
-        self.output_dir = os.path.join('data', 'cm_diffuse_medium_list')  # 输出目录
-        if not os.path.exists(self.output_dir):
-            os.makedirs(self.output_dir)  # 创建目录如果不存在
+    def finish(self, key):
+        """
+        key 对应的物种 / 文献已完成，由 CheckpointMiddleware 调用。Parquet 输出没有批次日志，无需记录；
+        检查点在 commit() 结束各文件之后才写入，已标记完成的物种其记录均已落盘。
+        """
 
-    def process_item(self, item, spider):
-        """处理每个Item，转换为字典并累积到列表中"""
-        self.items.append(dict(item))  # 将Item转换为字典并添加
-        if len(self.items) >= self.batch_size:
-            self.save_batch()  # 达到5000条时保存
-        return item
+    def _open_writer(self, item_class):
+        pipeline, nested = self.datasets[item_class]
+        return ParquetBatchWriter(
+            os.path.join(self.output_root, pipeline.output_dir),
+            pipeline.file_prefix,
+            build_arrow_schema(item_class, nested),
+            row_group_size=self.row_group_size,
+            compression=self.compression,
+            max_rows=self.max_rows,
+            first_batch=pipeline.first_batch,
+        )
+
+
+def upsert_statement(table, columns, key, uuid_column=None):
+    """
+    按唯一键写入的 INSERT 语句：键已存在时用新值更新其余列（UUID 列保持首次生成的值），
+    以内容哈希为键或没有其余列时忽略。
+    """
+    placeholders = ', '.join('?' * len(columns))
+    updates = [column for column in columns if column not in key and column != uuid_column]
+    if updates and ROW_HASH_COLUMN not in key:
+        action = 'DO UPDATE SET ' + ', '.join(f'{column} = excluded.{column}' for column in updates)
+    else:
+        action = 'DO NOTHING'
+    return (f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({placeholders}) '
+            f'ON CONFLICT ({", ".join(key)}) {action}')
+
+
+class SqlitePipeline:
+    """
+    SQLite 直写管道：在管道中直接套用 data_cleaning/ 的字段映射（见 tables.py），
+    把主表行与 reference_relation 等子表行拆分后批量写入本地 SQLite 文件，
+    省去“写原始 JSON -> 清洗脚本重新读取 -> 写 CSV”的整轮往返。
+    每攒够 SQLITE_BATCH_SIZE 行，在同一个事务内对各表执行 executemany。
+    每张表按唯一键（tables.py 中的 key，没有自然主键时为内容哈希）写入，
+    重新运行或断点续爬后重新爬取的物种只会更新已有的行，不会重复追加。
+    """
+    item_classes = tuple(TABLES)  # 写入的记录类型
+
+    def __init__(self, path='data/dp_spider.sqlite3', batch_size=1000):
+        self.path = path
+        self.batch_size = batch_size
+        self.connection = None
+        self.statements = {}  # 表名 -> INSERT 语句
+        self.rows = defaultdict(list)  # 表名 -> 待写入的行
+        self.row_count = 0
+        self.sizes = RecordSizeEstimator()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(
+            path=settings.get('SQLITE_PATH', 'data/dp_spider.sqlite3'),
+            batch_size=settings.getint('SQLITE_BATCH_SIZE', 1000),
+        )
 
-    def close_spider(self, spider):
-        """爬虫关闭时保存剩余数据"""
-        if self.items:
-            self.save_batch()
-
-    def save_batch(self):
-        """保存当前批次数据到JSON文件"""
-        filename = f'cm_diffuse_medium_batch_{self.batch_num}.json'
-        filepath = os.path.join(self.output_dir, filename)
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(self.items, f, ensure_ascii=False, indent=4)  # 保存为格式化的JSON
-        self.items = []  # 清空列表
-        self.batch_num += 1  # 增加批次编号
-
-class IssueCodeDetailPipeline:
-    def __init__(self):
-        self.items = []  # 存储爬取的Item
-        self.batch_size = 500  # 每批保存的记录数
-        self.batch_num = 1  # 批次编号
-        self.output_dir = os.path.join('data', 'issue_code_detail_list')  # 输出目录
-        if not os.path.exists(self.output_dir):
-            os.makedirs(self.output_dir)  # 创建目录如果不存在
+    def open_spider(self, spider):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        with self.connection:
+            for table, columns, key, uuid_column in iter_table_specs():
+                definitions = ', '.join(
+                    f'{column} {"INTEGER" if column in INTEGER_COLUMNS else "TEXT"}' for column in columns
+                )
+                self.connection.execute(
+                    f'CREATE TABLE IF NOT EXISTS {table} (id INTEGER PRIMARY KEY AUTOINCREMENT, {definitions})'
+                )
+                try:
+                    self.connection.execute(
+                        f'CREATE UNIQUE INDEX IF NOT EXISTS {table}_key ON {table} ({", ".join(key)})'
+                    )
+                except sqlite3.DatabaseError as e:
+                    raise RuntimeError(
+                        f'{self.path} 中的 {table} 表由旧版本创建（没有唯一键或含重复行），删除该文件后重新爬取: {e}'
+                    ) from e
+                self.statements[table] = upsert_statement(table, columns, key, uuid_column)
 
     def process_item(self, item, spider):
-        """处理每个Item，转换为字典并累积到列表中"""
-        self.items.append(dict(item))  # 将Item转换为字典并添加
-        if len(self.items) >= self.batch_size:
-            self.save_batch()  # 达到5000条时保存
+        spec = TABLES.get(item_class_of(item))
+        if spec is None:
+            return item
+        for table, row in split_record(spec, to_dict(item)):
+            self.rows[table].append(row)
+            self.sizes.observe(row)
+            self.row_count += 1
+        if self.row_count >= self.batch_size:
+            self.flush()
         return item
 
     def close_spider(self, spider):
-        """爬虫关闭时保存剩余数据"""
-        if self.items:
-            self.save_batch()
+        self.flush()
+        self.connection.close()
 
-    def save_batch(self):
-        """保存当前批次数据到JSON文件"""
-        filename = f'issue_code_detail_batch_{self.batch_num}.json'
-        filepath = os.path.join(self.output_dir, filename)
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(self.items, f, ensure_ascii=False, indent=4)  # 保存为格式化的JSON
-        self.items = []  # 清空列表
-        self.batch_num += 1  # 增加批次编号
+    def flush(self):
+        """在一个事务内写入所有待写入的行"""
+        if not self.row_count:
+            return
+        with self.connection:
+            for table, rows in self.rows.items():
+                self.connection.executemany(self.statements[table], rows)
+        self.rows = defaultdict(list)
+        self.row_count = 0
 
+    def buffered_bytes(self):
+        return self.sizes.estimate(self.row_count)
 
-import json
-import os
+    def drain(self):
+        self.flush()
 
+    def commit(self):
+        self.flush()
 
-class FilePipeline:
-    def __init__(self):
+    def finish(self, key):
         """
-        初始化 Pipeline，设置批次大小和文件路径
+        key 对应的物种 / 文献已完成，由 CheckpointMiddleware 调用。检查点在 commit() 提交事务之后才写入，
+        已标记完成的物种其记录均已写入数据库，无需另行记录。
         """
-        self.items = []  # 存储 Item 的列表
-        self.batch_size = 200  # 每个 JSON 文件保存的记录数
-        self.batch_number = 1  # 当前批次编号
-        # 输出文件路径，相对于项目根目录
-        self.file_path = os.path.join('data', 'file_metadata_list', 'file_metadata_batch_{}.json')
 
-    def process_item(self, item, spider):
-        """
-        处理每个 Item，收集到列表中并在达到批次大小时保存
-        """
-        self.items.append(dict(item))  # 将 Item 转换为字典并添加到列表
-        if len(self.items) >= self.batch_size:
-            self.save_batch()
-        return item  # 返回 Item 以支持后续 Pipeline
 
-    def close_spider(self, spider):
-        """
-        爬虫关闭时保存剩余的 Item
-        """
-        if self.items:  # 如果还有未保存的 Item
-            self.save_batch()
+class IcodeIndexPipeline:
+    """
+    文献 icode 索引管道：从流过的 Item 的 Icodes / cankao 字段中提取 icode，增量登记到
+    ICODE_INDEX_PATH 指向的持久化索引（见 icode_index.py）。
+    每新增 ICODE_INDEX_FLUSH_ITEMS 个 icode 批量写一次数据库，已知 icode 只做内存判断。
+    索引在第一条带 icode 的记录到达时才打开：issue_code_detail / file_metadata 的 start_requests 先读索引，
+    不会读到本管道刚刚建出的空索引（见 icode_index.load_icodes）。
+    """
+
+    def __init__(self, path=DEFAULT_INDEX_PATH, flush_items=1000, stats=None):
+        self.path = path
+        self.flush_items = flush_items
+        self.stats = stats
+        self.index = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(
+            path=settings.get('ICODE_INDEX_PATH', DEFAULT_INDEX_PATH),
+            flush_items=settings.getint('ICODE_INDEX_FLUSH_ITEMS', 1000),
+            stats=crawler.stats,
+        )
 
-    def save_batch(self):
-        """
-        将当前收集的 Item 保存为 JSON 文件
-        """
-        file_name = self.file_path.format(self.batch_number)
-        # 确保输出目录存在
-        os.makedirs(os.path.dirname(file_name), exist_ok=True)
+    def process_item(self, item, spider):
+        icodes = extract_icodes(to_dict(item))
+        if not icodes:
+            return item
+        if self.index is None:
+            self.index = IcodeIndex(self.path)
+        added = 0
+        for icode in icodes:
+            added += self.index.add(icode, spider.name)
+        if added and self.stats is not None:
+            self.stats.inc_value('icode_index/added', added, spider=spider)
+        if len(self.index.pending) >= self.flush_items:
+            self.index.flush()
+        return item
 
-        # 写入 JSON 文件
-        with open(file_name, 'w', encoding='utf-8') as f:
-            json.dump(self.items, f, ensure_ascii=False, indent=4)
+    def commit(self):
+        if self.index is not None:
+            self.index.flush()
 
-        # 清空列表并递增批次编号
-        self.items = []
-        self.batch_number += 1
\ No newline at end of file
+    def close_spider(self, spider):
+        if self.index is not None:
+            self.index.close()
@@ -0,0 +1,215 @@
+"""
+轻量记录类：由 items.py 中的 scrapy.Item 定义（唯一的字段 schema）生成的 __slots__ 类。
+
+每条记录只持有一个按字段顺序排列的值列表，爬虫用 from_api() 从接口 JSON 一次性批量填充，
+管道用 to_dict() 直接按字段顺序生成输出字典，省去逐字段 item[...] = data.get(...) 赋值
+以及 ItemAdapter.asdict() 的逐字段递归转换。
+记录类通过 RecordAdapter 注册到 itemadapter，Scrapy 与使用 ItemAdapter 的代码可以像普通 Item 一样处理。
+与 scrapy.Item 一样，未赋值的字段不出现在输出中，输出的字段与原来逐字段赋值时相同。
+"""
+from collections.abc import MutableMapping
+from types import MappingProxyType
+
+from itemadapter import ItemAdapter
+from itemadapter.adapter import AdapterInterface
+
+from .items import (
+    CankaoItem, CmDiffuseMediumItem, FileMetadataItem, ICodeItem, IcodeItem, IssueCodeDetailItem,
+    MetaInfoItem, PestchinaScraperItem, PestHostPartItem, PestRelationInfoItem, SpeciesBasicInfoItem,
+    SpeciesDistributionItem, SpeciesHostItem, SpeciesParentItem, YMMetaItem,
+)
+
+# 未赋值字段的占位值（与值为 None 的字段区分）
+_UNSET = object()
+
+
+class Record(MutableMapping):
+    """
+    记录基类。子类由 build_record_class() 生成，类属性：
+        item_class: 对应的 scrapy.Item 类（管道按它查找表定义、Parquet schema 等）
+        fields: 字段名元组
+        nested: (字段名, 位置, 嵌套记录类, 是否为列表) 元组
+        optional: 接口数据中没有该键时不赋值的字段；其余字段在 from_api() 中缺失时为 None
+    与 scrapy.Item 一样，未赋值的字段不在记录中：读取时抛出 KeyError，迭代与 to_dict() 时跳过。
+    """
+    __slots__ = ('_values',)
+    item_class = None
+    fields = ()
+    nested = ()
+    optional = frozenset()
+    _defaults = ()
+    _index = {}
+
+    def __init__(self, *args, **kwargs):
+        self._values = [_UNSET] * len(self.fields)
+        if args or kwargs:
+            self.update(*args, **kwargs)
+
+    @classmethod
+    def from_api(cls, data, **extra):
+        """
+        从接口返回的 JSON 对象批量填充记录，嵌套字段同时转换为对应的记录类。
+        嵌套的单个对象为空时不赋值，嵌套列表为空时为 []。
+
+        参数:
+            data (dict): 接口返回的单条数据
+            **extra: 接口数据中没有、需要额外补充的字段（如 species_id）
+        返回:
+            Record: 新记录
+        """
+        record = cls.__new__(cls)
+        values = record._values = list(map(data.get, cls.fields, cls._defaults))
+        for _, position, record_class, is_list in cls.nested:
+            value = values[position]
+            if is_list:
+                values[position] = [record_class.from_api(entry) for entry in value] if value else []
+            else:
+                values[position] = record_class.from_api(value) if value else _UNSET
+        for name, value in extra.items():
+            values[cls._index[name]] = value
+        return record
+
+    def to_dict(self):
+        """按字段顺序生成普通字典（跳过未赋值的字段），嵌套记录递归转换"""
+        result = {name: value for name, value in zip(self.fields, self._values) if value is not _UNSET}
+        for name, _, _, is_list in self.nested:
+            value = result.get(name)
+            if value is None:
+                continue
+            result[name] = [entry.to_dict() for entry in value] if is_list else value.to_dict()
+        return result
+
+    def __getitem__(self, key):
+        value = self._values[self._index[key]]
+        if value is _UNSET:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        try:
+            self._values[self._index[key]] = value
+        except KeyError:
+            raise KeyError(f'{type(self).__name__} does not support field: {key}') from None
+
+    def __delitem__(self, key):
+        position = self._index[key]
+        if self._values[position] is _UNSET:
+            raise KeyError(key)
+        self._values[position] = _UNSET
+
+    def __contains__(self, key):
+        position = self._index.get(key)
+        return position is not None and self._values[position] is not _UNSET
+
+    def __iter__(self):
+        return (name for name, value in zip(self.fields, self._values) if value is not _UNSET)
+
+    def __len__(self):
+        return len(self._values) - self._values.count(_UNSET)
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.to_dict()!r})'
+
+
+def build_record_class(item_class, nested=None, optional=()):
+    """
+    根据 scrapy.Item 类生成对应的记录类。
+
+    参数:
+        item_class: scrapy.Item 子类，字段顺序与 item_class.fields 一致
+        nested (dict): 嵌套字段名 -> (嵌套记录类, 是否为列表)
+        optional: 接口数据中没有该键时不赋值的字段（原爬虫只在键存在时才赋值的字段）
+    返回:
+        type: Record 子类，类名为 <Item 类名去掉 Item 后缀>Record
+    """
+    fields = tuple(item_class.fields)
+    index = {name: position for position, name in enumerate(fields)}
+    optional = frozenset(optional)
+    name = item_class.__name__[:-len('Item')] if item_class.__name__.endswith('Item') else item_class.__name__
+    return type(f'{name}Record', (Record,), {
+        '__slots__': (),
+        '__module__': __name__,
+        'item_class': item_class,
+        'fields': fields,
+        'nested': tuple(
+            (field, index[field], record_class, is_list)
+            for field, (record_class, is_list) in (nested or {}).items()
+        ),
+        'optional': optional,
+        '_defaults': tuple(_UNSET if field in optional else None for field in fields),
+        '_index': index,
+    })
+
+
+def item_class_of(item):
+    """返回 Item 对应的 schema 类：记录返回其 item_class，其余返回自身类型"""
+    return getattr(item, 'item_class', None) or type(item)
+
+
+def to_dict(item):
+    """把 Item 转换为普通字典：记录走 to_dict() 快速路径，其余交给 ItemAdapter"""
+    if isinstance(item, Record):
+        return item.to_dict()
+    return ItemAdapter(item).asdict()
+
+
+class RecordAdapter(AdapterInterface):
+    """让 itemadapter（以及 Scrapy）识别 Record 记录"""
+
+    @classmethod
+    def is_item(cls, item):
+        return isinstance(item, Record)
+
+    @classmethod
+    def is_item_class(cls, item_class):
+        return issubclass(item_class, Record)
+
+    @classmethod
+    def get_field_meta_from_class(cls, item_class, field_name):
+        return MappingProxyType(item_class.item_class.fields[field_name])
+
+    @classmethod
+    def get_field_names_from_class(cls, item_class):
+        return list(item_class.fields)
+
+    def field_names(self):
+        return list(self.item.fields)
+
+    def __getitem__(self, field_name):
+        return self.item[field_name]
+
+    def __setitem__(self, field_name, value):
+        self.item[field_name] = value
+
+    def __delitem__(self, field_name):
+        del self.item[field_name]
+
+    def __iter__(self):
+        return iter(self.item)
+
+    def __len__(self):
+        return len(self.item)
+
+
+if RecordAdapter not in ItemAdapter.ADAPTER_CLASSES:
+    ItemAdapter.ADAPTER_CLASSES.appendleft(RecordAdapter)
+
+
+# 嵌套记录
+ICodeRecord = build_record_class(ICodeItem)
+IcodeRecord = build_record_class(IcodeItem)
+CankaoRecord = build_record_class(CankaoItem)
+YMMetaRecord = build_record_class(YMMetaItem)
+
+# 各爬虫输出的记录
+PestchinaScraperRecord = build_record_class(PestchinaScraperItem, optional=PestchinaScraperItem.fields)
+MetaInfoRecord = build_record_class(MetaInfoItem, {'ym': (YMMetaRecord, True)})
+SpeciesDistributionRecord = build_record_class(SpeciesDistributionItem, {'Icodes': (ICodeRecord, True)})
+SpeciesBasicInfoRecord = build_record_class(SpeciesBasicInfoItem, {'cankao': (CankaoRecord, False)})
+SpeciesHostRecord = build_record_class(SpeciesHostItem, {'Icodes': (IcodeRecord, True)})
+SpeciesParentRecord = build_record_class(SpeciesParentItem)
+PestRelationInfoRecord = build_record_class(PestRelationInfoItem, {'cankao': (CankaoRecord, False)})
+PestHostPartRecord = build_record_class(PestHostPartItem, {'Icodes': (ICodeRecord, True)})
+CmDiffuseMediumRecord = build_record_class(CmDiffuseMediumItem)
+IssueCodeDetailRecord = build_record_class(IssueCodeDetailItem, optional=('species_id',))
+FileMetadataRecord = build_record_class(FileMetadataItem)
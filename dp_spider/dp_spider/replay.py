@@ -0,0 +1,180 @@
+"""
+死信重放：只重新请求 DEAD_LETTER_DIR/<爬虫名>.jsonl 中记录的失败请求，修复少量失败无需整体重爬。
+请求按原样还原（URL、表单、请求头、回调与 meta），成功的记录照常写入原有的批次目录；
+重放使用自己的重试策略（REPLAY_RETRY_TIMES 次，指数退避），并关闭断点续爬，
+否则已提交过部分分页的物种会被 ResumeMiddleware 整体跳过。
+
+开始重放时死信文件改名为 <爬虫名>.jsonl.replaying，重放中仍然失败的请求重新写入 <爬虫名>.jsonl；
+爬虫正常结束后删除 .replaying，中断时保留，下次重放一并读取。
+
+用法（在 scrapy.cfg 所在目录执行）:
+    python -m dp_spider.replay species_distribution --list
+    python -m dp_spider.replay species_distribution
+    python -m dp_spider.replay file_metadata -s REPLAY_RETRY_TIMES=10
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+from collections import Counter
+
+from scrapy.crawler import CrawlerProcess
+from scrapy.exceptions import IgnoreRequest
+from scrapy.utils.project import get_project_settings
+from twisted.internet import task
+
+from .dead_letters import DEFAULT_DEAD_LETTER_DIR, dead_letter_path, read_dead_letters, request_from_record
+
+logger = logging.getLogger(__name__)
+
+
+class BackoffRetryMiddleware:
+    """
+    重放时的重试（取代 RetryMiddleware）：超时、连接失败或返回 RETRY_HTTP_CODES 中的状态码时，
+    等待 base × 2^(N-1) 秒（±50% 抖动，不超过 max_delay）后第 N 次重试，最多 retries 次。
+    """
+
+    def __init__(self, stats, retries=5, base=1.0, max_delay=60.0, http_codes=()):
+        self.stats = stats
+        self.retries = retries
+        self.base = base
+        self.max_delay = max_delay
+        self.http_codes = set(http_codes)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(
+            crawler.stats,
+            retries=settings.getint('REPLAY_RETRY_TIMES', 5),
+            base=settings.getfloat('REPLAY_BACKOFF_BASE', 1.0),
+            max_delay=settings.getfloat('REPLAY_BACKOFF_MAX', 60.0),
+            http_codes=[int(code) for code in settings.getlist('RETRY_HTTP_CODES')],
+        )
+
+    def process_response(self, request, response, spider):
+        if response.status in self.http_codes:
+            return self._retry(request, f'HTTP {response.status}', spider) or response
+        return response
+
+    def process_exception(self, request, exception, spider):
+        if isinstance(exception, IgnoreRequest):
+            return None
+        return self._retry(request, type(exception).__name__, spider)
+
+    def _retry(self, request, reason, spider):
+        attempts = request.meta.get('replay_attempts', 0) + 1
+        if attempts > self.retries:
+            self.stats.inc_value('replay/gave_up', spider=spider)
+            logger.error(f'重放 {request.url} 失败 {self.retries} 次，放弃（{reason}）')
+            return None
+        retry = request.replace(dont_filter=True)
+        retry.meta['replay_attempts'] = attempts
+        delay = min(self.max_delay, self.base * 2 ** (attempts - 1)) * random.uniform(0.5, 1.5)
+        self.stats.inc_value('replay/retries', spider=spider)
+        from twisted.internet import reactor
+
+        return task.deferLater(reactor, delay, lambda: retry)
+
+
+def load_entries(paths):
+    """读取死信并按请求（方法、URL、请求体）去重，同一请求保留最后一条"""
+    entries = {}
+    for path in paths:
+        for entry in read_dead_letters(path):
+            request = entry['request']
+            entries[(request['method'], request['url'], request['body'])] = entry
+    return list(entries.values())
+
+
+def replaying(spidercls, entries):
+    """起始请求改为死信中的请求的爬虫子类"""
+    def start_requests(self):
+        for entry in entries:
+            yield request_from_record(entry['request'], self)
+
+    return type(spidercls.__name__, (spidercls,), {
+        '__module__': spidercls.__module__,
+        'start_requests': start_requests,
+    })
+
+
+def replay_settings(settings):
+    """重放用的配置：换用 BackoffRetryMiddleware，关闭断点续爬与检查点"""
+    settings.set('RETRY_ENABLED', False, priority='cmdline')
+    settings.set('CHECKPOINT_ENABLED', False, priority='cmdline')
+    settings.set('SPIDER_MIDDLEWARES', {
+        **settings.getdict('SPIDER_MIDDLEWARES'),
+        'dp_spider.middlewares.ResumeMiddleware': None,
+    }, priority='cmdline')
+    settings.set('DOWNLOADER_MIDDLEWARES', {
+        **settings.getdict('DOWNLOADER_MIDDLEWARES'),
+        # 位于 DeadLetterMiddleware(540) 之内，退避重试用尽后才写入死信
+        'dp_spider.replay.BackoffRetryMiddleware': 545,
+    }, priority='cmdline')
+    return settings
+
+
+def summarize(entries):
+    """按接口与错误类型统计死信条数"""
+    return Counter((entry['endpoint'], entry['error']) for entry in entries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('spider', help='爬虫名称')
+    parser.add_argument('--list', action='store_true', help='只列出死信统计，不重放')
+    parser.add_argument('-s', dest='settings_args', action='append', default=[], metavar='NAME=VALUE',
+                        help='覆盖配置')
+    args = parser.parse_args()
+
+    settings = get_project_settings()
+    for value in args.settings_args:
+        name, _, setting = value.partition('=')
+        settings.set(name, setting, priority='cmdline')
+    path = dead_letter_path(settings.get('DEAD_LETTER_DIR', DEFAULT_DEAD_LETTER_DIR), args.spider)
+    replaying_path = f'{path}.replaying'
+
+    if args.list:
+        entries = load_entries([replaying_path, path])
+        for (endpoint, error), count in sorted(summarize(entries).items()):
+            print(f'{count:>8}  {endpoint}  {error}')
+        print(f'{len(entries):>8}  合计')
+        return
+
+    if os.path.exists(path):
+        if os.path.exists(replaying_path):
+            # 上次重放被中断：把新的死信追加到未完成的重放文件中
+            with open(path, encoding='utf-8') as src, open(replaying_path, 'a', encoding='utf-8') as dst:
+                dst.write(src.read())
+            os.remove(path)
+        else:
+            os.replace(path, replaying_path)
+    entries = load_entries([replaying_path])
+    if not entries:
+        if os.path.exists(replaying_path):
+            os.remove(replaying_path)
+        print(f'{args.spider} 没有需要重放的请求')
+        return
+
+    process = CrawlerProcess(replay_settings(settings))
+    spidercls = replaying(process.spider_loader.load(args.spider), entries)
+    crawler = process.create_crawler(spidercls)
+    process.crawl(crawler)
+    print(f'重放 {len(entries)} 个请求（{args.spider}）')
+    process.start()
+
+    reason = crawler.stats.get_value('finish_reason')
+    remaining = sum(1 for _ in read_dead_letters(path))
+    if reason != 'finished':
+        print(f'重放未正常结束（{reason}），保留 {replaying_path}，再次运行即可继续')
+        sys.exit(1)
+    os.remove(replaying_path)
+    print(f'重放完成，{remaining} 个请求仍然失败' + (f'（见 {path}）' if remaining else ''))
+    if remaining:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
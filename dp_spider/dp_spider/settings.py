@@ -47,25 +47,163 @@ CONCURRENT_REQUESTS_PER_DOMAIN = 200
 
 # Enable or disable spider middlewares
 # See https://docs.scrapy.org/en/latest/topics/spider-middleware.html
-# SPIDER_MIDDLEWARES = {
-#    "dp_spider.middlewares.DpSpiderSpiderMiddleware": 543,
-# }
+SPIDER_MIDDLEWARES = {
+    "dp_spider.middlewares.ResumeMiddleware": 50,  # 跳过已提交到批次日志的起始请求
+    # 须位于 HttpErrorMiddleware(50) 与 ChangeDetectionMiddleware 之间：错误响应不计为完成，被丢弃的未变记录不计入
+    "dp_spider.middlewares.CheckpointMiddleware": 55,  # 按检查点位图跳过已完成的物种
+    "dp_spider.middlewares.ChangeDetectionMiddleware": 60,  # 丢弃内容未变化的记录，输出变更集
+}
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
 DOWNLOADER_MIDDLEWARES = {
+    "dp_spider.middlewares.DeadLetterMiddleware": 540,  # 重试用尽后仍失败的请求写入死信文件
     "dp_spider.middlewares.InsecureRequestsMiddleware": 543,
+    # 须位于 RetryMiddleware(550) 之后：process_exception 按优先级从高到低调用，先于重试看到超时
+    "dp_spider.middlewares.PageSizeMiddleware": 555,  # 按接口自适应选择分页大小
+    # 须位于 RetryMiddleware(550) 与 HttpCompressionMiddleware(590) 之间：在重试之前看到 5xx 与超时，且响应体已解压
+    "dp_spider.middlewares.AdaptiveConcurrencyMiddleware": 580,  # 按接口 AIMD 调整并发上限
 }
 
+# 按这些状态码重试（与 Scrapy 默认值相同，HTTP 缓存与死信同样引用）
+RETRY_HTTP_CODES = [500, 502, 503, 504, 522, 524, 408, 429]
+
+# 死信（DeadLetterMiddleware）：最终失败的请求追加到 DEAD_LETTER_DIR/<爬虫名>.jsonl，
+# 用 python -m dp_spider.replay <爬虫名> 只重新请求这些请求；重放时按以下次数与指数退避重试
+DEAD_LETTER_ENABLED = True
+DEAD_LETTER_DIR = "data/dead_letters"
+REPLAY_RETRY_TIMES = 5
+# 第 N 次重试前等待 REPLAY_BACKOFF_BASE × 2^(N-1) 秒（±50% 抖动），最多 REPLAY_BACKOFF_MAX 秒
+REPLAY_BACKOFF_BASE = 1.0
+REPLAY_BACKOFF_MAX = 60.0
+
+# 按接口自适应并发（AdaptiveConcurrencyMiddleware）：每个接口一个下载槽，按延迟与失败率做加性增 / 乘性减。
+# CONCURRENT_REQUESTS 仍是全局上限，CONCURRENT_REQUESTS_PER_DOMAIN 不再起作用。
+# 默认关闭；开启时同时设置 AUTOTHROTTLE_ENABLED=False，两者同时开启会互相干扰
+ADAPTIVE_CONCURRENCY_ENABLED = False
+# 每个接口的初始并发上限
+ADAPTIVE_CONCURRENCY_START = 16
+# 并发上限的下限与上限，上限为 0 时取 CONCURRENT_REQUESTS_PER_DOMAIN
+ADAPTIVE_CONCURRENCY_MIN = 1
+ADAPTIVE_CONCURRENCY_MAX = 0
+# 加性增的步长与乘性减的系数
+ADAPTIVE_CONCURRENCY_STEP = 4
+ADAPTIVE_CONCURRENCY_BACKOFF = 0.5
+# 超时、连接错误、5xx 与空响应合计的失败率超过该值时降低并发
+ADAPTIVE_CONCURRENCY_ERROR_RATE = 0.02
+# 出现排队（p50 超过基线的 LATENCY_FACTOR 倍）且 p90 延迟超过该值（秒）时降低并发，0 表示取 DOWNLOAD_TIMEOUT 的 1/4
+ADAPTIVE_CONCURRENCY_TARGET_LATENCY = 0
+# p50 延迟超过无拥塞基线的该倍数时停止增长
+ADAPTIVE_CONCURRENCY_LATENCY_FACTOR = 2.0
+# 每个决策周期至少需要的样本数
+ADAPTIVE_CONCURRENCY_MIN_SAMPLES = 20
+# 决策周期（秒）
+ADAPTIVE_CONCURRENCY_INTERVAL = 5
+
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
-# EXTENSIONS = {
-#    "scrapy.extensions.telnet.TelnetConsole": None,
-# }
+EXTENSIONS = {
+    # "scrapy.extensions.telnet.TelnetConsole": None,
+    "dp_spider.extensions.MemoryBudget": 500,  # 按字节预算暂停 / 恢复调度
+    "dp_spider.extensions.CrawlMetrics": 510,  # 按接口统计速率、状态码与延迟，定期输出进度
+}
+
+# 爬取指标（CrawlMetrics）：每隔 METRICS_INTERVAL 秒把按接口统计的指标写到 METRICS_DIR/<爬虫名>.prom 或 .json，
+# 并打印一行进度（LOG_LEVEL 为 ERROR 时也可见）
+METRICS_ENABLED = True
+METRICS_DIR = "data/metrics"
+# prometheus（node_exporter textfile collector 格式）或 json
+METRICS_FORMAT = "prometheus"
+METRICS_INTERVAL = 10
+# 是否打印进度行
+METRICS_PROGRESS = True
+
+# 物种 ID 来源（SpeciesIdSource），爬虫参数 -a shard=i/n -a offset=N 优先于以下配置
+# 物种 ID 文件目录，留空时使用 data/species_id（data/data_parse.py 的输出）
+SPECIES_ID_DIR = ""
+# 分片：i/n 表示只爬取全局序号 % n == i 的物种，多个进程各取一片；留空表示不分片
+SPECIES_ID_SHARD = ""
+# 从第 N 个物种（全局序号）开始，用于从中断处继续
+SPECIES_ID_OFFSET = 0
+
+# 分布式调度（FrontierScheduler）：请求、去重指纹与物种 ID 放入共享队列，多个进程 / 主机共同消费。
+# FRONTIER_BACKEND 留空时使用 Scrapy 默认调度器；可选 memory://名称、sqlite:///路径（单机多进程）、
+# redis://host:6379/0（多机，需要安装 redis）。分布式模式下不使用检查点，进度保存在队列中
+SCHEDULER = "dp_spider.frontier.FrontierScheduler"
+FRONTIER_BACKEND = ""
+# 队列键前缀，实际键为 <前缀>:<爬虫名>:requests / seen / species / flags
+FRONTIER_PREFIX = "dp_spider"
+# 启动前清空该爬虫的队列与去重集合（重新开始一轮分布式爬取时使用）
+FRONTIER_RESET = False
+# 队列为空后继续等待其他进程扇出新请求的秒数
+FRONTIER_IDLE_TIMEOUT = 10
+# 后端读写在单独的线程中进行：每隔 FRONTIER_POLL_INTERVAL 秒推送本地缓冲的请求，并预取至多 FRONTIER_PREFETCH 个请求
+FRONTIER_PREFETCH = 100
+FRONTIER_POLL_INTERVAL = 0.1
+
+# 编排器（python -m dp_spider.orchestrator）：下游阶段调度器中待处理的请求少于 CONCURRENT_REQUESTS 时，
+# 每次从数据流取出至多 ORCHESTRATOR_FEED_BATCH 个值生成请求；检查间隔为 ORCHESTRATOR_FEED_INTERVAL 秒
+ORCHESTRATOR_FEED_BATCH = 100
+ORCHESTRATOR_FEED_INTERVAL = 0.5
+
+# 爬取检查点（CheckpointMiddleware）：每个爬虫一个位图，按物种序号记录已完成的物种，重启时直接跳过。
+# 物种 ID 文件变化后旧检查点自动作废；需要重新全量爬取时删除 CHECKPOINT_DIR 下对应爬虫的文件。
+# 默认关闭，每次运行都是完整爬取；需要中断后续爬时与批次日志一起开启：
+#     scrapy crawl species_distribution -s CHECKPOINT_ENABLED=True -s BATCH_JOURNAL_ENABLED=True
+# 之后以同样的参数重新运行即跳过已完成的物种（多进程启动器的工作进程总是开启两者）
+CHECKPOINT_ENABLED = False
+CHECKPOINT_DIR = "data/checkpoints"
+# 写检查点的间隔（秒），写入前会让管道结束当前分片
+CHECKPOINT_FLUSH_INTERVAL = 60
+
+# 增量模式（也可用爬虫参数 -a incremental=1 开启）：pests_spider 只翻到上次的 TP_MODIFIED 高水位，
+# 把变化的物种 ID 写到 SPECIES_ID_DELTA_DIR；下游爬虫只读取这些物种。
+# 只比较物种列表的 TP_MODIFIED，只改了详情（分布、寄主等）的物种不会被发现，需要定期全量运行兜底
+INCREMENTAL_ENABLED = False
+# 高水位保存位置
+INCREMENTAL_STATE_PATH = "data/incremental_state.json"
+# 变化物种 ID 目录，留空表示 data/species_id_delta
+SPECIES_ID_DELTA_DIR = ""
+
+# 变化检测（ChangeDetectionMiddleware）：内容指纹未变的记录不再进入管道，
+# 新增 / 修改 / 删除写入 CHANGE_SET_DIR/<爬虫名>_<运行编号>.jsonl。
+# 开启后批次文件只包含变化的记录，首次开启前请确认已有一份全量数据
+CHANGE_DETECTION_ENABLED = False
+# 指纹库位置
+FINGERPRINT_STORE_PATH = "data/fingerprints.sqlite3"
+# 每登记多少条记录提交一次指纹库的暂存表
+FINGERPRINT_COMMIT_ITEMS = 10000
+# 变更集目录
+CHANGE_SET_DIR = "data/changes"
+
+# 全局内存预算（MemoryBudget 扩展）
+MEMORY_BUDGET_ENABLED = True
+# 管道缓冲、待解析响应与在途下载合计的字节预算。统计的是数据本身的字节数，
+# Python 对象的实际内存约为其 3~5 倍，4GB 的机器建议不超过 512
+MEMORY_BUDGET_MB = 512
+# 回落到预算的该比例以下时恢复调度
+MEMORY_BUDGET_RESUME_RATIO = 0.8
+# 检查间隔（秒）
+MEMORY_BUDGET_CHECK_INTERVAL = 0.5
+
+# 按接口自适应分页大小（PageSizeMiddleware）
+PAGE_SIZE_ENABLED = True
+# 学习结果保存位置，下次运行直接沿用
+PAGE_SIZE_STATE_PATH = "data/page_sizes.json"
+# 单页目标耗时（秒），0 表示取 DOWNLOAD_TIMEOUT 的 1/4
+PAGE_SIZE_TARGET_SECONDS = 0
+# 单页响应体上限（字节）
+PAGE_SIZE_MAX_BYTES = 16 * 1024 * 1024
+# 页大小的上下限
+PAGE_SIZE_MIN = 10
+PAGE_SIZE_MAX = 5000
+# 服务器单页上限的有效期（秒），过期后重新按拟合结果选择页大小
+PAGE_SIZE_CAP_TTL = 86400
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 ITEM_PIPELINES = {
+    "dp_spider.pipelines.IcodeIndexPipeline": 200,  # 增量维护文献 icode 索引，供 issue_code_detail / file_metadata 使用
     # "dp_spider.pipelines.JsonBatchPipeline": 300, # 请求所有物种列表
     # "dp_spider.pipelines.MetaInfoJsonBatchPipeline": 300,  # 请求物种元信息
     # "dp_spider.pipelines.SpeciesDistributionPipeline": 300,  # 请求物种分布信息
@@ -77,8 +215,54 @@ ITEM_PIPELINES = {
     # 'dp_spider.pipelines.CmDiffuseMediumPipeline': 300,
     # 'dp_spider.pipelines.IssueCodeDetailPipeline': 300,
     'dp_spider.pipelines.FilePipeline': 300,
+    # 'dp_spider.pipelines.ParquetPipeline': 400,  # Parquet 列式输出（需安装 pyarrow）
+    # 'dp_spider.pipelines.SqlitePipeline': 500,  # 直接写入规范化的 SQLite 表，免去 data_cleaning 步骤
 }
 
+# 批次文件输出配置（所有 StreamingBatchPipeline 子类共用）
+# 文件格式：json（默认，流式写出的 JSON 数组，文件名与原来的 *_batch_N.json 一致）
+# 或 jsonl（每行一条紧凑 JSON，文件名为 *_batch_N.jsonl，下游读取方需支持后才可开启）
+BATCH_FORMAT = "json"
+# 每个批次文件的最大记录数，0 表示使用各管道的默认值
+BATCH_MAX_ITEMS = 0
+# 每个批次文件的最大字节数，0 表示不按字节滚动
+BATCH_MAX_BYTES = 64 * 1024 * 1024
+# 写入模式：sync（默认）在 reactor 线程同步写入；thread 将整批交给后台写线程，序列化与磁盘 I/O 不阻塞爬取，
+# 大批量爬取时可用 -s BATCH_WRITE_MODE=thread 开启
+BATCH_WRITE_MODE = "sync"
+# thread 模式下每次投递给写线程的记录数
+BATCH_FLUSH_ITEMS = 500
+# thread 模式下允许排队等待写入的批次数，超过后暂停处理新的 Item（反压）
+BATCH_WRITE_QUEUE = 4
+# 分片先写入 .part 文件，fsync 后原子重命名，并把数据已完整落盘的物种 / 文献写入 <前缀>.journal；
+# 重启后只重新请求其余的数据。是否完整由 CheckpointMiddleware 判定，需同时开启 CHECKPOINT_ENABLED（见上文的用法）。
+# 默认关闭；删除对应的 .journal 文件即可重新全量爬取
+BATCH_JOURNAL_ENABLED = False
+# 批次文件输出根目录，不为空时各管道写入 <根目录>/<输出目录>；
+# 多进程启动器（python -m dp_spider.launcher <爬虫名> -k K）为每个工作进程单独指定，结束后合并回 data/
+BATCH_OUTPUT_ROOT = ""
+
+# Parquet 列式输出配置（ParquetPipeline）
+# 每个 row group 的记录数
+PARQUET_ROW_GROUP_SIZE = 10000
+# 每个文件的最大行数，写满后滚动到下一个编号，0 表示不限制。
+# 检查点每次提交（每 CHECKPOINT_FLUSH_INTERVAL 秒）同样会结束当前文件，开启检查点时文件会小得多
+PARQUET_MAX_ROWS = 1000000
+# 压缩算法：zstd / snappy / gzip / none
+PARQUET_COMPRESSION = "zstd"
+
+# SQLite 直写配置（SqlitePipeline）
+# 数据库文件路径
+SQLITE_PATH = "data/dp_spider.sqlite3"
+# 每个事务批量写入的行数（主表行与子表行合计）
+SQLITE_BATCH_SIZE = 1000
+
+# 文献 icode 索引配置（IcodeIndexPipeline）
+# 索引文件路径，issue_code_detail / file_metadata 爬虫优先从这里读取 icode
+ICODE_INDEX_PATH = "data/icode_index.sqlite3"
+# 每新增多少个 icode 写一次数据库
+ICODE_INDEX_FLUSH_ITEMS = 1000
+
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
 AUTOTHROTTLE_ENABLED = True
@@ -94,11 +278,18 @@ AUTOTHROTTLE_ENABLED = True
 
 # Enable and configure HTTP caching (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html#httpcache-middleware-settings
+# 开发或修复解析 / 管道后重跑时用 -s HTTPCACHE_ENABLED=1 开启，命中的请求不访问网络
 # HTTPCACHE_ENABLED = True
-# HTTPCACHE_EXPIRATION_SECS = 0
+HTTPCACHE_EXPIRATION_SECS = 7 * 24 * 3600  # 缓存有效期（秒），0 为永不过期
 # HTTPCACHE_DIR = "httpcache"
-# HTTPCACHE_IGNORE_HTTP_CODES = []
-# HTTPCACHE_STORAGE = "scrapy.extensions.httpcache.FilesystemCacheStorage"
+# 需要重试的状态码不缓存，否则重试拿到的仍是缓存中的错误响应（空响应体同样不缓存，见 SqliteCacheStorage）
+HTTPCACHE_IGNORE_HTTP_CODES = RETRY_HTTP_CODES
+# 单文件 SQLite 存储，主键包含规范化的表单体，POST 列表接口同样可以命中
+HTTPCACHE_STORAGE = "dp_spider.httpcache.SqliteCacheStorage"
+# 默认的 RFC2616Policy 不缓存 POST，这里缓存所有响应
+HTTPCACHE_POLICY = "scrapy.extensions.httpcache.DummyPolicy"
+# 每个爬虫的缓存文件压缩后的大小上限（MB），超出时按最近访问时间淘汰
+HTTPCACHE_MAX_MB = 2048
 
 # Set settings whose default value is deprecated to a future-proof value
 TWISTED_REACTOR = "twisted.internet.asyncioreactor.AsyncioSelectorReactor"
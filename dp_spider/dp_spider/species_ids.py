@@ -0,0 +1,106 @@
+import os
+import re
+
+from .checkpoint import source_digest
+from .incremental import delta_dir, incremental_enabled
+from .storage import iter_batch_records
+
+# data/data_parse.py 输出的物种 ID 目录（相对于项目根目录）
+DEFAULT_SPECIES_ID_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'species_id')
+
+SPECIES_ID_FILE_PATTERN = re.compile(r'^species_ids_(\d+)\.jsonl?$')
+
+
+def parse_shard(shard):
+    """
+    解析分片参数 "i/n"（0 <= i < n），None 或空字符串表示不分片。
+
+    返回:
+        tuple: (i, n)
+    """
+    if not shard:
+        return 0, 1
+    try:
+        index, count = (int(part) for part in str(shard).split('/'))
+    except ValueError:
+        raise ValueError(f'分片参数格式应为 i/n，实际为: {shard}') from None
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f'分片参数超出范围: {shard}')
+    return index, count
+
+
+class SpeciesIdSource:
+    """
+    物种 ID 来源：按文件编号顺序逐个读取 data/species_id/species_ids_<N>.json(l)，惰性地产出物种 ID，
+    第一个请求无需等待全部 ID 加载完毕。
+    shard="i/n" 时只产出全局序号 % n == i 的 ID，多个爬虫进程各取一片；
+    offset 为全局序号的起点，用于从上次中断的位置继续。
+    setting 为指定 directory 的配置项名称，目录不存在时写入错误信息。
+    """
+
+    def __init__(self, directory=DEFAULT_SPECIES_ID_DIR, shard=None, offset=0, checkpoint=None, frontier=None,
+                 setting='SPECIES_ID_DIR'):
+        self.directory = directory
+        self.setting = setting
+        self.shard_index, self.shard_count = parse_shard(shard)
+        self.offset = int(offset or 0)
+        self.checkpoint = checkpoint  # CrawlCheckpoint，为 None 时不跳过已完成的物种
+        self.frontier = frontier  # FrontierScheduler，不为 None 时从分布式队列领取物种 ID
+
+    @classmethod
+    def from_spider(cls, spider):
+        """
+        按爬虫参数（-a shard=0/4 -a offset=10000）或配置
+        SPECIES_ID_DIR / SPECIES_ID_SHARD / SPECIES_ID_OFFSET 创建，爬虫参数优先。
+        增量模式（-a incremental=1）下改为读取 pests_spider 写出的变化物种 ID（SPECIES_ID_DELTA_DIR）。
+        启用 CheckpointMiddleware 时跳过检查点中已完成的物种；配置了 FRONTIER_BACKEND 时从分布式队列领取。
+        """
+        settings = spider.settings
+        if incremental_enabled(spider):
+            directory, setting = delta_dir(settings), 'SPECIES_ID_DELTA_DIR'
+        else:
+            directory, setting = settings.get('SPECIES_ID_DIR') or DEFAULT_SPECIES_ID_DIR, 'SPECIES_ID_DIR'
+        return cls(
+            directory=directory,
+            shard=getattr(spider, 'shard', None) or settings.get('SPECIES_ID_SHARD'),
+            offset=getattr(spider, 'offset', None) or settings.getint('SPECIES_ID_OFFSET'),
+            checkpoint=getattr(spider, 'checkpoint', None),
+            frontier=getattr(spider, 'frontier', None),
+            setting=setting,
+        )
+
+    def files(self):
+        """按文件编号排序的物种 ID 文件列表"""
+        if not os.path.isdir(self.directory):
+            if self.setting == 'SPECIES_ID_DELTA_DIR':
+                hint = '增量模式需要先运行 scrapy crawl pests_spider -a incremental=1 写出变化物种 ID'
+            else:
+                hint = '请先运行 data/data_parse.py 生成物种 ID 文件'
+            raise FileNotFoundError(f'物种 ID 目录不存在: {self.directory}（{hint}，或通过 {self.setting} 指定目录）')
+        numbered = []
+        for filename in os.listdir(self.directory):
+            match = SPECIES_ID_FILE_PATTERN.match(filename)
+            if match:
+                numbered.append((int(match.group(1)), os.path.join(self.directory, filename)))
+        return [path for _, path in sorted(numbered)]
+
+    def __iter__(self):
+        if self.frontier is not None:
+            return self.frontier.species_ids(self._local_ids())
+        return self._local_ids()
+
+    def _local_ids(self):
+        files = self.files()
+        checkpoint = self.checkpoint
+        if checkpoint is not None:
+            checkpoint.bind(source_digest(files))
+        position = 0
+        for path in files:
+            for species_id in iter_batch_records(path):
+                if position >= self.offset and position % self.shard_count == self.shard_index:
+                    if checkpoint is None:
+                        yield species_id
+                    elif position not in checkpoint:
+                        checkpoint.track(species_id, position)
+                        yield species_id
+                position += 1
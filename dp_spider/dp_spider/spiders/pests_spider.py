@@ -1,81 +1,64 @@
 import json
 
-import scrapy
 from scrapy.spiders import CrawlSpider
 
-from ..items import PestchinaScraperItem
+from ..dead_letters import record_dead_letter
+from ..incremental import IncrementalListCrawl, incremental_enabled
+from ..jsonio import response_json
+from ..page_size import plan_page_size, record_page
+from ..pagination import fan_out_pages
+from ..records import PestchinaScraperRecord
+from ..webapi import SPECIES_LIST
 
 
 class PestsSpiderSpider(CrawlSpider):
     name = "pests_spider"
     allowed_domains = ['www.pestchina.com']
-    start_url = 'http://www.pestchina.com/webapi/nb/SpeciesCode/list'
-
-    custom_headers = {
-        'Accept': '*/*',
-        'Accept-Language': 'en,zh-CN;q=0.9,zh;q=0.8,en-US;q=0.7',
-        'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
-        'Origin': 'http://www.pestchina.com',
-        'Referer': 'http://www.pestchina.com/',
-        'X-Requested-With': 'XMLHttpRequest'
-    }
+    endpoint = SPECIES_LIST
+    default_pagecount = 5000  # 页大小初始值，启用 PageSizeMiddleware 后按接口自适应调整
+    delta = None  # 增量模式下的 IncrementalListCrawl
 
     # rules = (Rule(LinkExtractor(allow=r"Items/"), callback="parse_item", follow=True),)
 
     def start_requests(self):
-        form_data = {
-            'key': '',
-            'wzType': '有害生物',
-            'filterType': '包含',
-            'orderBy': 'TP_MODIFIED desc ,TP_CREATED desc',
-            'paging[pagecount]': '5000',  # 每次请求的条数
-            'paging[pagenum]': '1',
-            'paging[totalpage]': '0'
-        }
-        yield scrapy.FormRequest(
-            url=self.start_url,
-            formdata=form_data,
-            headers=self.custom_headers,
-            meta={'dont_verify_ssl': True},
-            callback=self.parse
-        )
+        # 增量模式（-a incremental=1）：列表按 TP_MODIFIED 倒序，翻到高水位之前的记录即停止
+        self.delta = IncrementalListCrawl.from_spider(self, self.endpoint.url) if incremental_enabled(self) else None
+        yield self.build_request(1, pagecount=plan_page_size(self, self.endpoint.url, self.default_pagecount))
+
+    def build_request(self, pagenum, totalpage=None, pagecount=None):
+        return self.endpoint.request(self.parse, pagenum=pagenum, pagecount=pagecount or self.default_pagecount,
+                                     totalpage=totalpage)
 
     def parse(self, response):
         try:
-            data = json.loads(response.text)
-            content = data.get('content', [])
-            paging = data.get('paging', {})
+            data = response_json(response)
+            content = self.endpoint.results(data)
 
             # Process items
             for item_data in content:
-                item = PestchinaScraperItem()
-                for field in item_data:
-                    if field in item.fields:
-                        item[field] = item_data.get(field)
-                yield item
+                if self.delta is None or self.delta.accept(item_data):
+                    yield PestchinaScraperRecord.from_api(item_data)
 
-            # Handle pagination
-            current_page = int(paging.get('pagenum', 1))
-            total_page = int(paging.get('totalpage', 0))
+            total_page = self.endpoint.total_pages(data)
+            record_page(self, self.endpoint.url, response, len(content), total_page)
+            pagecount = response.meta['pagecount']
+            pagenum = response.meta['pagenum']
+            if self.delta is not None and self.delta.mark is not None:
+                # 增量模式逐页翻页，直到遇到早于高水位的记录
+                if not self.delta.exhausted and pagenum < total_page:
+                    yield self.build_request(pagenum + 1, total_page, pagecount)
+                return
 
-            if current_page < total_page:
-                next_page = current_page
-                form_data = {
-                    'key': '',
-                    'wzType': '有害生物',
-                    'filterType': '包含',
-                    'orderBy': 'TP_MODIFIED desc ,TP_CREATED desc',
-                    'paging[pagecount]': '5000',
-                    'paging[pagenum]': str(next_page),
-                    'paging[totalpage]': str(total_page)
-                }
-                yield scrapy.FormRequest(
-                    url=self.start_url,
-                    formdata=form_data,
-                    headers=self.custom_headers,
-                    meta={'dont_verify_ssl': True},
-                    callback=self.parse
-                )
+            # Handle pagination: fan out all remaining pages once page 1 reports totalpage
+            yield from fan_out_pages(
+                self, self.endpoint.url, None, pagenum, total_page,
+                lambda pagenum: self.build_request(pagenum, total_page, pagecount)
+            )
 
-        except json.JSONDecodeError:
+        except json.JSONDecodeError as e:
             self.logger.error('JSON解析失败: %s', response.body)
+            record_dead_letter(self, response.request, 'JSONDecodeError', e)
+
+    def closed(self, reason):
+        if self.delta is not None:
+            self.delta.close(reason, self.crawler.stats.get_stats())
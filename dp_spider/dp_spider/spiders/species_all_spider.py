@@ -0,0 +1,108 @@
+import scrapy
+from itemadapter import is_item
+from scrapy.utils.misc import arg_to_iter
+
+from ..pipelines import (
+    CmDiffuseMediumPipeline, MetaInfoJsonBatchPipeline, PestHostPartPipeline, PestRelationPipeline,
+    SpeciesBasicInfoPipeline, SpeciesDistributionPipeline, SpeciesHostPipeline,
+)
+from ..species_ids import SpeciesIdSource
+from .cm_diffuse_medium_spider import CmDiffuseMediumSpider
+from .meta_info_spider import MetaInfoSpiderSpider
+from .pest_host_part_spider import PestHostPartSpider
+from .pest_realtioninfo_spider import PestRelationSpider
+from .species_basicinfo_spider import SpeciesBasicInfoSpider
+from .species_distribution_spider import SpeciesDistributionSpider
+from .species_host_spider import SpeciesHostSpider
+
+# 组合的接口：名称 -> (单接口爬虫, 写入其记录的管道)
+COMPONENTS = {
+    'meta_info': (MetaInfoSpiderSpider, MetaInfoJsonBatchPipeline),
+    'basicinfo': (SpeciesBasicInfoSpider, SpeciesBasicInfoPipeline),
+    'distribution': (SpeciesDistributionSpider, SpeciesDistributionPipeline),
+    'host': (SpeciesHostSpider, SpeciesHostPipeline),
+    'host_part': (PestHostPartSpider, PestHostPartPipeline),
+    'relation': (PestRelationSpider, PestRelationPipeline),
+    'cm_diffuse_medium': (CmDiffuseMediumSpider, CmDiffuseMediumPipeline),
+}
+
+
+class SpeciesAllSpider(scrapy.Spider):
+    """
+    按物种组合的爬虫：只读一遍物种 ID，每个物种一次性发起各接口（元信息、基本信息、分布、寄主、寄主部位、
+    关联信息、扩散媒介）的请求，共用一个连接池、一套检查点与页大小学习结果，省去七次启动与七遍 ID 读取。
+    请求的构造与解析仍由各单接口爬虫完成（见 species_requests()），记录按类型分别写入原有的批次目录。
+
+    -a endpoints=basicinfo,host 只爬取部分接口，名称见 COMPONENTS。
+    断点续爬按接口分别比对各数据集的批次日志；检查点在一个物种的所有接口都完成后才标记该物种。
+    """
+    name = 'species_all'
+    allowed_domains = ['www.pestchina.com']
+    shardable = True  # 支持 -a shard=i/n，可由 launcher 按分片多进程运行
+    custom_settings = {
+        'ITEM_PIPELINES': {
+            'dp_spider.pipelines.IcodeIndexPipeline': 200,
+            **{f'{pipeline.__module__}.{pipeline.__name__}': 300 for _, pipeline in COMPONENTS.values()},
+        }
+    }
+
+    def __init__(self, endpoints=None, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        names = [name.strip() for name in endpoints.split(',') if name.strip()] if endpoints else list(COMPONENTS)
+        unknown = [name for name in names if name not in COMPONENTS]
+        if unknown:
+            raise ValueError(f'未知的接口: {", ".join(unknown)}，可选: {", ".join(COMPONENTS)}')
+        self.endpoint_names = names
+        if names != list(COMPONENTS):
+            # 只爬部分接口时单独记录检查点，不能让完整运行跳过其他接口尚未爬取的物种
+            self.checkpoint_name = f'{self.name}-{"+".join(sorted(names))}'
+        self.components = {}  # 接口名称 -> 单接口爬虫实例
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        for name in spider.endpoint_names:
+            component = COMPONENTS[name][0]()
+            # 单接口爬虫只借用配置与统计，不单独注册信号
+            component.crawler = crawler
+            component.settings = crawler.settings
+            spider.components[name] = component
+        return spider
+
+    def start_requests(self):
+        for species_id in SpeciesIdSource.from_spider(self):
+            yield from self.species_requests(species_id)
+
+    def species_requests(self, species_id):
+        """单个物种在各接口的起始请求"""
+        # PageSizeMiddleware 在 spider_opened 时才把规划器挂到本爬虫上，单接口爬虫共用同一个
+        page_sizes = getattr(self, 'page_sizes', None)
+        for name, component in self.components.items():
+            component.page_sizes = page_sizes
+            for request in component.species_requests(species_id):
+                yield self.adopt(name, request)
+
+    def adopt(self, name, request):
+        """把单接口爬虫构造的请求改由本爬虫回调（请求需要能序列化到分布式队列），原回调名记在 meta 中"""
+        request.meta['component'] = name
+        request.meta['component_callback'] = request.callback.__name__ if request.callback else 'parse'
+        request.meta['resume_dataset'] = COMPONENTS[name][1].file_prefix
+        request.callback = self.dispatch
+        if request.errback is not None:
+            request.meta['component_errback'] = request.errback.__name__
+            request.errback = self.dispatch_error
+        return request
+
+    def dispatch(self, response):
+        """交给对应接口的原回调解析，其产出的后续分页请求同样改由本爬虫回调"""
+        name = response.meta['component']
+        result = getattr(self.components[name], response.meta['component_callback'])(response)
+        for output in [result] if is_item(result) else arg_to_iter(result):
+            yield self.adopt(name, output) if isinstance(output, scrapy.Request) else output
+
+    def dispatch_error(self, failure):
+        meta = failure.request.meta
+        name = meta['component']
+        result = getattr(self.components[name], meta['component_errback'])(failure)
+        for output in [result] if is_item(result) else arg_to_iter(result):
+            yield self.adopt(name, output) if isinstance(output, scrapy.Request) else output
@@ -1,132 +1,57 @@
-from itertools import count
-
-import scrapy
 import json
-import os
-from ..items import SpeciesBasicInfoItem, CankaoItem
+import scrapy
+from ..dead_letters import record_dead_letter
+from ..jsonio import response_json
+from ..page_size import plan_page_size, record_page
+from ..pagination import fan_out_pages
+from ..records import SpeciesBasicInfoRecord
+from ..species_ids import SpeciesIdSource
+from ..webapi import SPECIES_BASIC_INFO
 
 
 class SpeciesBasicInfoSpider(scrapy.Spider):
     name = 'species_basicinfo'
     allowed_domains = ['www.pestchina.com']
-    start_url = 'http://www.pestchina.com/webapi/nb/SpeciesBasicInfo/list'
-    count = 0
+    shardable = True  # 支持 -a shard=i/n，可由 launcher 按分片多进程运行
+    endpoint = SPECIES_BASIC_INFO
+    default_pagecount = 200  # 页大小初始值，启用 PageSizeMiddleware 后按接口自适应调整
 
     def start_requests(self):
-        """读取species_id文件夹下的所有JSON文件并发起请求"""
-        species_id_dir = 'data/species_id'  # 物种ID文件夹路径
-        species_ids = []
+        """逐个读取物种ID并发起请求"""
+        for species_id in SpeciesIdSource.from_spider(self):
+            yield from self.species_requests(species_id)
 
-        # 遍历文件夹，读取所有JSON文件中的物种ID
-        for filename in os.listdir(species_id_dir):
-            if filename.endswith('.json'):
-                filepath = os.path.join(species_id_dir, filename)
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    species_ids.extend(data)
+    def species_requests(self, species_id):
+        """单个物种的起始请求（species_all 组合爬虫同样通过它发起本接口的请求）"""
+        yield self.build_request(species_id, 1, pagecount=plan_page_size(self, self.endpoint.url, self.default_pagecount))
 
-        # 为每个物种ID生成初始请求
-        for species_id in species_ids:
-            form_data = {
-                'SC_GUID': species_id,
-                'needCk': 'true',
-                'paging[pagecount]': '200',  # 每页20条记录
-                'paging[pagenum]': '1',  # 从第1页开始
-                'paging[totalpage]': '0'  # 初始总页数为0
-            }
-            yield scrapy.FormRequest(
-                url=self.start_url,
-                formdata=form_data,
-                headers={
-                    'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
-                    'X-Requested-With': 'XMLHttpRequest'
-                },
-                callback=self.parse,
-                meta={'species_id': species_id, 'pagenum': 1}
-            )
+    def build_request(self, species_id, pagenum, totalpage=None, pagecount=None):
+        """构造指定物种、指定页码的请求"""
+        return self.endpoint.request(self.parse, species_id, pagenum, pagecount or self.default_pagecount, totalpage,
+                                     meta={'species_id': species_id})
 
     def parse(self, response):
         """解析API响应，提取数据并处理分页"""
-        data = json.loads(response.text)
-        content = data.get('content', [])
+        try:
+            data = response_json(response)
+        except json.JSONDecodeError as e:
+            self.logger.error(f'JSON解析失败，URL: {response.url}')
+            record_dead_letter(self, response.request, 'JSONDecodeError', e)
+            return
+        content = self.endpoint.results(data)
 
         # 遍历content列表，提取每条记录
         for item_data in content:
-            item = SpeciesBasicInfoItem()
-            item['rowid'] = item_data.get('rowid')
-            item['TP_GUID'] = item_data.get('TP_GUID')
-            item['SC_GUID'] = item_data.get('SC_GUID')
-            item['SSNameSci'] = item_data.get('SSNameSci')
-            item['SEName'] = item_data.get('SEName')
-            item['BiologicalProperties'] = item_data.get('BiologicalProperties')
-            item['MorphologicalCharacteristics'] = item_data.get('MorphologicalCharacteristics')
-            item['DetectionMethod'] = item_data.get('DetectionMethod')
-            item['DistributionDescription'] = item_data.get('DistributionDescription')
-            item['ICodeID'] = item_data.get('ICodeID')
-            item['ICodeName'] = item_data.get('ICodeName')
-            item['Page'] = item_data.get('Page')
-            item['Remark'] = item_data.get('Remark')
-            item['TP_AUTHOR'] = item_data.get('TP_AUTHOR')
-            item['TP_CREATED'] = item_data.get('TP_CREATED')
-            item['TP_EDITOR'] = item_data.get('TP_EDITOR')
-            item['TP_MODIFIED'] = item_data.get('TP_MODIFIED')
-            item['Temp_CREATED'] = item_data.get('Temp_CREATED')
-            item['Temp_Morp'] = item_data.get('Temp_Morp')
-
-            # 处理嵌套的cankao字段
-            cankao_data = item_data.get('cankao')
-            if cankao_data:
-                cankao_item = CankaoItem()
-                cankao_item['Icode'] = cankao_data.get('Icode')
-                cankao_item['Title'] = cankao_data.get('Title')
-                cankao_item['SourceTitle'] = cankao_data.get('SourceTitle')
-                cankao_item['IssueAuthor'] = cankao_data.get('IssueAuthor')
-                cankao_item['AuthorDisplay'] = cankao_data.get('AuthorDisplay')
-                cankao_item['ITypes1'] = cankao_data.get('ITypes1')
-                cankao_item['ITypes'] = cankao_data.get('ITypes')
-                cankao_item['ITypes2'] = cankao_data.get('ITypes2')
-                cankao_item['KeyWord'] = cankao_data.get('KeyWord')
-                cankao_item['CCname'] = cankao_data.get('CCname')
-                cankao_item['PubTime'] = cankao_data.get('PubTime')
-                cankao_item['Publisher'] = cankao_data.get('Publisher')
-                cankao_item['Derivation'] = cankao_data.get('Derivation')
-                cankao_item['TypeCode'] = cankao_data.get('TypeCode')
-                cankao_item['ExecuteDate'] = cankao_data.get('ExecuteDate')
-                cankao_item['Reference'] = cankao_data.get('Reference')
-                cankao_item['AbstractDesc'] = cankao_data.get('AbstractDesc')
-                cankao_item['TP_AUTHOR'] = cankao_data.get('TP_AUTHOR')
-                cankao_item['TP_CREATED'] = cankao_data.get('TP_CREATED')
-                cankao_item['TP_EDITOR'] = cankao_data.get('TP_EDITOR')
-                cankao_item['TP_MODIFIED'] = cankao_data.get('TP_MODIFIED')
-                cankao_item['PublishPerson'] = cankao_data.get('PublishPerson')
-                cankao_item['PublishTime'] = cankao_data.get('PublishTime')
-                cankao_item['Status'] = cankao_data.get('Status')
-                item['cankao'] = cankao_item
+            item = SpeciesBasicInfoRecord.from_api(item_data)  # 含嵌套的 cankao
 
-            self.count += 1
-            print(f'✅ 成功爬取数据第{self.count}条, SSNameSci={item["SSNameSci"]}')
             yield item
 
-        # 处理分页
-        paging = data.get('paging', {})
-        pagenum = int(paging.get('pagenum', 1))
-        totalpage = int(paging.get('totalpage', 0))
-        if pagenum < totalpage:
-            next_pagenum = pagenum
-            form_data = {
-                'SC_GUID': response.meta['species_id'],
-                'needCk': 'true',
-                'paging[pagecount]': '20',
-                'paging[pagenum]': str(next_pagenum),
-                'paging[totalpage]': str(totalpage)
-            }
-            yield scrapy.FormRequest(
-                url=self.start_url,
-                formdata=form_data,
-                headers={
-                    'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
-                    'X-Requested-With': 'XMLHttpRequest'
-                },
-                callback=self.parse,
-                meta={'species_id': response.meta['species_id'], 'pagenum': next_pagenum}
-            )
\ No newline at end of file
+        # 首页拿到总页数后一次性调度其余页
+        species_id = response.meta['species_id']
+        totalpage = self.endpoint.total_pages(data)
+        record_page(self, self.endpoint.url, response, len(content), totalpage)
+        pagecount = response.meta['pagecount']
+        yield from fan_out_pages(
+            self, self.endpoint.url, species_id, response.meta['pagenum'], totalpage,
+            lambda pagenum: self.build_request(species_id, pagenum, totalpage, pagecount)
+        )
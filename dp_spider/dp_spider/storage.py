@@ -0,0 +1,634 @@
+import json
+import logging
+import os
+import re
+from collections import deque
+
+from twisted.internet import defer, threads
+from twisted.python.failure import Failure
+from twisted.python.threadpool import ThreadPool
+
+logger = logging.getLogger(__name__)
+
+# 批次文件格式 -> 文件后缀
+BATCH_SUFFIXES = {
+    'jsonl': '.jsonl',  # 每行一条紧凑 JSON（JSON Lines）
+    'json': '.json',  # 流式写出的 JSON 数组，兼容旧的 json.load 读取方式
+}
+
+# 已提交的批次文件名：<前缀>_batch_<N>.<后缀>（不含未提交的 .part 文件）
+BATCH_FILE_PATTERN = re.compile(r'^(?P<prefix>.+)_batch_(?P<number>\d+)(?P<suffix>\.[a-z]+)$')
+
+
+def encode_record(record):
+    """将一条记录编码为紧凑的 UTF-8 JSON 字节串"""
+    return json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+class BatchJournal:
+    """
+    批次提交日志：每个分片原子落盘后追加一行 {"shard": 文件名, "keys": [主键...], "open": [主键...]} 并 fsync。
+    keys 是截至该分片全部记录都已落盘的主键（物种 / 文献），而不是分片内出现过的主键：
+    同一物种的记录可能跨越多个分片，最后一部分提交之前不能算作完成。
+    记录都在更早分片中的主键以 shard 为 null 的行提交。
+    open 是在该分片中有记录、提交时尚未完成的主键，即这个分片中只含部分记录的主键。
+    重启时读取日志即可知道哪些主键的数据已经完整写入磁盘（keys），以及哪些主键的部分记录
+    留在了已提交的分片中（dangling：主键 -> 分片文件名集合），后者由 BatchWriter 在重新爬取之前删除。
+    删除后追加一行 {"shard": null, "keys": [], "dropped": [主键...]}。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.keys = set()  # 数据已完整落盘的主键
+        self.shards = []  # 已提交的分片文件名
+        self.dangling = {}  # 未完成主键 -> 可能含有其部分记录的已提交分片
+        self._load()
+        self.file = open(self.path, 'a', encoding='utf-8')
+
+    def commit(self, shard, keys, open_keys=(), dropped=()):
+        """
+        记录一个已原子落盘的分片（没有新分片时为 None）、截至此时数据已完整落盘的主键、
+        仍未完成的主键，以及已从分片中删除部分记录的主键
+        """
+        entry = {'shard': shard, 'keys': keys}
+        if open_keys:
+            entry['open'] = list(open_keys)
+        if dropped:
+            entry['dropped'] = list(dropped)
+        self.file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self._apply(entry)
+
+    def _apply(self, entry):
+        shard = entry['shard']
+        if shard is not None:
+            self.shards.append(shard)
+            for key in entry.get('open', ()):
+                self.dangling.setdefault(key, set()).add(shard)
+        for key in entry['keys']:
+            self.dangling.pop(key, None)
+        for key in entry.get('dropped', ()):
+            self.dangling.pop(key, None)
+        self.keys.update(entry['keys'])
+
+    def close(self):
+        self.file.close()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb+') as f:
+            data = f.read()
+            # 崩溃时可能只写了半行，截断到最后一个完整行，避免后续追加的内容与之粘连
+            end = data.rfind(b'\n') + 1
+            if end < len(data):
+                f.truncate(end)
+        for line in data[:end].decode('utf-8').splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            self._apply(entry)
+
+
+class BatchWriter:
+    """
+    流式批次文件写入器：每条记录到达即追加到当前分片文件，
+    当分片条数达到 max_items 或字节数达到 max_bytes 时滚动到下一个分片。
+    分片文件名沿用 `<prefix>_batch_<N>` 的命名方式。
+    传入 journal 时，分片先写入 `.part` 临时文件，滚动时 fsync 后原子重命名，
+    再把已通过 finish() 标记完成的 key_field 字段值，以及分片中只有部分记录的未完成主键提交到日志；
+    重启时丢弃残留的 `.part` 文件，从已提交的分片中删除上次未完成主键的记录（它们会被整体重新爬取），
+    并从已有的最大分片编号之后继续编号。
+    """
+
+    def __init__(self, output_dir, prefix, max_items=5000, max_bytes=0, first_batch=1, fmt='json',
+                 journal=None, key_field=None):
+        if fmt not in BATCH_SUFFIXES:
+            raise ValueError(f'不支持的批次文件格式: {fmt}')
+        self.output_dir = output_dir
+        self.prefix = prefix
+        self.max_items = max_items  # 每个分片的最大条数，0 表示不限制
+        self.max_bytes = max_bytes  # 每个分片的最大字节数，0 表示不限制
+        self.fmt = fmt
+        self.batch_num = first_batch  # 当前分片编号
+        self.item_count = 0  # 当前分片已写入条数
+        self.byte_count = 0  # 当前分片已写入字节数
+        self.file = None
+        self.journal = journal  # 批次提交日志，为 None 时直接写入最终文件
+        self.key_field = key_field  # 提交到日志的记录主键字段
+        self.open_keys = {}  # 已写入记录、尚未完成的主键
+        self.shard_keys = {}  # 当前分片中有记录的主键
+        self.done_keys = {}  # 已完成、随下一次提交写入日志的主键（保持插入顺序去重）
+        os.makedirs(self.output_dir, exist_ok=True)
+        if self.journal is not None:
+            self._recover()
+
+    @property
+    def current_path(self):
+        """当前分片的文件路径"""
+        filename = f'{self.prefix}_batch_{self.batch_num}{BATCH_SUFFIXES[self.fmt]}'
+        return os.path.join(self.output_dir, filename)
+
+    def write(self, record):
+        """追加一条记录（可 JSON 序列化的字典）"""
+        if self.journal is not None and self.key_field:
+            key = record.get(self.key_field)
+            if key is not None:
+                self.open_keys[key] = None
+                self.shard_keys[key] = None
+        self.write_encoded(encode_record(record))
+
+    def finish(self, keys):
+        """
+        标记主键已完成：它的记录都已调用过 write()，不会再有新记录。
+        本次运行写过记录的主键在下一次提交时写入日志，其余的忽略。
+        """
+        for key in keys:
+            if key in self.open_keys:
+                del self.open_keys[key]
+                self.done_keys[key] = None
+
+    def write_encoded(self, data):
+        """追加一条已编码的记录"""
+        if self.file is None:
+            self._open()
+        if self.fmt == 'json':
+            data = (b',\n' if self.item_count else b'\n') + data
+        else:
+            data += b'\n'
+        self.file.write(data)
+        self.item_count += 1
+        self.byte_count += len(data)
+        if self._is_full():
+            self.rotate()
+
+    def rotate(self):
+        """关闭当前分片，后续记录写入下一个分片"""
+        if self.file is None:
+            # 已完成主键的记录都在已提交的分片中，单独提交
+            if self.journal is not None and self.done_keys:
+                self.journal.commit(None, list(self.done_keys))
+                self.done_keys = {}
+            return
+        path = self.current_path
+        if self.fmt == 'json':
+            self.file.write(b'\n]\n')
+        if self.journal is not None:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+            os.replace(path + '.part', path)
+            _fsync_dir(self.output_dir)
+            open_keys = [key for key in self.shard_keys if key in self.open_keys]
+            self.journal.commit(os.path.basename(path), list(self.done_keys), open_keys)
+            self.done_keys = {}
+            self.shard_keys = {}
+        else:
+            self.file.close()
+        self.file = None
+        logger.info(f'已写入 {self.item_count} 条数据到 {path}')
+        self.batch_num += 1
+        self.item_count = 0
+        self.byte_count = 0
+
+    def close(self):
+        """关闭写入器，结束当前分片"""
+        self.rotate()
+        if self.journal is not None:
+            self.journal.close()
+
+    def _open(self):
+        path = self.current_path + '.part' if self.journal is not None else self.current_path
+        self.file = open(path, 'wb')
+        if self.fmt == 'json':
+            self.file.write(b'[')
+
+    def _is_full(self):
+        if self.max_items and self.item_count >= self.max_items:
+            return True
+        return bool(self.max_bytes) and self.byte_count >= self.max_bytes
+
+    def _recover(self):
+        """清理上次异常退出残留的 .part 文件，删除未完成主键留在已提交分片中的记录，并跳过已存在的分片编号"""
+        head = f'{self.prefix}_batch_'
+        for filename in os.listdir(self.output_dir):
+            if not filename.startswith(head):
+                continue
+            if filename.endswith('.part'):
+                os.remove(os.path.join(self.output_dir, filename))
+                logger.warning(f'已丢弃未提交的分片: {filename}')
+                continue
+            number = filename[len(head):].split('.')[0]
+            if number.isdigit():
+                self.batch_num = max(self.batch_num, int(number) + 1)
+        if self.journal.dangling and self.key_field:
+            self._drop_dangling()
+
+    def _drop_dangling(self):
+        """
+        上次运行中断时尚未完成的主键会被整体重新爬取，它们已写入已提交分片的部分记录必须先删除，
+        否则恢复后的数据会重复。分片先重写到 .part 再原子替换，中途再次崩溃时下次启动重做。
+        """
+        dangling = self.journal.dangling
+        shards = {}  # 分片文件名 -> 需要删除记录的主键
+        for key, names in dangling.items():
+            for name in names:
+                shards.setdefault(name, set()).add(key)
+        dropped = 0
+        for name, keys in shards.items():
+            path = os.path.join(self.output_dir, name)
+            if not os.path.exists(path):
+                continue  # 分片已被合并或移走
+            records = list(iter_batch_records(path))
+            kept = [record for record in records if record.get(self.key_field) not in keys]
+            if len(kept) == len(records):
+                continue
+            _write_records(path, kept)
+            dropped += len(records) - len(kept)
+        _fsync_dir(self.output_dir)
+        logger.warning(f'已从已提交的分片中删除 {len(dangling)} 个未完成主键的 {dropped} 条记录，这些主键将重新爬取')
+        self.journal.commit(None, [], dropped=list(dangling))
+
+
+def _write_records(path, records):
+    """按文件后缀的格式把记录原子地重写到 path"""
+    with open(path + '.part', 'wb') as f:
+        if path.endswith('.jsonl'):
+            for record in records:
+                f.write(encode_record(record) + b'\n')
+        else:
+            f.write(b'[' + b','.join(b'\n' + encode_record(record) for record in records) + b'\n]\n')
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + '.part', path)
+
+
+def _fsync_dir(path):
+    """fsync 目录，确保重命名操作落盘（不支持的平台上忽略）"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def merge_batch_dir(source_dir, dest_dir):
+    """
+    把 source_dir 中已提交的分片按原编号顺序移动到 dest_dir，编号接在 dest_dir 中同前缀的最大编号之后；
+    source_dir 有 <前缀>.journal 时，分片对应的已完成主键以新文件名追加到 dest_dir 的日志中，
+    不属于任何分片的已完成主键在所有分片移动之后提交。
+    未提交的 .part 文件保持不动，由该目录的写入器在下次启动时清理。
+
+    返回:
+        int: 移动的分片数
+    """
+    shards = {}  # 前缀 -> [(编号, 文件名, 后缀)]
+    next_numbers = {}  # 前缀 -> dest_dir 中下一个可用编号
+    for filename in os.listdir(source_dir):
+        match = BATCH_FILE_PATTERN.match(filename)
+        if match:
+            shards.setdefault(match['prefix'], []).append((int(match['number']), filename, match['suffix']))
+    if not shards:
+        return 0
+    os.makedirs(dest_dir, exist_ok=True)
+    for filename in os.listdir(dest_dir):
+        match = BATCH_FILE_PATTERN.match(filename)
+        if match:
+            prefix = match['prefix']
+            next_numbers[prefix] = max(next_numbers.get(prefix, 1), int(match['number']) + 1)
+
+    moved = 0
+    for prefix, files in shards.items():
+        source_journal = os.path.join(source_dir, f'{prefix}.journal')
+        journal = None
+        shard_keys = {}
+        loose_keys = []  # 不属于任何分片的已完成主键
+        if os.path.exists(source_journal):
+            with open(source_journal, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if entry['shard'] is None:
+                        loose_keys.extend(entry['keys'])
+                    else:
+                        shard_keys[entry['shard']] = (entry['keys'], entry.get('open', ()))
+            journal = BatchJournal(os.path.join(dest_dir, f'{prefix}.journal'))
+        number = next_numbers.get(prefix, 1)
+        for _, filename, suffix in sorted(files):
+            target = f'{prefix}_batch_{number}{suffix}'
+            os.replace(os.path.join(source_dir, filename), os.path.join(dest_dir, target))
+            if journal is not None:
+                keys, open_keys = shard_keys.get(filename, ([], ()))
+                journal.commit(target, keys, open_keys)
+            number += 1
+            moved += 1
+        if journal is not None:
+            if loose_keys:
+                journal.commit(None, loose_keys)
+            journal.close()
+    _fsync_dir(dest_dir)
+    return moved
+
+
+class RecordSizeEstimator:
+    """
+    记录大小估算：每 sample_every 条抽取一条编码并计入平均值，
+    用于在不逐条编码的情况下估算缓冲区占用的字节数（见 MemoryBudget 扩展）。
+    """
+
+    def __init__(self, sample_every=64):
+        self.sample_every = sample_every
+        self.seen = 0
+        self.sampled = 0
+        self.sampled_bytes = 0
+
+    def observe(self, record):
+        if self.seen % self.sample_every == 0:
+            self.sampled += 1
+            self.sampled_bytes += len(encode_record(record))
+        self.seen += 1
+
+    def estimate(self, count):
+        """估算 count 条记录的字节数"""
+        if not count or not self.sampled:
+            return 0
+        return count * self.sampled_bytes // self.sampled
+
+
+class BackgroundBatchWriter:
+    """
+    后台批次写入器：把整批记录交给独立的写线程完成序列化与磁盘 I/O，
+    reactor 线程只负责投递并拿到 Deferred。
+    写线程只有一个，保证批次按投递顺序落盘；未完成的批次超过 max_pending 时，
+    wait() 返回的 Deferred 会一直挂起，借此对爬取施加反压。
+    """
+
+    def __init__(self, writer, max_pending=4):
+        self.writer = writer
+        self.max_pending = max_pending  # 允许同时排队的批次数
+        self.pending = set()  # 尚未写完的批次
+        self.pending_records = 0  # 尚未写完的记录数
+        self.waiters = deque()  # 等待写入队列空出位置的 Deferred
+        self.pool = ThreadPool(minthreads=1, maxthreads=1, name=f'{writer.prefix}-writer')
+        self.pool.start()
+
+    def is_full(self):
+        return len(self.pending) >= self.max_pending
+
+    def submit(self, records, finished=()):
+        """投递一批记录，以及在这批记录之后标记完成的主键（见 BatchWriter.finish），返回该批写完时触发的 Deferred"""
+        from twisted.internet import reactor
+        d = threads.deferToThreadPool(reactor, self.pool, self._write_all, records, finished)
+        self.pending.add(d)
+        self.pending_records += len(records)
+        d.addBoth(self._on_written, d, len(records))
+        return d
+
+    def wait(self):
+        """返回在写入队列有空位时触发的 Deferred"""
+        if not self.is_full():
+            return defer.succeed(None)
+        waiter = defer.Deferred()
+        self.waiters.append(waiter)
+        return waiter
+
+    def rotate(self):
+        """在写线程中排在已投递的批次之后结束当前分片，返回分片提交后触发的 Deferred"""
+        from twisted.internet import reactor
+        return threads.deferToThreadPool(reactor, self.pool, self.writer.rotate)
+
+    def close(self):
+        """等待所有已投递的批次写完，关闭文件并停止写线程"""
+        from twisted.internet import reactor
+        d = defer.DeferredList(list(self.pending))
+        d.addCallback(lambda _: threads.deferToThreadPool(reactor, self.pool, self.writer.close))
+        d.addBoth(self._stop)
+        return d
+
+    def _write_all(self, records, finished):
+        for record in records:
+            self.writer.write(record)
+        if finished:
+            self.writer.finish(finished)
+
+    def _on_written(self, result, d, count):
+        self.pending.discard(d)
+        self.pending_records -= count
+        if isinstance(result, Failure):
+            logger.error(f'批次写入失败（{count}条）: {result.getErrorMessage()}',
+                         exc_info=(result.type, result.value, result.getTracebackObject()))
+        while self.waiters and not self.is_full():
+            self.waiters.popleft().callback(None)
+
+    def _stop(self, result):
+        self.pool.stop()
+        return result
+
+
+# Parquet 列式输出：整数列
+PARQUET_INT_FIELDS = {'rowid', 'IsSpecies'}
+# Parquet 列式输出：大量重复的低基数字符串列（区域、分类、类型、编辑人等），以字典编码存储
+PARQUET_DICTIONARY_FIELDS = {
+    'CCnameContinent', 'CCnameCountry', 'CCnameProvince', 'CCname',
+    'SClass', 'SLevel', 'SLevel2', 'ParentSsName', 'Source', 'Status', 'SONType',
+    'HostType', 'SpeciesType', 'MediumType', 'ITypes', 'ITypes1', 'ITypes2',
+    'ICodeName', 'Checker', 'TP_AUTHOR', 'TP_EDITOR',
+}
+
+
+def build_arrow_schema(item_class, nested=None):
+    """
+    根据 Item 类声明的字段生成 Arrow schema。
+
+    参数:
+        item_class: scrapy.Item 子类
+        nested (dict): 嵌套字段名 -> (嵌套 Item 类, 是否为列表)，生成 struct / list<struct> 列
+    """
+    import pyarrow as pa
+
+    nested = nested or {}
+    columns = []
+    for name in item_class.fields:
+        if name in nested:
+            child_class, many = nested[name]
+            struct = pa.struct([(child, pa.string()) for child in child_class.fields])
+            columns.append((name, pa.list_(struct) if many else struct))
+        elif name in PARQUET_INT_FIELDS:
+            columns.append((name, pa.int64()))
+        elif name in PARQUET_DICTIONARY_FIELDS:
+            columns.append((name, pa.dictionary(pa.int32(), pa.string())))
+        else:
+            columns.append((name, pa.string()))
+    return pa.schema(columns)
+
+
+class ParquetBatchWriter:
+    """
+    Parquet 写入器：记录先在内存中攒够 row_group_size 条，再作为一个 row group 写入当前文件。
+    文件与 BatchWriter 一样按 `<prefix>_batch_<N>.parquet` 编号，写满 max_rows 条时滚动到下一个文件。
+    文件先写入 `.part`，关闭（写出 footer）后才原子重命名为正式文件名，未关闭的文件不可读，
+    因此 commit() 直接结束当前文件；启动时丢弃残留的 `.part` 文件，并从已有的最大编号之后继续编号，
+    不会覆盖之前运行的输出。
+
+    每次 commit() 都会产生一个文件，开启检查点时文件数约为 运行时长 / CHECKPOINT_FLUSH_INTERVAL，
+    每个文件可能只有一个不满的 row group。这是检查点可靠性的代价：记录只有在文件结束后才可读，
+    只在攒满 row group 时提交就会让检查点标记尚未落盘的物种。需要更少、更大的文件时调大
+    CHECKPOINT_FLUSH_INTERVAL，或爬取结束后再合并小文件。
+    """
+
+    def __init__(self, output_dir, prefix, schema, row_group_size=10000, compression='zstd', max_rows=0,
+                 first_batch=1):
+        self.output_dir = output_dir
+        self.prefix = prefix
+        self.schema = schema
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.max_rows = max_rows  # 每个文件的最大行数，0 表示不限制
+        self.batch_num = first_batch  # 当前文件编号
+        self.rows = []
+        self.row_count = 0  # 当前文件已写出的行数
+        self.writer = None
+        self.sizes = RecordSizeEstimator()
+        os.makedirs(output_dir, exist_ok=True)
+        self._recover()
+
+    @property
+    def current_path(self):
+        """当前文件的路径"""
+        return os.path.join(self.output_dir, f'{self.prefix}_batch_{self.batch_num}.parquet')
+
+    def write(self, record):
+        self.rows.append(record)
+        self.sizes.observe(record)
+        if len(self.rows) >= self.row_group_size:
+            self.flush()
+
+    def buffered_bytes(self):
+        """估算尚未写出的记录占用的字节数"""
+        return self.sizes.estimate(len(self.rows))
+
+    def flush(self):
+        """将缓存的记录写成一个 row group，当前文件写满时滚动"""
+        if not self.rows:
+            return
+        import pyarrow.parquet as pq
+
+        rows, self.rows = self.rows, []
+        table = self._to_table(rows)
+        if not table.num_rows:
+            return
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.current_path + '.part', self.schema, compression=self.compression)
+        self.writer.write_table(table)
+        self.row_count += table.num_rows
+        if self.max_rows and self.row_count >= self.max_rows:
+            self.rotate()
+
+    def rotate(self):
+        """写出缓存的记录并结束当前文件（写 footer 后重命名），后续记录写入下一个文件"""
+        if self.rows:
+            self.flush()
+        if self.writer is None:
+            return
+        path = self.current_path
+        self.writer.close()
+        self.writer = None
+        os.replace(path + '.part', path)
+        _fsync_dir(self.output_dir)
+        logger.info(f'已写入 {self.row_count} 条数据到 {path}')
+        self.batch_num += 1
+        self.row_count = 0
+
+    def commit(self):
+        """结束当前文件，使已写入的记录全部落盘"""
+        self.rotate()
+
+    def close(self):
+        self.rotate()
+
+    def _recover(self):
+        """清理上次异常退出残留的 .part 文件，并跳过已存在的文件编号"""
+        for filename in os.listdir(self.output_dir):
+            match = BATCH_FILE_PATTERN.match(filename[:-len('.part')] if filename.endswith('.part') else filename)
+            if not match or match['prefix'] != self.prefix or match['suffix'] != '.parquet':
+                continue
+            if filename.endswith('.part'):
+                os.remove(os.path.join(self.output_dir, filename))
+                logger.warning(f'已丢弃未写完的 Parquet 文件: {filename}')
+                continue
+            self.batch_num = max(self.batch_num, int(match['number']) + 1)
+
+    def _to_table(self, rows):
+        import pyarrow as pa
+
+        try:
+            return pa.Table.from_pylist(rows, schema=self.schema)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # 个别记录的字段类型与 schema 不一致（如字符串列出现数字），统一转换后重试
+            coerced = [self._coerce(row) for row in rows]
+        try:
+            return pa.Table.from_pylist(coerced, schema=self.schema)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            pass
+        # 仍然失败时逐条检查，丢弃无法转换的记录，不让它们留在缓存中拖垮之后的每一次写入
+        kept = []
+        for row, original in zip(coerced, rows):
+            try:
+                pa.Table.from_pylist([row], schema=self.schema)
+            except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+                logger.error(f'{self.prefix} 的记录无法写入 Parquet，已丢弃: {e}; {str(original)[:200]}')
+                continue
+            kept.append(row)
+        return pa.Table.from_pylist(kept, schema=self.schema)
+
+    def _coerce(self, row):
+        return {field.name: _coerce_value(row.get(field.name), field.type) for field in self.schema}
+
+
+def _coerce_value(value, arrow_type):
+    """
+    把值转换为 arrow_type 可接受的形式：整数列取 int，字符串 / 字典编码列取 str，
+    struct 与 list 列逐个转换其子字段；无法转换时为 None。
+    """
+    import pyarrow as pa
+
+    if value is None:
+        return None
+    if pa.types.is_integer(arrow_type):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            # 空串或非数字（接口偶尔返回）存为空值，不让单条记录中断整个管道
+            return None
+    if pa.types.is_string(arrow_type) or pa.types.is_dictionary(arrow_type):
+        return value if isinstance(value, str) else str(value)
+    if pa.types.is_struct(arrow_type):
+        if not isinstance(value, dict):
+            return None
+        return {child.name: _coerce_value(value.get(child.name), child.type) for child in arrow_type}
+    if pa.types.is_list(arrow_type):
+        if not isinstance(value, (list, tuple)):
+            return None
+        return [_coerce_value(element, arrow_type.value_type) for element in value]
+    return value
+
+
+def iter_batch_records(path):
+    """逐条读取批次文件中的记录，同时支持 .jsonl 与 .json 数组格式"""
+    with open(path, 'r', encoding='utf-8') as f:
+        if str(path).endswith('.jsonl'):
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        else:
+            yield from json.load(f)
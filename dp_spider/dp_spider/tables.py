@@ -0,0 +1,372 @@
+import hashlib
+import json
+import uuid
+from datetime import datetime
+
+from .items import (
+    CmDiffuseMediumItem, FileMetadataItem, IssueCodeDetailItem, MetaInfoItem, PestHostPartItem,
+    PestRelationInfoItem, SpeciesBasicInfoItem, SpeciesDistributionItem, SpeciesHostItem, SpeciesParentItem,
+)
+
+# 以下字段映射（原始字段 -> 数据库列）与 data_cleaning/ 下各清洗脚本保持一致
+
+# species_distribution.py
+DISTRIBUTION_FIELDS = {
+    'species_id': 'species_guid',
+    'CCnameContinent': 'continent_name',
+    'CCnameCountry': 'country_name',
+    'CCnameProvince': 'province_name',
+    'Descrip': 'description'
+}
+
+# pest_host.py
+HOST_FIELDS = {
+    'species_id': 'species_guid',
+    'HOST_GUID': 'host_guid',
+    'HOST_NAME': 'host_name',
+    'HOST_NAME_CN': 'host_name_cn',
+    'HostType': 'host_types'
+}
+
+# species_basicinfo.py
+BASIC_INFO_FIELDS = {
+    'SC_GUID': 'species_guid',
+    'TP_GUID': 'record_guid',
+    'SSNameSci': 'scientific_name',
+    'SEName': 'english_name',
+    'BiologicalProperties': 'biological_properties',
+    'MorphologicalCharacteristics': 'morphological_characteristics',
+    'DetectionMethod': 'detection_method',
+    'DistributionDescription': 'distribution_description',
+    'ICodeID': 'icode_id',
+    'ICodeName': 'icode_name',
+    'Page': 'page',
+    'Remark': 'remark',
+    'TP_AUTHOR': 'author',
+    'TP_CREATED': 'created_time',
+    'TP_EDITOR': 'editor',
+    'TP_MODIFIED': 'update_time',
+    'Temp_CREATED': 'temp_created_time',
+    'Temp_Morp': 'temp_morphological'
+}
+
+# pest_relation.py
+ASSOCIATION_FIELDS = {
+    'SC_GUID': 'species_guid',
+    'TP_GUID': 'record_guid',
+    'SSNameSci': 'scientific_name',
+    'PBCharHostRange': 'host_range',
+    'PotentialEcoDesc': 'potential_eco_desc',
+    'Descrip': 'description',
+    'ManagementInfo': 'management_info',
+    'Remark': 'remark',
+    'ICodeID': 'reference_id',
+    'ICodeName': 'reference_name',
+    'Page': 'page',
+    'TP_AUTHOR': 'author',
+    'TP_CREATED': 'created_time',
+    'TP_EDITOR': 'editor',
+    'TP_MODIFIED': 'update_time'
+}
+
+# species_meta_info.py
+SPECIES_FIELDS = {
+    'TP_GUID': 'guid',
+    'SSNameSci': 'scientific_name',
+    'SSName': 'scientific_name_with_authors',
+    'NamedYear': 'authorship',
+    'SCName': 'chinese_name',
+    'SEName': 'english_name',
+    'SENameAbb': 'abbreviation',
+    'SClass': 'classification',
+    'ParentSsName': 'parent_genus',
+    'SLevel': 'taxonomic_level',
+    'Source': 'sources',
+    'Status': 'confirmation_status',
+    'Checker': 'reviewer',
+    'CheckTime': 'review_time',
+    'OrgRiskCode': 'original_risk_code',
+    'IsSpecies': 'is_species',
+    'TP_AUTHOR': 'author',
+    'TP_CREATED': 'created_time',
+    'TP_EDITOR': 'editor',
+    'TP_MODIFIED': 'modified_time',
+    'Temp_CREATED': 'temp_created_time'
+}
+
+OTHER_NAMES_FIELDS = {
+    'SONType': 'other_name_type',
+    'NamedYear': 'named_year',
+    'SOtherNameSci': 'other_name'
+}
+
+# species_taxonomy.py
+TAXONOMY_FIELDS = {
+    'species_TP_GUID': 'species_guid',
+    'TP_GUID': 'taxonomy_guid',
+    'SLevel': 'taxonomy_level',
+    'SSNameSci': 'scientific_name',
+    'SCName': 'chinese_name',
+    'SClass': 'taxonomy_class',
+    'ParentSsName': 'parent_scientific_name'
+}
+
+# pest_host_part.py
+HOST_PART_FIELDS = {
+    'species_id': 'species_guid',
+    'PlantParts': 'plant_parts',
+    'Peststage': 'pest_stage',
+    'VisibilityType': 'visibility_type',
+    'SpreadingWay': 'spreading_way'
+}
+
+# cm_diffuse_medium_cleaning.py
+MEDIUM_FIELDS = {
+    'species_id': 'species_guid',
+    'TP_GUID': 'record_guid',
+    'SSNameSci': 'scientific_name',
+    'SpeciesType': 'species_type',
+    'OB_GUID': 'medium_guid',
+    'OB_SSNameSci': 'medium_scientific_name',
+    'Descrip': 'description',
+    'MediumType': 'medium_type',
+    'ICodeID': 'reference_id',
+    'ICodeName': 'reference_name',
+    'Page': 'page',
+    'TP_AUTHOR': 'author',
+    'TP_CREATED': 'created_time',
+    'TP_EDITOR': 'editor',
+    'TP_MODIFIED': 'update_time',
+    'Tmp_GUID': 'temp_guid',
+    'Tmp_SSNameSci': 'temp_scientific_name',
+    'NamedYear': 'named_year'
+}
+
+# issue_code_detail_cleaning.py
+REFERENCE_INFO_FIELDS = {
+    'Icode': 'icode',
+    'Title': 'title',
+    'SourceTitle': 'source_title',
+    'IssueAuthor': 'authors',
+    'AuthorDisplay': 'author_display',
+    'ITypes1': 'primary_category',
+    'ITypes': 'reference_type',
+    'ITypes2': 'content_type',
+    'KeyWord': 'keywords',
+    'CCname': 'country',
+    'PubTime': 'publish_time',
+    'Publisher': 'publisher',
+    'Derivation': 'source_detail',
+    'TypeCode': 'type_code',
+    'ExecuteDate': 'execute_date',
+    'Reference': 'reference_text',
+    'AbstractDesc': 'abstract',
+    'TP_AUTHOR': 'creator',
+    'TP_CREATED': 'created_time',
+    'TP_EDITOR': 'editor',
+    'TP_MODIFIED': 'update_time',
+    'PublishPerson': 'publish_person',
+    'PublishTime': 'publish_record_time',
+    'Status': 'status'
+}
+
+# file_metadata_cleaning.py
+FILE_METADATA_FIELDS = {
+    'icode': 'icode',
+    'name': 'name',
+    'url': 'url'
+}
+
+# 引用表（reference_relation）的唯一键：同一物种引用同一文献只保留一行（分布、寄主等多个接口可能引用同一文献）
+REFERENCE_KEY = ('species_guid', 'icode')
+
+# 引用表（reference_relation）字段映射：Icodes 列表与 cankao 对象的字段名不同
+ICODES_REFERENCE_FIELDS = {
+    'ICodeID': 'icode',
+    'AuthorDisplay': 'author_display',
+    'Title': 'title'
+}
+CANKAO_REFERENCE_FIELDS = {
+    'Icode': 'icode',
+    'AuthorDisplay': 'author_display',
+    'Title': 'title'
+}
+
+# 整数类型的列，其余列均为 TEXT
+INTEGER_COLUMNS = {'icode', 'is_species'}
+
+# 没有自然主键的表追加的内容哈希列，作为唯一键
+ROW_HASH_COLUMN = 'row_hash'
+
+# Item 类型 -> 表定义
+#   table: 主表名
+#   fields: 主表字段映射
+#   date_columns: 需要规整为 'YYYY-MM-DD HH:MM:SS' 的日期列
+#   bool_columns: 需要转换为 0/1 的布尔列
+#   uuid_column: 需要生成 UUID 的列
+#   key: 唯一键（自然主键）的列，重复写入同一条记录时更新而不是追加；省略时以整行内容的哈希（row_hash 列）为键
+#   children: 子表定义，source 为嵌套字段（列表或对象），parent_key 为写入子表 species_guid 列的主记录字段
+TABLES = {
+    SpeciesDistributionItem: {
+        'table': 'species_distribution',
+        'fields': DISTRIBUTION_FIELDS,
+        'children': [{'source': 'Icodes', 'table': 'reference_relation',
+                      'fields': ICODES_REFERENCE_FIELDS, 'parent_key': 'species_id',
+                      'key': REFERENCE_KEY}],
+    },
+    SpeciesHostItem: {
+        'table': 'species_host',
+        'fields': HOST_FIELDS,
+        'key': ('species_guid', 'host_guid'),
+        'children': [{'source': 'Icodes', 'table': 'reference_relation',
+                      'fields': ICODES_REFERENCE_FIELDS, 'parent_key': 'species_id',
+                      'key': REFERENCE_KEY}],
+    },
+    SpeciesBasicInfoItem: {
+        'table': 'species_basic_info',
+        'fields': BASIC_INFO_FIELDS,
+        'key': ('record_guid',),
+        'date_columns': ['created_time', 'update_time', 'temp_created_time'],
+        'children': [{'source': 'cankao', 'table': 'reference_relation',
+                      'fields': CANKAO_REFERENCE_FIELDS, 'parent_key': 'SC_GUID',
+                      'key': REFERENCE_KEY}],
+    },
+    PestRelationInfoItem: {
+        'table': 'species_association',
+        'fields': ASSOCIATION_FIELDS,
+        'key': ('record_guid',),
+        'date_columns': ['created_time', 'update_time'],
+        'children': [{'source': 'cankao', 'table': 'reference_relation',
+                      'fields': CANKAO_REFERENCE_FIELDS, 'parent_key': 'SC_GUID',
+                      'key': REFERENCE_KEY}],
+    },
+    MetaInfoItem: {
+        'table': 'species',
+        'fields': SPECIES_FIELDS,
+        'key': ('guid',),
+        'date_columns': ['review_time', 'created_time', 'modified_time', 'temp_created_time'],
+        'bool_columns': ['is_species'],
+        'children': [{'source': 'ym', 'table': 'species_other_names',
+                      'fields': OTHER_NAMES_FIELDS, 'parent_key': 'TP_GUID',
+                      'key': ('species_guid', 'other_name_type', 'other_name')}],
+    },
+    SpeciesParentItem: {
+        'table': 'species_taxonomy',
+        'fields': TAXONOMY_FIELDS,
+        'key': ('species_guid', 'taxonomy_guid'),
+    },
+    PestHostPartItem: {
+        'table': 'species_host_part',
+        'fields': HOST_PART_FIELDS,
+        'children': [{'source': 'Icodes', 'table': 'reference_relation',
+                      'fields': ICODES_REFERENCE_FIELDS, 'parent_key': 'species_id',
+                      'key': REFERENCE_KEY}],
+    },
+    CmDiffuseMediumItem: {
+        'table': 'species_medium',
+        'fields': MEDIUM_FIELDS,
+        'key': ('record_guid',),
+        'date_columns': ['created_time', 'update_time'],
+    },
+    IssueCodeDetailItem: {
+        'table': 'species_reference_info',
+        'fields': REFERENCE_INFO_FIELDS,
+        'key': ('icode',),
+        'date_columns': ['publish_time', 'execute_date', 'created_time', 'update_time', 'publish_record_time'],
+        'uuid_column': 'reference_guid',
+    },
+    FileMetadataItem: {
+        'table': 'file_metadata',
+        'fields': FILE_METADATA_FIELDS,
+        'key': ('icode', 'url'),
+    },
+}
+
+
+def parse_datetime(date_str):
+    """将 'YYYY-MM-DD HH:MM:SS[.fff]' 规整为 'YYYY-MM-DD HH:MM:SS'，无法解析时返回 None"""
+    if not date_str:
+        return None
+    for fmt in ('%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%d %H:%M:%S'):
+        try:
+            return datetime.strptime(date_str, fmt).strftime('%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            continue
+    return None
+
+
+def table_key(spec):
+    """表（主表或子表定义）的唯一键列"""
+    return tuple(spec.get('key') or (ROW_HASH_COLUMN,))
+
+
+def table_columns(spec):
+    """主表的列（不含自增 id）"""
+    columns = list(spec['fields'].values())
+    if spec.get('uuid_column'):
+        columns.insert(0, spec['uuid_column'])
+    if not spec.get('key'):
+        columns.append(ROW_HASH_COLUMN)
+    return columns
+
+
+def child_columns(child):
+    """子表的列（不含自增 id）"""
+    columns = list(child['fields'].values())
+    if 'species_guid' not in columns:
+        columns.insert(0, 'species_guid')
+    if not child.get('key'):
+        columns.append(ROW_HASH_COLUMN)
+    return columns
+
+
+def iter_table_specs():
+    """遍历所有表名、列、唯一键列与 UUID 列（为 None 时没有），同名子表只返回一次"""
+    seen = set()
+    for spec in TABLES.values():
+        specs = [(spec['table'], table_columns(spec), table_key(spec), spec.get('uuid_column'))]
+        specs += [(child['table'], child_columns(child), table_key(child), None)
+                  for child in spec.get('children', [])]
+        for table, columns, key, uuid_column in specs:
+            if table not in seen:
+                seen.add(table)
+                yield table, columns, key, uuid_column
+
+
+def _row_tuple(row, columns, keyed):
+    """按列顺序生成行元组；没有自然主键的表补上内容哈希"""
+    if not keyed:
+        content = json.dumps([row[column] for column in columns[:-1]], ensure_ascii=False, default=str)
+        row[ROW_HASH_COLUMN] = hashlib.sha1(content.encode('utf-8')).hexdigest()
+    return tuple(row[column] for column in columns)
+
+
+def split_record(spec, record):
+    """
+    将一条原始记录拆分为主表行和子表行。
+
+    参数:
+        spec (dict): TABLES 中的表定义
+        record (dict): 原始记录
+    返回:
+        list: (表名, 行元组) 列表，行元组的顺序与 table_columns / child_columns 一致
+    """
+    row = {column: record.get(key, '') for key, column in spec['fields'].items()}
+    for column in spec.get('date_columns', ()):
+        row[column] = parse_datetime(row[column])
+    for column in spec.get('bool_columns', ()):
+        row[column] = int(bool(row[column]))
+    if spec.get('uuid_column'):
+        row[spec['uuid_column']] = str(uuid.uuid4())
+    rows = [(spec['table'], _row_tuple(row, table_columns(spec), bool(spec.get('key'))))]
+
+    for child in spec.get('children', ()):
+        nested = record.get(child['source'])
+        if not nested:
+            continue
+        species_guid = record.get(child['parent_key'], '')
+        for value in nested if isinstance(nested, list) else [nested]:
+            child_row = {column: value.get(key, '') for key, column in child['fields'].items()}
+            child_row.setdefault('species_guid', species_guid)
+            rows.append((child['table'], _row_tuple(child_row, child_columns(child), bool(child.get('key')))))
+    return rows